@@ -0,0 +1,124 @@
+"""
+Mapa de identidad por petición.
+
+Durante una petición (ver IdentityMapMiddleware) las filas que se piden con
+get() o related() se leen de la base de datos una sola vez: las siguientes
+búsquedas por pk del mismo modelo devuelven la misma instancia. No sustituye
+al manager de ningún modelo: solo lo usan los caminos que lo piden
+explícitamente (envío de quizzes, inscripción y el recálculo de progreso que
+disparan), así que el resto del código sigue leyendo de la base de datos.
+
+Fuera de una petición (comandos, tareas, tests sin middleware) get() y
+related() consultan la base de datos como siempre. Quien cambie con
+queryset.update() una fila que pueda estar en el mapa debe llamar a forget().
+"""
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_current = ContextVar('identity_map', default=None)
+
+
+class IdentityMap:
+    def __init__(self):
+        self._rows = {}
+        self.hits = Counter()
+        self.misses = Counter()
+
+    @staticmethod
+    def _key(model, pk):
+        return model._meta.concrete_model._meta.label_lower, pk
+
+    def lookup(self, model, pk):
+        """La instancia ya cargada, o None (cuenta acierto o fallo)."""
+        key = self._key(model, pk)
+        instance = self._rows.get(key)
+        if instance is None:
+            self.misses[key[0]] += 1
+        else:
+            self.hits[key[0]] += 1
+        return instance
+
+    def remember(self, instance):
+        """Guarda la instancia y las relaciones que trae cargadas (select_related)."""
+        self._rows.setdefault(self._key(type(instance), instance.pk), instance)
+        for related in instance._state.fields_cache.values():
+            if related is not None and related.pk is not None:
+                self._rows.setdefault(self._key(type(related), related.pk), related)
+
+    def forget(self, model, pk):
+        self._rows.pop(self._key(model, pk), None)
+
+    def stats(self):
+        """Aciertos y fallos totales y por modelo."""
+        return {
+            'hits': sum(self.hits.values()),
+            'misses': sum(self.misses.values()),
+            'models': {
+                label: {'hits': self.hits[label], 'misses': self.misses[label]}
+                for label in sorted(self.hits.keys() | self.misses.keys())
+            },
+        }
+
+
+def current():
+    """Mapa de la petición en curso, o None fuera de una petición."""
+    return _current.get()
+
+
+@contextmanager
+def activate():
+    token = _current.set(IdentityMap())
+    try:
+        yield _current.get()
+    finally:
+        _current.reset(token)
+
+
+def get(queryset, pk):
+    """
+    queryset.get(pk=pk) leído una sola vez por petición. `queryset` puede ser
+    un modelo o un queryset sin filtros (p. ej. con select_related); las
+    condiciones como is_active se comprueban sobre la instancia devuelta.
+    Lanza DoesNotExist como get().
+    """
+    queryset = queryset._default_manager.all() if isinstance(queryset, type) else queryset
+    identity_map = current()
+    if identity_map is None:
+        return queryset.get(pk=pk)
+
+    instance = identity_map.lookup(queryset.model, pk)
+    if instance is None:
+        instance = queryset.get(pk=pk)
+        identity_map.remember(instance)
+    return instance
+
+
+def related(instance, name):
+    """
+    Objeto de la ForeignKey `name` de `instance` pasando por el mapa; queda
+    además cacheado en la instancia, como tras un acceso normal.
+    """
+    field = instance._meta.get_field(name)
+    if field.is_cached(instance):
+        return getattr(instance, name)
+    pk = getattr(instance, field.attname)
+    if pk is None:
+        return None
+    value = get(field.related_model, pk)
+    field.set_cached_value(instance, value)
+    return value
+
+
+def remember(*instances):
+    identity_map = current()
+    if identity_map is not None:
+        for instance in instances:
+            identity_map.remember(instance)
+
+
+def forget(model, *pks):
+    identity_map = current()
+    if identity_map is not None:
+        for pk in pks:
+            identity_map.forget(model, pk)
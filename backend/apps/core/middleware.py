@@ -0,0 +1,32 @@
+import logging
+
+from django.conf import settings
+
+from . import identity_map
+
+logger = logging.getLogger(__name__)
+
+
+class IdentityMapMiddleware:
+    """
+    Abre un mapa de identidad para cada petición (apps.core.identity_map) y
+    registra sus aciertos y fallos. Con DEBUG también los devuelve en la
+    cabecera X-Identity-Map.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with identity_map.activate() as current:
+            response = self.get_response(request)
+
+        stats = current.stats()
+        if stats['hits'] or stats['misses']:
+            logger.debug(
+                "Mapa de identidad %s %s: %d aciertos, %d fallos %s",
+                request.method, request.path, stats['hits'], stats['misses'], stats['models']
+            )
+        if settings.DEBUG:
+            response['X-Identity-Map'] = f"hits={stats['hits']}; misses={stats['misses']}"
+        return response
@@ -0,0 +1,123 @@
+"""
+Seguimiento de cambios de campos dentro de la propia instancia.
+
+Las signals que reaccionan a un cambio (subida de nivel, quiz movido de
+curso, etc.) necesitan el valor anterior de algunos campos. En lugar de
+releer la fila en pre_save y guardarla en un dict global, el modelo recuerda
+los valores con los que se cargó de la base de datos (from_db) y los renueva
+después de cada save(), cuando ya han corrido las signals post_save.
+
+Uso:
+
+    class Quiz(TrackedFieldsMixin, models.Model):
+        TRACKED_FIELDS = ('course_id', 'is_active', 'xp_reward')
+
+    @receiver(post_save, sender=Quiz)
+    def ...(sender, instance, created, **kwargs):
+        if instance.has_changed('course_id'):
+            old_course_id = instance.previous_value('course_id')
+
+Los nombres son atributos del modelo (attname: `course_id`, no `course`).
+
+ATOMIC_FIELDS son campos que se actualizan con UPDATE ... F() (contadores,
+versiones, XP). Un save() completo de una fila existente los omite salvo que
+la propia instancia los haya cambiado; así una instancia cargada antes del
+UPDATE no devuelve a la fila su valor viejo. Con update_fields explícito se
+escriben los campos indicados.
+"""
+
+_MISSING = object()
+
+
+class TrackedFieldsMixin:
+    """Mixin para modelos: recuerda los valores cargados de TRACKED_FIELDS."""
+
+    TRACKED_FIELDS = ()
+    ATOMIC_FIELDS = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot_fields()
+        return instance
+
+    def save(self, *args, **kwargs):
+        self._load_missing_snapshot(kwargs.get('using'))
+        if self.ATOMIC_FIELDS and not self._state.adding and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = self._fields_to_update(kwargs.get('update_fields'))
+        super().save(*args, **kwargs)
+        self._snapshot_fields(kwargs.get('update_fields'))
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        self._snapshot_fields(fields)
+
+    def previous_value(self, field):
+        """Valor de `field` al cargarse o guardarse por última vez (None si la fila es nueva)."""
+        value = self._tracked_values().get(field, _MISSING)
+        return None if value is _MISSING else value
+
+    def has_changed(self, *fields):
+        """True si alguno de `fields` (o de TRACKED_FIELDS) difiere de su valor guardado."""
+        return bool(self.changed_fields(*fields))
+
+    def changed_fields(self, *fields):
+        """{campo: (anterior, actual)} de los campos seguidos que cambiaron."""
+        saved = self._tracked_values()
+        changes = {}
+        for field in fields or self.TRACKED_FIELDS:
+            old = saved.get(field, _MISSING)
+            new = getattr(self, field)
+            if old is _MISSING:
+                changes[field] = (None, new)
+            elif old != new:
+                changes[field] = (old, new)
+        return changes
+
+    def _fields_to_update(self, update_fields):
+        """update_fields de un save() completo sin los ATOMIC_FIELDS que no cambiaron."""
+        if update_fields is not None:
+            return update_fields
+
+        unchanged = {field for field in self.ATOMIC_FIELDS if not self.has_changed(field)}
+        if not unchanged:
+            return None
+        deferred = self.get_deferred_fields()
+        return [
+            field.name for field in self._meta.concrete_fields
+            if not field.primary_key
+            and field.attname not in deferred
+            and field.attname not in unchanged
+        ]
+
+    def _snapshot_field_names(self):
+        return tuple(self.TRACKED_FIELDS) + tuple(
+            field for field in self.ATOMIC_FIELDS if field not in self.TRACKED_FIELDS
+        )
+
+    def _tracked_values(self):
+        return self.__dict__.setdefault('_tracked_field_values', {})
+
+    def _snapshot_fields(self, fields=None):
+        """Toma los valores actuales como guardados (todos o solo `fields`)."""
+        saved = self._tracked_values()
+        deferred = self.get_deferred_fields()
+        for field in self._snapshot_field_names():
+            if fields is not None and field not in fields and field.removesuffix('_id') not in fields:
+                continue
+            if field not in deferred:
+                saved[field] = getattr(self, field)
+
+    def _load_missing_snapshot(self, using=None):
+        """
+        Instancia creada a mano con pk o cargada con only()/defer(): lee de la
+        base de datos los valores guardados que falten. Es el único caso con
+        consulta extra.
+        """
+        saved = self._tracked_values()
+        missing = [field for field in self._snapshot_field_names() if field not in saved]
+        if self.pk is None or not missing:
+            return
+        row = type(self)._base_manager.using(using).filter(pk=self.pk).values(*missing).first()
+        if row is not None:
+            saved.update(row)
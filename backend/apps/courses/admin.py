@@ -7,7 +7,10 @@ class CourseAdmin(admin.ModelAdmin):
     list_display = ('title', 'level_required', 'difficulty', 'is_active', 'created_by', 'created_at')
     list_filter = ('level_required', 'difficulty', 'is_active', 'created_at')
     search_fields = ('title', 'description', 'created_by__email')
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = (
+        'created_at', 'updated_at',
+        'active_quiz_count', 'total_xp_available', 'enrollment_count', 'completed_count'
+    )
     list_editable = ('is_active',)
     
     fieldsets = (
@@ -17,6 +20,9 @@ class CourseAdmin(admin.ModelAdmin):
         ('Detalles Adicionales', {
             'fields': ('thumbnail', 'estimated_duration', 'difficulty')
         }),
+        ('Contadores', {
+            'fields': ('active_quiz_count', 'total_xp_available', 'enrollment_count', 'completed_count')
+        }),
         ('Metadatos', {
             'fields': ('created_by', 'created_at', 'updated_at')
         }),
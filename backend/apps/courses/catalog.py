@@ -0,0 +1,90 @@
+"""
+Caché del catálogo de cursos.
+
+La parte común del catálogo solo depende del nivel del usuario (cursos con
+level_required <= nivel) o de si ve todos los cursos (admin/moderador), así
+que se guarda ya serializada por nivel. Lo propio de cada usuario
+(is_enrolled, user_progress) se añade al responder con una sola consulta a
+sus inscripciones.
+
+Invalidación por versión: las claves incluyen un número de versión y
+cualquier cambio de un curso o de sus contadores (quizzes, inscripciones)
+lo renueva, de modo que las entradas anteriores dejan de leerse y caducan
+solas.
+"""
+import time
+
+from django.core.cache import cache
+
+VERSION_KEY = 'course_catalog:version'
+TIMEOUT = 60 * 5
+MAX_LEVEL = 10
+
+
+def version():
+    current = cache.get(VERSION_KEY)
+    if current is None:
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        current = cache.get(VERSION_KEY)
+    return current
+
+
+def invalidate():
+    """Renueva la versión: las entradas guardadas dejan de usarse."""
+    cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def invalidate_on_commit():
+    """Invalida al confirmar la transacción, para no cachear datos a medio guardar."""
+    from django.db import transaction
+
+    transaction.on_commit(invalidate)
+
+
+def scope_for(user):
+    """Parte de la clave que determina qué cursos ve el usuario."""
+    if user.role in ['admin', 'moderator']:
+        return 'all'
+    return f'level{min(user.level, MAX_LEVEL)}'
+
+
+def shared_courses(user):
+    """
+    Cursos visibles para el usuario serializados sin datos personales
+    (lista de dicts). Solo consulta la tabla de cursos si no está en caché.
+    """
+    from .models import Course
+    from .serializers import CourseSerializer
+
+    key = f'course_catalog:v{version()}:{scope_for(user)}'
+    courses = cache.get(key)
+    if courses is None:
+        queryset = Course.objects.filter(is_active=True).select_related('created_by')
+        if scope_for(user) != 'all':
+            queryset = queryset.filter(level_required__lte=user.level)
+        courses = [dict(course) for course in CourseSerializer(queryset, many=True).data]
+        cache.set(key, courses, TIMEOUT)
+    return courses
+
+
+def with_user_data(courses, request):
+    """Copias de `courses` con las inscripciones del usuario y URLs absolutas."""
+    from .models import Enrollment
+
+    enrollments = dict(
+        Enrollment.objects.filter(
+            user=request.user,
+            course_id__in=[course['id'] for course in courses]
+        ).values_list('course_id', 'progress')
+    )
+    result = []
+    for course in courses:
+        course = dict(
+            course,
+            is_enrolled=course['id'] in enrollments,
+            user_progress=enrollments.get(course['id'], 0.0),
+        )
+        if course['thumbnail']:
+            course['thumbnail'] = request.build_absolute_uri(course['thumbnail'])
+        result.append(course)
+    return result
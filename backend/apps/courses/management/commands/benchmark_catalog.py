@@ -0,0 +1,96 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.courses import catalog
+from apps.courses.models import Course, Enrollment
+from apps.courses.views import AvailableCoursesView
+from apps.users.models import User
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide las consultas SQL del catálogo de cursos (una página de "
+        "AvailableCoursesView sin y con caché, y el serializer sobre el catálogo "
+        "completo) con distintos tamaños. Crea los datos dentro de una "
+        "transacción que se revierte al terminar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            type=int,
+            nargs="+",
+            default=[10, 100, 1000],
+            help="Número de cursos de cada medición."
+        )
+
+    def handle(self, *args, **options):
+        results = []
+        try:
+            with transaction.atomic():
+                user = User.objects.create_user(
+                    email="benchmark-catalog@example.com",
+                    username="benchmark-catalog",
+                    role="user",
+                    level=10,
+                )
+                created = 0
+                for size in sorted(options["sizes"]):
+                    courses = Course.objects.bulk_create([
+                        Course(title=f"Benchmark {i}", description="-", created_by=user)
+                        for i in range(created, size)
+                    ])
+                    # Inscribir al usuario en uno de cada tres cursos
+                    Enrollment.objects.bulk_create([
+                        Enrollment(user=user, course=course, progress=50.0)
+                        for course in courses[::3]
+                    ])
+                    created = max(created, size)
+                    results.append((size, *self._measure(user)))
+                raise _Rollback
+        except _Rollback:
+            pass
+        finally:
+            catalog.invalidate()
+
+        self.stdout.write(f"{'cursos':>8} {'página':>8} {'en caché':>9} {'catálogo':>9} {'ms':>8}")
+        for size, cold, warm, full, elapsed in results:
+            self.stdout.write(f"{size:>8} {cold:>8} {warm:>9} {full:>9} {elapsed * 1000:>8.1f}")
+
+        if len({result[1:4] for result in results}) > 1:
+            raise CommandError("El número de consultas crece con el tamaño del catálogo.")
+        self.stdout.write(self.style.SUCCESS("Consultas constantes en todos los tamaños."))
+
+    def _measure(self, user):
+        """
+        Devuelve las consultas de una página sin caché y con caché, las del
+        catálogo completo serializado y los segundos de esto último.
+        """
+        # bulk_create no emite signals: empezar con la caché vacía
+        catalog.invalidate()
+        cold, response = self._request_page(user)
+        warm, response = self._request_page(user)
+
+        view = AvailableCoursesView(request=response.renderer_context["request"], format_kwarg=None)
+        started = time.perf_counter()
+        with CaptureQueriesContext(connection) as full:
+            view.get_serializer(view.get_queryset(), many=True).data
+        return len(cold), len(warm), len(full), time.perf_counter() - started
+
+    def _request_page(self, user):
+        request = APIRequestFactory().get("/api/courses/available/")
+        force_authenticate(request, user=user)
+        with CaptureQueriesContext(connection) as queries:
+            response = AvailableCoursesView.as_view()(request)
+            response.render()
+        if response.status_code != 200:
+            raise CommandError(f"El catálogo respondió {response.status_code}.")
+        return queries, response
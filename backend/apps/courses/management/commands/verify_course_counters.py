@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.courses.models import Course
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara los contadores desnormalizados de Course (quizzes activos, XP, "
+        "inscritos y completados) con Quiz y Enrollment y corrige los desajustes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--course", type=int, help="Limitar a un curso por id.")
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Solo informar; termina con error si hay desajustes."
+        )
+
+    def handle(self, *args, **options):
+        courses = Course.objects.all()
+        if options["course"]:
+            courses = courses.filter(pk=options["course"])
+            if not courses.exists():
+                raise CommandError(f"Curso {options['course']} no encontrado.")
+
+        drift = Course.repair_counters(courses, dry_run=options["check"])
+
+        for course_id, diff in sorted(drift.items()):
+            changes = ", ".join(f"{field}: {stored} -> {real}" for field, (stored, real) in diff.items())
+            self.stdout.write(f"Curso {course_id}: {changes}")
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("Todos los contadores coinciden."))
+        elif options["check"]:
+            raise CommandError(f"{len(drift)} cursos con contadores desajustados.")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{len(drift)} cursos corregidos."))
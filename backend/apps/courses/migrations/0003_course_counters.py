@@ -0,0 +1,70 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:49
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_counters(apps, schema_editor):
+    """Calcula los contadores de cada curso desde Quiz y Enrollment."""
+    Course = apps.get_model('courses', 'Course')
+    Quiz = apps.get_model('quizzes', 'Quiz')
+    Enrollment = apps.get_model('courses', 'Enrollment')
+
+    quizzes = {
+        row['course_id']: row
+        for row in Quiz.objects.filter(is_active=True).values('course_id').annotate(
+            count=Count('id'),
+            xp=Sum('xp_reward')
+        ).order_by()
+    }
+    enrollments = {
+        row['course_id']: row
+        for row in Enrollment.objects.values('course_id').annotate(
+            count=Count('id'),
+            completed=Count('id', filter=Q(course_completed=True))
+        ).order_by()
+    }
+
+    courses = list(Course.objects.all())
+    for course in courses:
+        course.active_quiz_count = quizzes.get(course.pk, {}).get('count', 0)
+        course.total_xp_available = quizzes.get(course.pk, {}).get('xp') or 0
+        course.enrollment_count = enrollments.get(course.pk, {}).get('count', 0)
+        course.completed_count = enrollments.get(course.pk, {}).get('completed', 0)
+    Course.objects.bulk_update(
+        courses,
+        ['active_quiz_count', 'total_xp_available', 'enrollment_count', 'completed_count'],
+        batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0002_course_difficulty_course_estimated_duration_and_more'),
+        ('quizzes', '0002_alter_question_options_alter_quiz_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='active_quiz_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='completed_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='enrollment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='total_xp_available',
+            field=models.PositiveIntegerField(default=0, help_text='XP de los quizzes activos'),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
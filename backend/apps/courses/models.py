@@ -1,8 +1,10 @@
 from django.db import models
 from django.conf import settings
+from apps.core import identity_map
+from apps.core.tracking import TrackedFieldsMixin
 
 
-class Course(models.Model):
+class Course(TrackedFieldsMixin, models.Model):
     """Representa un curso desbloqueable según el nivel del estudiante."""
 
     LEVEL_CHOICES = [(i, f"Nivel {i}") for i in range(1, 11)]
@@ -31,6 +33,18 @@ class Course(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Contadores desnormalizados (mantenidos por signals, ver signals.py)
+    active_quiz_count = models.PositiveIntegerField(default=0)
+    total_xp_available = models.PositiveIntegerField(default=0, help_text="XP de los quizzes activos")
+    enrollment_count = models.PositiveIntegerField(default=0)
+    completed_count = models.PositiveIntegerField(default=0)
+
+    COUNTER_FIELDS = ['active_quiz_count', 'total_xp_available', 'enrollment_count', 'completed_count']
+
+    # Solo adjust_counters y repair_counters los escriben: un save() completo
+    # (edición del curso, admin) no devuelve a la fila los valores que cargó
+    ATOMIC_FIELDS = COUNTER_FIELDS
+
     class Meta:
         ordering = ["level_required", "title"]
         indexes = [
@@ -43,11 +57,85 @@ class Course(models.Model):
 
     @property
     def enrolled_students_count(self):
-        return self.enrollments.filter(course_completed=False).count()
+        return self.enrollment_count - self.completed_count
 
     @property
     def completed_students_count(self):
-        return self.enrollments.filter(course_completed=True).count()
+        return self.completed_count
+
+    @classmethod
+    def adjust_counters(cls, course_id, **deltas):
+        """Suma `deltas` a los contadores del curso con un UPDATE atómico."""
+        from django.db.models import F
+
+        from . import catalog
+
+        changes = {field: F(field) + delta for field, delta in deltas.items() if delta}
+        if changes:
+            cls.objects.filter(pk=course_id).update(**changes)
+            identity_map.forget(cls, course_id)
+            catalog.invalidate_on_commit()
+
+    @classmethod
+    def counted_values(cls, courses=None):
+        """
+        Valores reales de los contadores calculados desde Quiz y Enrollment:
+        {course_id: {campo: valor}} para `courses` (queryset) o todos.
+        """
+        from django.db.models import Count, Q, Sum
+        from apps.quizzes.models import Quiz
+
+        courses = cls.objects.all() if courses is None else courses
+        values = {
+            course_id: dict.fromkeys(cls.COUNTER_FIELDS, 0)
+            for course_id in courses.values_list('pk', flat=True)
+        }
+
+        quizzes = Quiz.objects.filter(course__in=courses, is_active=True).values('course_id').annotate(
+            count=Count('id'),
+            xp=Sum('xp_reward')
+        ).order_by()
+        for row in quizzes:
+            values[row['course_id']].update(active_quiz_count=row['count'], total_xp_available=row['xp'] or 0)
+
+        enrollments = Enrollment.objects.filter(course__in=courses).values('course_id').annotate(
+            count=Count('id'),
+            completed=Count('id', filter=Q(course_completed=True))
+        ).order_by()
+        for row in enrollments:
+            values[row['course_id']].update(enrollment_count=row['count'], completed_count=row['completed'])
+        return values
+
+    @classmethod
+    def repair_counters(cls, courses=None, dry_run=False):
+        """
+        Compara los contadores con los valores reales y corrige los que no
+        coinciden (salvo con dry_run). Devuelve {course_id: {campo: (guardado, real)}}
+        con las diferencias encontradas.
+        """
+        courses = cls.objects.all() if courses is None else courses
+        expected = cls.counted_values(courses)
+
+        drift, to_update = {}, []
+        for course in courses.only('pk', *cls.COUNTER_FIELDS):
+            real = expected[course.pk]
+            diff = {
+                field: (getattr(course, field), real[field])
+                for field in cls.COUNTER_FIELDS
+                if getattr(course, field) != real[field]
+            }
+            if diff:
+                drift[course.pk] = diff
+                for field, value in real.items():
+                    setattr(course, field, value)
+                to_update.append(course)
+
+        if to_update and not dry_run:
+            from . import catalog
+
+            cls.objects.bulk_update(to_update, cls.COUNTER_FIELDS, batch_size=500)
+            catalog.invalidate_on_commit()
+        return drift
 
 
 class Enrollment(models.Model):
@@ -76,24 +164,34 @@ class Enrollment(models.Model):
         self.progress = min(100.0, max(0.0, new_progress))
         
         if self.progress >= 100.0 and not self.course_completed:
-            self.course_completed = True
-            from django.utils import timezone
-            self.completed_at = timezone.now()
-        
+            self.mark_completed()
+        else:
+            self.save()
+
+    def mark_completed(self, completed_at=None):
+        """Marca el curso como completado y emite course_completed_signal."""
+        from django.utils import timezone
+        from apps.courses.signals import course_completed_signal
+
+        if self.course_completed:
+            return
+        self.course_completed = True
+        self.completed_at = completed_at or timezone.now()
         self.save()
+        course_completed_signal.send(sender=self.__class__, enrollment=self)
 
     def calculate_progress_based_on_quizzes(self):
         """Calcula el progreso basado en quizzes completados"""
-        from apps.quizzes.models import Quiz, QuizAttempt
-        course_quizzes = Quiz.objects.filter(course=self.course, is_active=True)
-        total_quizzes = course_quizzes.count()
+        from apps.quizzes.models import QuizAttempt
+        total_quizzes = self.course.active_quiz_count
         
         if total_quizzes == 0:
             return 0.0
             
         completed_quizzes = QuizAttempt.objects.filter(
             user=self.user,
-            quiz__in=course_quizzes,
+            quiz__course=self.course,
+            quiz__is_active=True,
             passed=True
         ).values('quiz').distinct().count()
         
@@ -1,6 +1,6 @@
 from rest_framework import serializers
+from apps.core import identity_map
 from .models import Course, Enrollment
-from apps.quizzes.models import Quiz
 
 
 class CourseSerializer(serializers.ModelSerializer):
@@ -9,7 +9,7 @@ class CourseSerializer(serializers.ModelSerializer):
     completed_students_count = serializers.ReadOnlyField()
     is_enrolled = serializers.SerializerMethodField()
     user_progress = serializers.SerializerMethodField()
-    quiz_count = serializers.SerializerMethodField()
+    quiz_count = serializers.IntegerField(source='active_quiz_count', read_only=True)
 
     class Meta:
         model = Course
@@ -18,25 +18,30 @@ class CourseSerializer(serializers.ModelSerializer):
             "thumbnail", "estimated_duration", "difficulty",
             "created_by", "created_by_name", "created_at", "updated_at",
             "enrolled_students_count", "completed_students_count",
-            "is_enrolled", "user_progress", "quiz_count"
+            "is_enrolled", "user_progress", "quiz_count", "total_xp_available"
         ]
-        read_only_fields = ["id", "created_by", "created_at", "updated_at"]
+        read_only_fields = ["id", "created_by", "created_at", "updated_at", "total_xp_available"]
 
-    def get_is_enrolled(self, obj):
+    def _user_enrollments(self):
+        """
+        {course_id: progreso} de las inscripciones del usuario. Se consulta una
+        sola vez por petición: el contexto es compartido por todos los cursos
+        de la lista (y por los serializers que anidan a este).
+        """
         request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return obj.enrollments.filter(user=request.user).exists()
-        return False
+        if not (request and request.user.is_authenticated):
+            return {}
+        if 'user_enrollments' not in self.context:
+            self.context['user_enrollments'] = dict(
+                Enrollment.objects.filter(user=request.user).values_list('course_id', 'progress')
+            )
+        return self.context['user_enrollments']
 
-    def get_user_progress(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            enrollment = obj.enrollments.filter(user=request.user).first()
-            return enrollment.progress if enrollment else 0.0
-        return 0.0
+    def get_is_enrolled(self, obj):
+        return obj.pk in self._user_enrollments()
 
-    def get_quiz_count(self, obj):
-        return Quiz.objects.filter(course=obj, is_active=True).count()
+    def get_user_progress(self, obj):
+        return self._user_enrollments().get(obj.pk, 0.0)
 
 
 class EnrollmentSerializer(serializers.ModelSerializer):
@@ -71,8 +76,11 @@ class EnrollCourseSerializer(serializers.Serializer):
     course_id = serializers.IntegerField()
 
     def validate_course_id(self, value):
+        # La vista vuelve a pedir el curso al mapa de identidad: una sola lectura
         try:
-            course = Course.objects.get(id=value, is_active=True)
+            course = identity_map.get(Course, value)
         except Course.DoesNotExist:
+            course = None
+        if course is None or not course.is_active:
             raise serializers.ValidationError("Curso no encontrado o inactivo")
         return value
\ No newline at end of file
@@ -1,7 +1,13 @@
-from django.db.models.signals import post_save
-from django.dispatch import receiver
-from .models import Enrollment
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver, Signal
+from . import catalog
+from .models import Course, Enrollment
 from apps.notifications.models import Notification
+from apps.quizzes.models import Quiz
+
+# Signal personalizada para cuando un estudiante completa un curso
+course_completed_signal = Signal()
 
 
 @receiver(post_save, sender=Enrollment)
@@ -14,4 +20,66 @@ def notify_course_enrollment(sender, instance, created, **kwargs):
             title="✅ Inscripción exitosa",
             message=f"Te has inscrito en el curso '{instance.course.title}'. ¡Comienza a aprender!",
             related_course_id=instance.course.id,
-        )
\ No newline at end of file
+        )
+
+
+# ---------- Caché del catálogo ----------
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def invalidate_catalog_on_course_change(sender, instance, **kwargs):
+    catalog.invalidate_on_commit()
+
+
+# ---------- Contadores de Course ----------
+
+def _quiz_contribution(state):
+    """Lo que aporta un quiz a los contadores de su curso: (curso, quizzes, xp)."""
+    course_id, is_active, xp_reward = state
+    return (course_id, 1, xp_reward) if is_active else (course_id, 0, 0)
+
+
+@receiver(post_save, sender=Quiz)
+def update_course_counters_on_quiz(sender, instance, created, **kwargs):
+    # Valores con los que se cargó el quiz (Quiz.TRACKED_FIELDS)
+    if not instance.has_changed():
+        return
+
+    old_state = tuple(instance.previous_value(field) for field in Quiz.TRACKED_FIELDS)
+    new_state = (instance.course_id, instance.is_active, instance.xp_reward)
+    with transaction.atomic():
+        if old_state[0] is not None:
+            course_id, quizzes, xp = _quiz_contribution(old_state)
+            Course.adjust_counters(course_id, active_quiz_count=-quizzes, total_xp_available=-xp)
+        course_id, quizzes, xp = _quiz_contribution(new_state)
+        Course.adjust_counters(course_id, active_quiz_count=quizzes, total_xp_available=xp)
+
+
+@receiver(post_delete, sender=Quiz)
+def update_course_counters_on_quiz_delete(sender, instance, **kwargs):
+    course_id, quizzes, xp = _quiz_contribution((instance.course_id, instance.is_active, instance.xp_reward))
+    Course.adjust_counters(course_id, active_quiz_count=-quizzes, total_xp_available=-xp)
+
+
+@receiver(post_save, sender=Enrollment)
+def update_course_counters_on_enrollment(sender, instance, created, **kwargs):
+    if created:
+        Course.adjust_counters(
+            instance.course_id,
+            enrollment_count=1,
+            completed_count=1 if instance.course_completed else 0
+        )
+
+
+@receiver(course_completed_signal)
+def update_course_counters_on_completion(sender, enrollment, **kwargs):
+    Course.adjust_counters(enrollment.course_id, completed_count=1)
+
+
+@receiver(post_delete, sender=Enrollment)
+def update_course_counters_on_enrollment_delete(sender, instance, **kwargs):
+    Course.adjust_counters(
+        instance.course_id,
+        enrollment_count=-1,
+        completed_count=-1 if instance.course_completed else 0
+    )
@@ -1,3 +1,218 @@
+from django.core.cache import cache
+from django.db.models.signals import pre_save
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient, APIRequestFactory
 
-# Create your tests here.
+from apps.quizzes.models import Quiz
+from apps.users.models import User
+from .models import Course, Enrollment
+from .serializers import CourseSerializer
+
+
+class CourseCounterTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user("admin@x.com", "pw", role="admin")
+        self.students = [User.objects.create_user(f"u{i}@x.com", "pw", role="user") for i in range(3)]
+        self.course = Course.objects.create(title="C1", description="d", created_by=self.admin)
+
+    def counters(self, course=None):
+        course = Course.objects.get(pk=(course or self.course).pk)
+        return {field: getattr(course, field) for field in Course.COUNTER_FIELDS}
+
+    def assertCountersMatchRealValues(self):
+        self.assertEqual(Course.repair_counters(dry_run=True), {})
+
+    def test_counters_follow_quizzes(self):
+        quizzes = [
+            Quiz.objects.create(course=self.course, title=f"Q{i}", xp_reward=10 * (i + 1))
+            for i in range(3)
+        ]
+        self.assertEqual(self.counters()['active_quiz_count'], 3)
+        self.assertEqual(self.counters()['total_xp_available'], 60)
+
+        quizzes[2].is_active = False
+        quizzes[2].save()
+        quizzes[1].xp_reward = 50
+        quizzes[1].save()
+        self.assertEqual(self.counters()['active_quiz_count'], 2)
+        self.assertEqual(self.counters()['total_xp_available'], 60)
+
+        other = Course.objects.create(title="C2", description="d", created_by=self.admin)
+        quizzes[0].course = other
+        quizzes[0].save()
+        self.assertEqual(self.counters()['active_quiz_count'], 1)
+        self.assertEqual(self.counters(other)['total_xp_available'], 10)
+
+        quizzes[1].delete()
+        self.assertEqual(self.counters()['active_quiz_count'], 0)
+        self.assertCountersMatchRealValues()
+
+    def test_counters_follow_enrollments(self):
+        enrollments = [Enrollment.objects.create(user=user, course=self.course) for user in self.students]
+        enrollments[0].mark_completed()
+        self.assertEqual(self.counters()['enrollment_count'], 3)
+        self.assertEqual(self.counters()['completed_count'], 1)
+
+        enrollments[0].delete()
+        enrollments[1].delete()
+        self.assertEqual(self.counters()['enrollment_count'], 1)
+        self.assertEqual(self.counters()['completed_count'], 0)
+        self.assertCountersMatchRealValues()
+
+    def test_course_edit_keeps_concurrent_enrollment(self):
+        # Instancia cargada antes de la inscripción (p. ej. en otra petición)
+        stale = Course.objects.get(pk=self.course.pk)
+        Enrollment.objects.create(user=self.students[0], course=self.course)
+
+        stale.title = "Nuevo título"
+        stale.save()
+
+        self.assertEqual(self.counters()['enrollment_count'], 1)
+        self.assertEqual(Course.objects.get(pk=self.course.pk).title, "Nuevo título")
+
+    def test_update_view_keeps_concurrent_enrollment(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+
+        # Inscripción que llega entre la lectura del curso en la vista y su save()
+        def enroll_meanwhile(sender, instance, **kwargs):
+            Enrollment.objects.get_or_create(user=self.students[0], course_id=instance.pk)
+
+        pre_save.connect(enroll_meanwhile, sender=Course)
+        try:
+            response = client.patch(f"/api/courses/{self.course.pk}/update/", {"title": "Editado"}, format="json")
+        finally:
+            pre_save.disconnect(enroll_meanwhile, sender=Course)
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.counters()['enrollment_count'], 1)
+
+    def test_explicit_update_fields_write_counters(self):
+        course = Course.objects.get(pk=self.course.pk)
+        course.enrollment_count = 7
+        course.save(update_fields=['enrollment_count'])
+        self.assertEqual(self.counters()['enrollment_count'], 7)
+
+
+class CourseCatalogTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user("admin@x.com", "pw", role="admin")
+        self.student = User.objects.create_user("u@x.com", "pw", role="user")
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+        self.create_courses(3)
+        Enrollment.objects.create(user=self.student, course=Course.objects.first())
+
+    def create_courses(self, count):
+        start = Course.objects.count()
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(start, start + count):
+                course = Course.objects.create(title=f"C{i}", description="d", created_by=self.admin)
+                Quiz.objects.create(course=course, title=f"Q{i}", xp_reward=10)
+
+    def get_catalog(self, queries):
+        with self.assertNumQueries(queries):
+            response = self.client.get('/api/courses/available/')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.data
+
+    def test_catalog_queries_are_constant(self):
+        # En frío: cursos del nivel e inscripciones del usuario; en caliente solo estas
+        self.assertEqual(self.get_catalog(2)['count'], 3)
+        self.get_catalog(1)
+
+        self.create_courses(25)
+        data = self.get_catalog(2)
+        self.assertEqual(data['count'], 28)
+        self.assertEqual(len(data['results']), 20)
+        self.get_catalog(1)
+
+    def test_full_catalog_serialization_queries_are_constant(self):
+        request = APIRequestFactory().get('/api/courses/available/')
+        request.user = self.student
+
+        def serialize(queries):
+            courses = Course.objects.filter(is_active=True).select_related('created_by')
+            with self.assertNumQueries(queries):
+                return CourseSerializer(courses, many=True, context={'request': request}).data
+
+        # Cursos con su autor e inscripciones del usuario
+        self.assertEqual(len(serialize(2)), 3)
+        self.create_courses(10)
+        self.assertEqual(len(serialize(2)), 13)
+
+    def test_cached_catalog_follows_changes(self):
+        def first(data):
+            return {key: data['results'][0][key] for key in ('title', 'is_enrolled', 'quiz_count', 'enrolled_students_count')}
+
+        self.assertEqual(first(self.get_catalog(2)), {
+            'title': "C0", 'is_enrolled': True, 'quiz_count': 1, 'enrolled_students_count': 1,
+        })
+
+        course = Course.objects.get(title="C0")
+        with self.captureOnCommitCallbacks(execute=True):
+            Quiz.objects.create(course=course, title="Q extra", xp_reward=10)
+            Enrollment.objects.create(user=self.admin, course=course)
+        self.assertEqual(first(self.get_catalog(2)), {
+            'title': "C0", 'is_enrolled': True, 'quiz_count': 2, 'enrolled_students_count': 2,
+        })
+
+        # Otro estudiante del mismo nivel reutiliza la caché con sus inscripciones
+        self.client.force_authenticate(User.objects.create_user("v@x.com", "pw", role="user"))
+        self.assertFalse(self.get_catalog(1)['results'][0]['is_enrolled'])
+
+    def test_catalog_is_cached_per_level(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Course.objects.create(title="Avanzado", description="d", created_by=self.admin, level_required=2)
+        self.assertEqual(self.get_catalog(2)['count'], 3)
+
+        # Al subir de nivel cambia la clave: otra lectura en frío, ya con el curso
+        self.student.add_xp(User.LEVEL_THRESHOLDS[1])
+        self.assertEqual(self.student.level, 2)
+        self.assertEqual(self.get_catalog(2)['count'], 4)
+        self.get_catalog(1)
+
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.get_catalog(2)['count'], 4)
+
+    def test_course_edits_invalidate_after_commit(self):
+        self.get_catalog(2)
+        course = Course.objects.get(title="C1")
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            course.is_active = False
+            course.save()
+            # Antes de confirmar la caché sigue sirviendo la versión anterior
+            self.assertEqual(self.get_catalog(1)['count'], 3)
+        for callback in callbacks:
+            callback()
+        self.assertEqual([row['title'] for row in self.get_catalog(2)['results']], ["C0", "C2"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Course.objects.get(title="C2").delete()
+        self.assertEqual([row['title'] for row in self.get_catalog(2)['results']], ["C0"])
+
+
+class EnrollCourseTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user("admin@x.com", "pw", role="admin")
+        self.student = User.objects.create_user("u@x.com", "pw", role="user")
+        self.course = Course.objects.create(title="C1", description="d", created_by=self.admin)
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def test_enroll_reads_the_course_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/courses/enroll/', {'course_id': self.course.pk}, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        course_selects = [query for query in queries if query['sql'].startswith('SELECT "courses_course"."id"')]
+        self.assertEqual(len(course_selects), 1)
+
+    def test_inactive_course_is_not_found(self):
+        self.course.is_active = False
+        self.course.save()
+        response = self.client.post('/api/courses/enroll/', {'course_id': self.course.pk}, format='json')
+        self.assertEqual(response.status_code, 404)
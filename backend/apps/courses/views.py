@@ -4,6 +4,8 @@ from rest_framework.response import Response
 from django.db.models import Q, Count, Avg
 from django.shortcuts import get_object_or_404
 
+from apps.core import identity_map
+from . import catalog
 from .models import Course, Enrollment
 from .serializers import (
     CourseSerializer, 
@@ -24,23 +26,34 @@ class AvailableCoursesView(generics.ListAPIView):
 
     def get_queryset(self):
         user = self.request.user
+        # Los contadores viven en Course y las inscripciones del usuario se
+        # consultan una vez en el serializer: consultas constantes por página
+        courses = Course.objects.filter(is_active=True).select_related('created_by')
         # Para admin/moderator ven todos los cursos, para users solo los de su nivel
         if user.role in ['admin', 'moderator']:
-            return Course.objects.filter(is_active=True).prefetch_related('enrollments')
-        else:
-            return Course.objects.filter(level_required__lte=user.level, is_active=True).prefetch_related('enrollments')
+            return courses
+        return courses.filter(level_required__lte=user.level)
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context['request'] = self.request
         return context
 
+    def list(self, request, *args, **kwargs):
+        # Parte común cacheada por nivel (ver catalog.py); solo la página
+        # devuelta se completa con las inscripciones del usuario
+        courses = catalog.shared_courses(request.user)
+        page = self.paginate_queryset(courses)
+        if page is not None:
+            return self.get_paginated_response(catalog.with_user_data(page, request))
+        return Response(catalog.with_user_data(courses, request))
+
 
 class CourseDetailView(generics.RetrieveAPIView):
     """Detalle de un curso específico"""
     serializer_class = CourseSerializer
     permission_classes = [permissions.IsAuthenticated]
-    queryset = Course.objects.filter(is_active=True)
+    queryset = Course.objects.filter(is_active=True).select_related('created_by')
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -96,10 +109,12 @@ class EnrollCourseView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Obtener el curso
+            # Obtener el curso (una lectura por petición, ver apps.core.identity_map)
             try:
-                course = Course.objects.get(id=course_id, is_active=True)
+                course = identity_map.get(Course, course_id)
             except Course.DoesNotExist:
+                course = None
+            if course is None or not course.is_active:
                 return Response(
                     {"error": "Curso no encontrado o inactivo."},
                     status=status.HTTP_404_NOT_FOUND
@@ -208,8 +223,8 @@ class CourseStatisticsView(APIView):
             'total_enrollments': Enrollment.objects.count(),
             'completed_enrollments': Enrollment.objects.filter(course_completed=True).count(),
             'average_progress': Enrollment.objects.aggregate(avg_progress=Avg('progress'))['avg_progress'] or 0,
-            'popular_courses': Course.objects.filter(is_active=True).annotate(
-                enrollment_count=Count('enrollments')
-            ).order_by('-enrollment_count')[:5].values('id', 'title', 'enrollment_count')
+            'popular_courses': Course.objects.filter(is_active=True).order_by(
+                '-enrollment_count'
+            )[:5].values('id', 'title', 'enrollment_count')
         }
         return Response(stats)
\ No newline at end of file
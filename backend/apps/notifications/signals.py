@@ -1,4 +1,4 @@
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.conf import settings
 from asgiref.sync import async_to_sync
@@ -9,11 +9,11 @@ from .models import Notification
 # Modelos que disparan notificaciones
 from apps.quizzes.models import QuizAttempt, Quiz
 from apps.courses.models import Course, Enrollment
+from apps.courses.signals import course_completed_signal
 from apps.stats.models import XpHistory
+from apps.stats.signals import xp_history_bulk_created
 from apps.users.models import User
-
-# Para detectar subida de nivel: guardamos level previo en pre_save
-_user_old_level = {}
+from apps.users.signals import level_changed_signal
 
 
 # ---------- helper: enviar por WebSocket ----------
@@ -90,7 +90,7 @@ def notify_new_quiz(sender, instance, created, **kwargs):
     from apps.courses.models import Enrollment
     enrollements = Enrollment.objects.filter(
         course=instance.course,
-        is_active=True
+        user__is_active=True
     ).select_related('user')
     
     notifs = []
@@ -131,77 +131,65 @@ def notify_quiz_progress(sender, instance, created, **kwargs):
 
 
 # 4. Nivel aumentado
-@receiver(pre_save, sender=User)
-def cache_old_level(sender, instance, **kwargs):
-    if not instance.pk:
-        return
-    try:
-        old = sender.objects.get(pk=instance.pk)
-        _user_old_level[instance.pk] = old.level
-    except sender.DoesNotExist:
-        _user_old_level[instance.pk] = None
+def _notify_level_up(user, level):
+    notif = Notification.objects.create(
+        user=user,
+        type="level_up",
+        title="🎉 ¡Has subido de nivel!",
+        message=f"Felicidades — ahora eres nivel {level}. Sigue así.",
+    )
+    send_realtime_notification(notif)
 
 @receiver(post_save, sender=User)
 def notify_level_change(sender, instance, created, **kwargs):
     if created:
         return
         
-    old_level = _user_old_level.pop(instance.pk, None)
+    # Nivel con el que se cargó el usuario (TRACKED_FIELDS), sin releer la fila
+    old_level = instance.previous_value("level")
     if old_level is None:
         return
         
     if instance.level > old_level:
-        notif = Notification.objects.create(
-            user=instance,
-            type="level_up",
-            title="🎉 ¡Has subido de nivel!",
-            message=f"Felicidades — ahora eres nivel {instance.level}. Sigue así.",
-        )
-        send_realtime_notification(notif)
+        _notify_level_up(instance, instance.level)
+
+# add_xp no pasa por save(): anuncia el cambio con los valores del UPDATE
+@receiver(level_changed_signal)
+def notify_level_up_on_xp(sender, user, old_level, new_level, **kwargs):
+    if new_level > old_level:
+        _notify_level_up(user, new_level)
 
 
 # ---------- B. NOTIFICACIONES SOLO PARA MODERADORES ----------
 
 # 5. Usuario reportó un problema
 # 6. Usuario completó todos los quizzes del curso
-@receiver(post_save, sender=Enrollment)
-def notify_course_completion(sender, instance, created, **kwargs):
-    if created or not instance.completed:
-        return
-
-    # Verificar si completó todos los quizzes
-    from apps.quizzes.models import Quiz, QuizAttempt
-    course_quizzes = Quiz.objects.filter(course=instance.course, is_active=True)
-    completed_quizzes = QuizAttempt.objects.filter(
-        user=instance.user,
-        quiz__in=course_quizzes,
-        passed=True
-    ).values('quiz').distinct()
-
-    if completed_quizzes.count() == course_quizzes.count():
-        # Notificar a moderadores del curso
-        moderators = User.objects.filter(
-            role="moderator", 
-            is_active=True
-        )
-        
-        notifs = []
-        for moderator in moderators:
-            notifs.append(Notification(
-                user=moderator,
-                type="course_completed",
-                title="✅ Curso completado",
-                message=f"{instance.user.email} completó todos los quizzes de '{instance.course.title}'",
-                related_user_id=instance.user.id,
-                related_course_id=instance.course.id,
-            ))
-        
-        if notifs:
-            Notification.objects.bulk_create(notifs)
-            for notification in Notification.objects.filter(
-                id__in=[n.id for n in notifs]
-            ).select_related('user'):
-                send_realtime_notification(notification)
+# course_completed_signal se emite una sola vez, cuando el progreso llega al 100 %
+@receiver(course_completed_signal)
+def notify_course_completion(sender, enrollment, **kwargs):
+    # Notificar a moderadores del curso
+    moderators = User.objects.filter(
+        role="moderator", 
+        is_active=True
+    )
+    
+    notifs = []
+    for moderator in moderators:
+        notifs.append(Notification(
+            user=moderator,
+            type="course_completed",
+            title="✅ Curso completado",
+            message=f"{enrollment.user.email} completó todos los quizzes de '{enrollment.course.title}'",
+            related_user_id=enrollment.user_id,
+            related_course_id=enrollment.course_id,
+        ))
+    
+    if notifs:
+        Notification.objects.bulk_create(notifs)
+        for notification in Notification.objects.filter(
+            id__in=[n.id for n in notifs]
+        ).select_related('user'):
+            send_realtime_notification(notification)
 
 
 # ---------- C. NOTIFICACIONES SOLO PARA ADMIN ----------
@@ -248,16 +236,17 @@ def notify_study_streak(user, streak_days):
 
 
 # 9. Recompensa desbloqueada
+# Milestones de XP para recompensas
+REWARD_MILESTONES = [100, 250, 500, 1000, 2000, 5000]
+
 @receiver(post_save, sender=XpHistory)
 def notify_reward_unlocked(sender, instance, created, **kwargs):
     if not created:
         return
 
-    # Milestones de XP para recompensas
-    MILESTONES = [100, 250, 500, 1000, 2000, 5000]
     user_total_xp = instance.user.xp
     
-    if user_total_xp in MILESTONES:
+    if user_total_xp in REWARD_MILESTONES:
         notif = Notification.objects.create(
             user=instance.user,
             type="reward_unlocked",
@@ -266,6 +255,21 @@ def notify_reward_unlocked(sender, instance, created, **kwargs):
         )
         send_realtime_notification(notif)
 
+@receiver(xp_history_bulk_created)
+def notify_rewards_unlocked_bulk(sender, user, events, old_xp, **kwargs):
+    # Como notify_reward_unlocked evento a evento: la XP tras cada ganancia
+    xp = old_xp
+    for event in events:
+        xp += event.xp_gained
+        if xp in REWARD_MILESTONES:
+            notif = Notification.objects.create(
+                user=user,
+                type="reward_unlocked",
+                title="🏆 Recompensa desbloqueada",
+                message=f"¡Felicidades! Has alcanzado {xp} XP y desbloqueado una recompensa especial.",
+            )
+            send_realtime_notification(notif)
+
 
 # ---------- NOTIFICACIONES DE ERRORES CRÍTICOS ----------
 
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Progress, GlobalProgress
+from .models import Progress
 
 
 @admin.register(Progress)
@@ -27,30 +27,3 @@ class ProgressAdmin(admin.ModelAdmin):
             'fields': ('updated_at',)
         }),
     )
-
-
-@admin.register(GlobalProgress)
-class GlobalProgressAdmin(admin.ModelAdmin):
-    list_display = ('user', 'total_courses_completed', 'total_xp_earned', 'current_streak', 'updated_at')
-    list_filter = ('updated_at',)
-    search_fields = ('user__email',)
-    readonly_fields = ('updated_at',)
-    
-    fieldsets = (
-        ('Usuario', {
-            'fields': ('user',)
-        }),
-        ('Estadísticas Globales', {
-            'fields': (
-                'total_courses_enrolled', 'total_courses_completed',
-                'total_quizzes_completed', 'total_xp_earned',
-                'average_progress'
-            )
-        }),
-        ('Rachas', {
-            'fields': ('current_streak', 'longest_streak')
-        }),
-        ('Metadatos', {
-            'fields': ('updated_at',)
-        }),
-    )
\ No newline at end of file
@@ -0,0 +1,16 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:46
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('progress', '0002_globalprogress_alter_progress_options_and_more'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='GlobalProgress',
+        ),
+    ]
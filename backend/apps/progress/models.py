@@ -3,9 +3,11 @@ from django.conf import settings
 from django.db.models import Avg, Count, Sum, Max
 from apps.courses.models import Course, Enrollment
 from apps.quizzes.models import QuizAttempt
+from apps.core import identity_map
+from apps.core.tracking import TrackedFieldsMixin
 
 
-class Progress(models.Model):
+class Progress(TrackedFieldsMixin, models.Model):
     """Progreso global de un usuario por curso."""
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="progress_records")
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="progress_records")
@@ -19,6 +21,9 @@ class Progress(models.Model):
     streak_days = models.PositiveIntegerField(default=0, help_text="Días consecutivos estudiando este curso")
     last_study_date = models.DateField(null=True, blank=True)
 
+    # Valores que ordenan el leaderboard (ver apps.stats.signals)
+    TRACKED_FIELDS = ('course_completed', 'streak_days')
+
     class Meta:
         unique_together = ("user", "course")
         verbose_name_plural = "Progress"
@@ -37,8 +42,8 @@ class Progress(models.Model):
         from django.utils import timezone
         from datetime import date
         
-        # Obtener quizzes activos del curso
-        total_quizzes = self.course.quizzes.filter(is_active=True).count()
+        # Quizzes activos del curso (contador mantenido en Course)
+        total_quizzes = self.course.active_quiz_count
         
         # Obtener quizzes completados (aprobados)
         completed_attempts = QuizAttempt.objects.filter(
@@ -58,6 +63,8 @@ class Progress(models.Model):
             passed=True
         ).aggregate(models.Sum("quiz__xp_reward"))["quiz__xp_reward__sum"] or 0
 
+        previous_completed, previous_percentage = self.completed_quizzes, self.percentage
+
         # Actualizar campos
         self.total_quizzes = total_quizzes
         self.completed_quizzes = completed_quizzes
@@ -71,44 +78,39 @@ class Progress(models.Model):
         # Si se completó el curso ahora, registrar la fecha
         if self.course_completed and not old_completed_status:
             self.completed_at = timezone.now()
-            
-            # Actualizar también el enrollment
-            enrollment = Enrollment.objects.filter(user=self.user, course=self.course).first()
-            if enrollment:
-                enrollment.course_completed = True
-                enrollment.completed_at = timezone.now()
-                enrollment.save()
+
+        # Actualizar también el enrollment
+        enrollment = Enrollment.objects.filter(user=self.user, course=self.course).first()
+        if enrollment:
+            enrollment.user, enrollment.course = self.user, self.course
+            enrollment.progress = self.percentage
+            if self.course_completed and not enrollment.course_completed:
+                enrollment.mark_completed(self.completed_at)
+            else:
+                enrollment.save(update_fields=['progress', 'last_accessed'])
         
         # Actualizar racha de estudio
         self._update_streak()
         
         self.save()
 
+        # Totales del usuario (quizzes completados y progreso medio)
+        from apps.stats.models import UserStatistic
+        UserStatistic.record_progress_change(
+            self.user,
+            self.completed_quizzes - previous_completed,
+            self.percentage - previous_percentage
+        )
+
     def _update_streak(self):
-        """Actualiza la racha de estudio del usuario."""
-        from django.utils import timezone
-        from datetime import timedelta
-        
-        today = timezone.now().date()
-        
-        if not self.last_study_date:
-            # Primera vez que estudia
-            self.streak_days = 1
-            self.last_study_date = today
-        else:
-            days_diff = (today - self.last_study_date).days
-            
-            if days_diff == 0:
-                # Ya estudió hoy, mantener la racha
-                pass
-            elif days_diff == 1:
-                # Día consecutivo, incrementar racha
-                self.streak_days += 1
-                self.last_study_date = today
-            else:
-                # Rompió la racha, reiniciar
-                self.streak_days = 1
-                self.last_study_date = today
+        """Toma la racha de estudio del curso del libro de días activos."""
+        from apps.stats.models import ActivityDay
+
+        self.streak_days = ActivityDay.current_streak(self.user, course=self.course)
+        self.last_study_date = ActivityDay.objects.filter(
+            user=self.user,
+            course=self.course
+        ).values_list('day', flat=True).first()
 
     @property
     def remaining_quizzes(self):
@@ -127,75 +129,161 @@ class Progress(models.Model):
 
     @classmethod
     def update_user_progress_for_course(cls, user, course):
-        """Método de clase para actualizar progreso de un usuario en un curso."""
-        progress, created = cls.objects.get_or_create(user=user, course=course)
+        """Método de clase para actualizar progreso de un usuario en un curso (o su id)."""
+        progress, created = cls.objects.get_or_create(user=user, course_id=getattr(course, 'pk', course))
+        # Usuario y curso que ya tiene quien llama (o el mapa de la petición)
+        progress.user = user
+        if isinstance(course, Course):
+            progress.course = course
+        else:
+            identity_map.related(progress, 'course')
         progress.update_progress()
         return progress
 
+    @classmethod
+    def update_for_course(cls, course):
+        """Recalcula el progreso de todos los inscritos en un curso (o su id)."""
+        return cls.bulk_recompute(course=course)
+
     @classmethod
     def update_all_user_progress(cls, user):
         """Actualiza el progreso de un usuario en todos sus cursos inscritos."""
-        enrolled_courses = Course.objects.filter(enrollments__user=user)
-        for course in enrolled_courses:
-            cls.update_user_progress_for_course(user, course)
-
-
-class GlobalProgress(models.Model):
-    """Progreso global del usuario en toda la plataforma."""
-    user = models.OneToOneField(
-        settings.AUTH_USER_MODEL, 
-        on_delete=models.CASCADE, 
-        related_name="global_progress"
-    )
-    total_courses_enrolled = models.PositiveIntegerField(default=0)
-    total_courses_completed = models.PositiveIntegerField(default=0)
-    total_quizzes_completed = models.PositiveIntegerField(default=0)
-    total_xp_earned = models.PositiveIntegerField(default=0)
-    average_progress = models.FloatField(default=0.0)
-    current_streak = models.PositiveIntegerField(default=0)
-    longest_streak = models.PositiveIntegerField(default=0)
-    updated_at = models.DateTimeField(auto_now=True)
+        return cls.bulk_recompute(user=user)
 
-    class Meta:
-        verbose_name_plural = "Global Progress"
+    @classmethod
+    def bulk_recompute(cls, user=None, course=None, user_ids=None, notify=True):
+        """
+        Recalcula en bloque el progreso de todos los cursos de `user` (o de
+        los usuarios `user_ids`) y/o de todos los inscritos en `course`: una
+        consulta agrupada (subconsultas por fila) y escrituras con bulk_update,
+        incluido Enrollment.progress. La racha no se toca aquí (la mantiene
+        compute_streaks). Con notify=False no se emiten signals ni se tocan el
+        leaderboard ni UserStatistic (reconstrucciones completas).
+        Devuelve el número de filas de progreso modificadas.
+        """
+        from django.db import transaction
+        from django.db.models import F, IntegerField, OuterRef, Subquery
+        from django.db.models.functions import Coalesce
+        from django.utils import timezone
 
-    def __str__(self):
-        return f"Progreso global de {self.user.email}"
+        enrollments = Enrollment.objects.all()
+        if user is not None:
+            enrollments = enrollments.filter(user=user)
+        if user_ids is not None:
+            enrollments = enrollments.filter(user_id__in=user_ids)
+        if course is not None:
+            enrollments = enrollments.filter(course_id=getattr(course, 'pk', course))
 
-    def update_global_progress(self):
-        """Actualiza las estadísticas globales del usuario."""
-        from django.db.models import Avg, Count, Sum
-        
-        # Obtener todos los progresos del usuario
-        progresses = Progress.objects.filter(user=self.user)
-        
-        # Calcular estadísticas
-        self.total_courses_enrolled = progresses.count()
-        self.total_courses_completed = progresses.filter(course_completed=True).count()
-        self.total_quizzes_completed = progresses.aggregate(
-            total=Sum('completed_quizzes')
-        )['total'] or 0
-        self.total_xp_earned = progresses.aggregate(
-            total=Sum('xp_earned')
-        )['total'] or 0
-        self.average_progress = progresses.aggregate(
-            avg=Avg('percentage')
-        )['avg'] or 0.0
-        
-        # Calcular racha actual (máxima racha entre todos los cursos)
-        self.current_streak = progresses.aggregate(
-            max_streak=Max('streak_days')
-        )['max_streak'] or 0
-        
-        # Actualizar racha más larga si es necesario
-        if self.current_streak > self.longest_streak:
-            self.longest_streak = self.current_streak
-        
-        self.save()
+        # Inscripciones sin fila de progreso (datos anteriores a las signals)
+        cls.objects.bulk_create(
+            [cls(user_id=u, course_id=c) for u, c in enrollments.values_list('user_id', 'course_id')],
+            ignore_conflicts=True
+        )
+
+        def count_subquery(queryset, group_by, value):
+            return Coalesce(
+                Subquery(queryset.values(group_by).annotate(value=value).values('value')[:1]),
+                0,
+                output_field=IntegerField()
+            )
+
+        passed = QuizAttempt.objects.filter(
+            user=OuterRef('user'),
+            quiz__course=OuterRef('course'),
+            quiz__is_active=True,
+            passed=True
+        )
+        progresses = cls.objects.all()
+        if user is not None:
+            progresses = progresses.filter(user=user)
+        if user_ids is not None:
+            progresses = progresses.filter(user_id__in=user_ids)
+        if course is not None:
+            progresses = progresses.filter(course_id=getattr(course, 'pk', course))
+
+        progresses = progresses.annotate(
+            new_total=F('course__active_quiz_count'),
+            new_completed=count_subquery(passed, 'user', Count('quiz', distinct=True)),
+            new_xp=count_subquery(passed, 'user', Sum('quiz__xp_reward')),
+        )
+
+        now = timezone.now()
+        changed = []
+        completion_changed = set()
+        deltas = {}
+        for progress in progresses:
+            total, completed = progress.new_total, progress.new_completed
+            percentage = (completed / total * 100) if total > 0 else 0
+            is_completed = percentage >= 100.0
+
+            values = (total, completed, percentage, progress.new_xp, is_completed)
+            current = (
+                progress.total_quizzes, progress.completed_quizzes, progress.percentage,
+                progress.xp_earned, progress.course_completed
+            )
+            if values == current:
+                continue
+
+            quizzes_delta, percentage_delta = deltas.get(progress.user_id, (0, 0.0))
+            deltas[progress.user_id] = (
+                quizzes_delta + completed - progress.completed_quizzes,
+                percentage_delta + percentage - progress.percentage
+            )
+            if is_completed != progress.course_completed:
+                completion_changed.add(progress.user_id)
+            if is_completed and not progress.course_completed:
+                progress.completed_at = now
+            (progress.total_quizzes, progress.completed_quizzes, progress.percentage,
+             progress.xp_earned, progress.course_completed) = values
+            progress.updated_at = now
+            changed.append(progress)
+
+        if not changed:
+            return 0
+
+        by_key = {(p.user_id, p.course_id): p for p in changed}
+        enrollment_rows = []
+        completed_enrollments = []
+        for enrollment in enrollments.filter(
+            user_id__in={p.user_id for p in changed},
+            course_id__in={p.course_id for p in changed}
+        ):
+            progress = by_key.get((enrollment.user_id, enrollment.course_id))
+            if progress is None:
+                continue
+            enrollment_rows.append(enrollment)
+            enrollment.progress = progress.percentage
+            if progress.course_completed and not enrollment.course_completed:
+                enrollment.course_completed = True
+                enrollment.completed_at = progress.completed_at or now
+                completed_enrollments.append(enrollment)
+
+        with transaction.atomic():
+            cls.objects.bulk_update(
+                changed,
+                ['total_quizzes', 'completed_quizzes', 'percentage', 'xp_earned',
+                 'course_completed', 'completed_at', 'updated_at'],
+                batch_size=500
+            )
+            Enrollment.objects.bulk_update(
+                enrollment_rows,
+                ['progress', 'course_completed', 'completed_at'],
+                batch_size=500
+            )
+
+        if not notify:
+            return len(changed)
+
+        # bulk_update no emite post_save: propagar los cambios que sí importan fuera
+        from django.contrib.auth import get_user_model
+        from apps.courses.signals import course_completed_signal
+        from apps.stats.models import LeaderboardEntry, UserStatistic
+
+        for changed_user in get_user_model().objects.filter(pk__in=deltas):
+            UserStatistic.record_progress_change(changed_user, *deltas[changed_user.pk])
+        for enrollment in completed_enrollments:
+            course_completed_signal.send(sender=Enrollment, enrollment=enrollment)
+        for changed_user in get_user_model().objects.filter(pk__in=completion_changed):
+            LeaderboardEntry.refresh_for_user(changed_user)
+        return len(changed)
 
-    @classmethod
-    def update_for_user(cls, user):
-        """Actualiza el progreso global de un usuario."""
-        global_progress, created = cls.objects.get_or_create(user=user)
-        global_progress.update_global_progress()
-        return global_progress
\ No newline at end of file
@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Progress, GlobalProgress
+from .models import Progress
+from apps.stats.models import UserStatistic
 from apps.courses.serializers import CourseSerializer
 
 
@@ -22,13 +23,18 @@ class ProgressSerializer(serializers.ModelSerializer):
 
 
 class GlobalProgressSerializer(serializers.ModelSerializer):
+    """Progreso global del usuario, leído de su fila de UserStatistic."""
     user_name = serializers.CharField(source='user.get_full_name', read_only=True)
     user_level = serializers.IntegerField(source='user.level', read_only=True)
     user_xp = serializers.IntegerField(source='user.xp', read_only=True)
-    completion_rate = serializers.SerializerMethodField()
+    total_courses_enrolled = serializers.IntegerField(source='total_courses_started', read_only=True)
+    average_progress = serializers.FloatField(read_only=True)
+    completion_rate = serializers.FloatField(source='course_completion_rate', read_only=True)
+    current_streak = serializers.IntegerField(source='active_streak_days', read_only=True)
+    longest_streak = serializers.IntegerField(source='longest_streak_days', read_only=True)
 
     class Meta:
-        model = GlobalProgress
+        model = UserStatistic
         fields = [
             "id", "user_name", "user_level", "user_xp",
             "total_courses_enrolled", "total_courses_completed", 
@@ -38,11 +44,6 @@ class GlobalProgressSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = fields
 
-    def get_completion_rate(self, obj):
-        if obj.total_courses_enrolled > 0:
-            return (obj.total_courses_completed / obj.total_courses_enrolled) * 100
-        return 0.0
-
 
 class ProgressUpdateSerializer(serializers.Serializer):
     course_id = serializers.IntegerField(required=False)
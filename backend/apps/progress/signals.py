@@ -1,31 +1,52 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from apps.quizzes.models import QuizAttempt
+from apps.quizzes.models import Quiz
+from apps.quizzes.signals import quiz_evaluated_signal, quiz_batch_evaluated_signal
 from apps.courses.models import Enrollment
-from .models import Progress, GlobalProgress
+from .models import Progress
 
 
-@receiver(post_save, sender=QuizAttempt)
-def update_progress_on_quiz_attempt(sender, instance, created, **kwargs):
-    """Actualiza el progreso cuando se completa un quiz attempt."""
-    if created and instance.passed:
-        # Actualizar progreso del curso
-        progress = Progress.update_user_progress_for_course(
-            instance.user, 
-            instance.quiz.course
-        )
-        
-        # Actualizar progreso global
-        GlobalProgress.update_for_user(instance.user)
+@receiver(quiz_evaluated_signal)
+def update_progress_on_quiz_attempt(sender, attempt, **kwargs):
+    """Actualiza el progreso cuando se aprueba un quiz (score ya calculado)."""
+    if attempt.passed:
+        # Actualizar progreso del curso (los totales del usuario se ajustan con la diferencia)
+        Progress.update_user_progress_for_course(attempt.user, attempt.quiz.course)
+
+
+@receiver(quiz_batch_evaluated_signal)
+def update_progress_on_quiz_batch(sender, user, attempts, **kwargs):
+    """Un recálculo por curso con quizzes aprobados en el lote (no por intento)."""
+    for course_id in {attempt.quiz.course_id for attempt in attempts if attempt.passed}:
+        Progress.update_user_progress_for_course(user, course_id)
 
 
 @receiver(post_save, sender=Enrollment)
 def create_progress_on_enrollment(sender, instance, created, **kwargs):
-    """Crea un registro de progreso cuando un usuario se inscribe en un curso."""
+    """Crea y calcula el progreso cuando un usuario se inscribe en un curso."""
     if created:
-        Progress.objects.get_or_create(
-            user=instance.user,
-            course=instance.course
-        )
-        # Actualizar progreso global
-        GlobalProgress.update_for_user(instance.user)
\ No newline at end of file
+        Progress.update_user_progress_for_course(instance.user, instance.course)
+
+
+@receiver(post_save, sender=Quiz)
+def update_progress_on_quiz_change(sender, instance, created, **kwargs):
+    """
+    Recalcula el progreso del curso cuando cambia su conjunto de quizzes
+    activos (quiz nuevo, activado/desactivado, movido de curso o con otra XP).
+    """
+    old_course_id = instance.previous_value('course_id')
+
+    if created or old_course_id is None:
+        if instance.is_active:
+            Progress.update_for_course(instance.course_id)
+        return
+
+    if instance.has_changed():
+        Progress.update_for_course(instance.course_id)
+        if old_course_id != instance.course_id:
+            Progress.update_for_course(old_course_id)
+
+
+@receiver(post_delete, sender=Quiz)
+def update_progress_on_quiz_delete(sender, instance, **kwargs):
+    Progress.update_for_course(instance.course_id)
@@ -1,3 +1,216 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from apps.courses.models import Course, Enrollment
+from apps.quizzes.models import Question, Quiz
+from apps.users.models import User
+from .models import Progress
+
+
+class ProgressTestCase(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user("admin@x.com", "pw", role="admin")
+        self.student = User.objects.create_user("u@x.com", "pw", role="user")
+        self.course = Course.objects.create(title="C1", description="d", created_by=self.admin)
+        self.quizzes = [self.create_quiz(self.course, f"Q{i}", 10 * (i + 1)) for i in range(2)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def create_quiz(self, course, title, xp_reward):
+        quiz = Quiz.objects.create(course=course, title=title, xp_reward=xp_reward, passing_score=50)
+        Question.objects.create(quiz=quiz, text="1 + 1", question_type="short_answer", correct_answer="2", order=1)
+        return quiz
+
+    def submit(self, quiz, answer="2", client=None):
+        answers = {str(quiz.questions.get().pk): answer}
+        response = (client or self.client).post(
+            '/api/quizzes/submit/', {'quiz_id': quiz.pk, 'answers': answers, 'time_taken': 5}, format='json'
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        return response
+
+    def enroll(self, course=None):
+        response = self.client.post(
+            '/api/courses/enroll/', {'course_id': (course or self.course).pk}, format='json'
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def progress(self, user=None, course=None):
+        progress = Progress.objects.get(user=user or self.student, course=course or self.course)
+        return (progress.completed_quizzes, progress.total_quizzes, progress.percentage,
+                progress.xp_earned, progress.course_completed)
+
+
+class ProgressEventTests(ProgressTestCase):
+    def test_enrollment_and_passed_quizzes_update_progress(self):
+        self.enroll()
+        self.assertEqual(self.progress(), (0, 2, 0, 0, False))
+
+        # Un quiz reprobado no cambia el progreso
+        self.submit(self.quizzes[0], answer="3")
+        self.assertEqual(self.progress(), (0, 2, 0, 0, False))
+
+        self.submit(self.quizzes[1])
+        self.assertEqual(self.progress(), (1, 2, 50.0, 20, False))
+        self.assertEqual(Enrollment.objects.get(user=self.student).progress, 50.0)
+
+    def test_quiz_changes_recompute_the_course(self):
+        self.enroll()
+        self.submit(self.quizzes[0])
+
+        # Desactivar el quiz pendiente completa el curso
+        self.quizzes[1].is_active = False
+        self.quizzes[1].save()
+        self.assertEqual(self.progress(), (1, 1, 100.0, 10, True))
+        self.assertTrue(Enrollment.objects.get(user=self.student).course_completed)
+
+        # Un quiz nuevo y otra XP para el aprobado
+        self.create_quiz(self.course, "Q2", 5)
+        self.quizzes[0].xp_reward = 40
+        self.quizzes[0].save()
+        self.assertEqual(self.progress()[:4], (1, 2, 50.0, 40))
+
+        # Mover el quiz aprobado a otro curso lo descuenta de este
+        other = Course.objects.create(title="C2", description="d", created_by=self.admin)
+        self.enroll(other)
+        self.quizzes[0].course = other
+        self.quizzes[0].save()
+        self.assertEqual(self.progress()[:4], (0, 1, 0, 0))
+        self.assertEqual(self.progress(course=other)[:4], (1, 1, 100.0, 40))
+
+        self.quizzes[0].delete()
+        self.assertEqual(self.progress(course=other)[:4], (0, 0, 0, 0))
+
+    def test_reads_do_not_write(self):
+        self.enroll()
+        self.submit(self.quizzes[0])
+
+        for url in ('/api/progress/', f'/api/progress/course/{self.course.pk}/', '/api/progress/global/'):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            writes = [
+                query['sql'] for query in queries
+                if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))
+            ]
+            self.assertEqual(writes, [], url)
+
+        other = Course.objects.create(title="C2", description="d", created_by=self.admin)
+        self.assertEqual(self.client.get(f'/api/progress/course/{other.pk}/').status_code, 404)
+        self.assertFalse(Progress.objects.filter(course=other).exists())
+
+
+class ProgressBulkRecomputeTests(ProgressTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other = Course.objects.create(title="C2", description="d", created_by=self.admin)
+        self.create_quiz(self.other, "R0", 15)
+        self.students = [self.student] + [
+            User.objects.create_user(f"v{i}@x.com", "pw", role="user") for i in range(3)
+        ]
+        for i, student in enumerate(self.students):
+            client = APIClient()
+            client.force_authenticate(student)
+            for course in (self.course, self.other):
+                client.post('/api/courses/enroll/', {'course_id': course.pk}, format='json')
+            for quiz in self.quizzes[:i % 3]:
+                self.submit(quiz, client=client)
+
+    def snapshot(self):
+        progress = sorted(Progress.objects.values_list(
+            'user_id', 'course_id', 'completed_quizzes', 'total_quizzes', 'percentage', 'xp_earned',
+            'course_completed'
+        ))
+        enrollments = sorted(Enrollment.objects.values_list('user_id', 'course_id', 'progress', 'course_completed'))
+        return progress, enrollments
+
+    def test_bulk_recompute_matches_per_row_updates(self):
+        expected = self.snapshot()
+        self.assertEqual(Progress.bulk_recompute(), 0)
+
+        # Filas desviadas y una que falta (datos anteriores a las signals), reparadas
+        # como en las reconstrucciones: sin propagar diferencias a UserStatistic
+        Progress.objects.filter(user=self.students[1]).update(completed_quizzes=7, percentage=3.0, xp_earned=1)
+        Enrollment.objects.filter(user=self.students[2]).update(progress=0)
+        Progress.objects.filter(user=self.students[3], course=self.other).delete()
+        Progress.objects.filter(user=self.students[2], course=self.course).update(course_completed=False)
+
+        self.assertEqual(Progress.bulk_recompute(user=self.students[1], notify=False), 2)
+        self.assertEqual(
+            Progress.bulk_recompute(user_ids=[self.students[2].pk, self.students[3].pk], notify=False), 2
+        )
+        self.assertEqual(self.snapshot(), expected)
+        for progress in Progress.objects.all():
+            progress.update_progress()
+        self.assertEqual(self.snapshot()[0], expected[0])
+
+    def test_course_recompute_is_constant_in_queries(self):
+        Progress.objects.filter(course=self.course).update(percentage=1.0)
+        with CaptureQueriesContext(connection) as few:
+            Progress.bulk_recompute(course=self.course, notify=False)
+
+        for i in range(4):
+            student = User.objects.create_user(f"w{i}@x.com", "pw", role="user")
+            Enrollment.objects.create(user=student, course=Course.objects.get(pk=self.course.pk))
+        Progress.objects.filter(course=self.course).update(percentage=1.0)
+        with CaptureQueriesContext(connection) as many:
+            changed = Progress.bulk_recompute(course=self.course, notify=False)
+        self.assertEqual(changed, 8)
+        self.assertEqual(len(many), len(few))
+
+    def test_notify_false_leaves_user_totals_alone(self):
+        from apps.stats.models import UserStatistic
+
+        student = self.students[2]
+        totals = UserStatistic.objects.values_list('total_quizzes_completed', 'course_progress_sum').get(user=student)
+        Progress.objects.filter(user=student).update(completed_quizzes=0, percentage=0)
+
+        Progress.bulk_recompute(user=student, notify=False)
+        self.assertEqual(
+            UserStatistic.objects.values_list('total_quizzes_completed', 'course_progress_sum').get(user=student),
+            totals
+        )
+
+
+class GlobalProgressTests(ProgressTestCase):
+    def global_progress(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/progress/global/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([query for query in queries if '"progress_progress"' in query['sql']])
+        return response.json(), len(queries)
+
+    def test_served_from_user_statistic_matching_progress(self):
+        from django.db.models import Avg, Sum
+        from apps.stats.models import UserStatistic
+
+        courses = [self.course] + [
+            Course.objects.create(title=f"C{i}", description="d", created_by=self.admin) for i in range(2, 4)
+        ]
+        self.create_quiz(courses[1], "R0", 15)
+        for course in courses:
+            self.enroll(course)
+        _, queries = self.global_progress()
+
+        self.submit(self.quizzes[0])
+        self.submit(Quiz.objects.get(course=courses[1]))
+        data, more_queries = self.global_progress()
+        self.assertEqual(more_queries, queries)
+
+        progress = Progress.objects.filter(user=self.student)
+        totals = progress.aggregate(quizzes=Sum('completed_quizzes'), average=Avg('percentage'))
+        self.assertEqual(data['total_courses_enrolled'], 3)
+        self.assertEqual(data['total_courses_completed'], progress.filter(course_completed=True).count())
+        self.assertEqual(data['total_quizzes_completed'], totals['quizzes'])
+        self.assertAlmostEqual(data['average_progress'], totals['average'])
+        self.assertAlmostEqual(data['completion_rate'], 100 / 3)
+        self.assertEqual((data['user_xp'], data['total_xp_earned']), (25, 25))
+
+        # La reconstrucción completa da la misma fila que el mantenimiento incremental
+        fields = ('total_courses_started', 'total_courses_completed', 'total_quizzes_completed',
+                  'course_progress_sum', 'total_xp_earned')
+        incremental = UserStatistic.objects.values_list(*fields).get(user=self.student)
+        UserStatistic.objects.get(user=self.student).update_statistics()
+        self.assertEqual(UserStatistic.objects.values_list(*fields).get(user=self.student), incremental)
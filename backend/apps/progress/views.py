@@ -1,11 +1,12 @@
 from rest_framework import generics, permissions, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from django.db.models import Q, Count, Sum, F
+from django.db.models import Q, Count, Sum, F, FloatField
 from django.shortcuts import get_object_or_404
-from datetime import datetime, timedelta
+from django.utils import timezone
+from datetime import timedelta
 
-from .models import Progress, GlobalProgress
+from .models import Progress
 from .serializers import (
     ProgressSerializer,
     GlobalProgressSerializer,
@@ -14,6 +15,7 @@ from .serializers import (
 )
 from apps.users.permissions import IsAdmin, IsModerator, IsAdminOrModerator
 from apps.users.models import User
+from apps.stats.models import UserStatistic, XpRankNode
 
 
 class UserProgressView(generics.ListAPIView):
@@ -22,10 +24,9 @@ class UserProgressView(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        user = self.request.user
-        # Actualizar progreso para todos los cursos
-        Progress.update_all_user_progress(user)
-        return Progress.objects.filter(user=user).select_related('course')
+        # El progreso se mantiene al aprobar quizzes, al inscribirse y al cambiar
+        # los quizzes del curso (ver signals.py): aquí solo se lee
+        return Progress.objects.filter(user=self.request.user).select_related('course', 'course__created_by')
 
 
 class CourseProgressView(generics.RetrieveAPIView):
@@ -34,10 +35,11 @@ class CourseProgressView(generics.RetrieveAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
-        user = self.request.user
-        course_id = self.kwargs.get("course_id")
-        progress = Progress.update_user_progress_for_course(user, course_id)
-        return progress
+        return get_object_or_404(
+            Progress.objects.select_related('course'),
+            user=self.request.user,
+            course_id=self.kwargs.get("course_id")
+        )
 
 
 class GlobalProgressView(generics.RetrieveAPIView):
@@ -46,10 +48,8 @@ class GlobalProgressView(generics.RetrieveAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
-        user = self.request.user
-        # Actualizar progreso global
-        global_progress = GlobalProgress.update_for_user(user)
-        return global_progress
+        # Totales mantenidos por signals en UserStatistic: aquí solo se lee
+        return UserStatistic.for_user(self.request.user)
 
 
 class UpdateProgressView(APIView):
@@ -74,70 +74,44 @@ class UpdateProgressView(APIView):
         else:
             # Actualizar todo el progreso
             Progress.update_all_user_progress(user)
-            GlobalProgress.update_for_user(user)
             return Response({
                 "message": "Progreso global actualizado correctamente"
             })
 
 
 class LeaderboardView(APIView):
-    """Tabla de clasificación de usuarios."""
+    """Tabla de clasificación de usuarios (entradas de LeaderboardEntry)."""
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
+        from apps.stats.models import LeaderboardEntry
+
         timeframe = request.GET.get('timeframe', 'all')  # all, weekly, monthly
         metric = request.GET.get('metric', 'xp')  # xp, courses, quizzes, streak
         
         # Definir rango de tiempo
         if timeframe == 'weekly':
-            start_date = datetime.now() - timedelta(days=7)
+            start_date = timezone.now() - timedelta(days=7)
         elif timeframe == 'monthly':
-            start_date = datetime.now() - timedelta(days=30)
+            start_date = timezone.now() - timedelta(days=30)
         else:
             start_date = None
         
-        # Construir queryset base
-        users = User.objects.filter(is_active=True, role='user')
-        
-        # Aplicar filtro de tiempo si es necesario
-        if start_date:
-            users = users.filter(
-                quiz_attempts__completed_at__gte=start_date
-            ).distinct()
-        
-        # Ordenar según la métrica
-        if metric == 'xp':
-            users = users.order_by('-xp', '-level')
-        elif metric == 'courses':
-            users = users.annotate(
-                completed_courses=Count('progress_records', filter=Q(progress_records__course_completed=True))
-            ).order_by('-completed_courses', '-xp')
-        elif metric == 'quizzes':
-            users = users.annotate(
-                completed_quizzes=Count('quiz_attempts', filter=Q(quiz_attempts__passed=True))
-            ).order_by('-completed_quizzes', '-xp')
-        elif metric == 'streak':
-            users = users.annotate(
-                max_streak=Max('progress_records__streak_days')
-            ).order_by('-max_streak', '-xp')
-        
         # Limitar a top 50
-        users = users[:50]
+        entries = LeaderboardEntry.top(metric, 50, since=start_date)
         
-        # Preparar datos para el serializer
+        # Con filtro de tiempo top() numera dentro del subconjunto
         leaderboard_data = []
-        for rank, user in enumerate(users, 1):
-            global_progress = GlobalProgress.update_for_user(user)
-            
+        for entry in entries:
             leaderboard_data.append({
-                'user_id': user.id,
-                'user_name': user.get_full_name() or user.email,
-                'user_level': user.level,
-                'user_xp': user.xp,
-                'total_courses_completed': global_progress.total_courses_completed,
-                'total_quizzes_completed': global_progress.total_quizzes_completed,
-                'current_streak': global_progress.current_streak,
-                'rank': rank
+                'user_id': entry.user_id,
+                'user_name': entry.user.get_full_name() or entry.user.email,
+                'user_level': entry.level,
+                'user_xp': entry.xp,
+                'total_courses_completed': entry.courses_completed,
+                'total_quizzes_completed': entry.quizzes_passed,
+                'current_streak': entry.streak_days,
+                'rank': entry.rank
             })
         
         serializer = LeaderboardSerializer(leaderboard_data, many=True)
@@ -150,18 +124,10 @@ class UserStatisticsView(APIView):
 
     def get(self, request):
         user = request.user
-        global_progress = GlobalProgress.update_for_user(user)
+        user_stats = UserStatistic.for_user(user)
         
-        # Estadísticas adicionales
-        from apps.quizzes.models import QuizAttempt
         from django.db.models import Count, Avg
         
-        quiz_stats = QuizAttempt.objects.filter(user=user).aggregate(
-            total_attempts=Count('id'),
-            average_score=Avg('score'),
-            pass_rate=Avg(F('passed'), output_field=models.FloatField()) * 100
-        )
-        
         # Progreso por dificultad de cursos
         difficulty_progress = Progress.objects.filter(user=user).values(
             'course__difficulty'
@@ -171,26 +137,18 @@ class UserStatisticsView(APIView):
         )
         
         data = {
-            'global_progress': GlobalProgressSerializer(global_progress).data,
+            'global_progress': GlobalProgressSerializer(user_stats).data,
             'quiz_statistics': {
-                'total_attempts': quiz_stats['total_attempts'] or 0,
-                'average_score': round(quiz_stats['average_score'] or 0, 2),
-                'pass_rate': round(quiz_stats['pass_rate'] or 0, 2),
+                'total_attempts': user_stats.total_quizzes_attempted,
+                'average_score': round(user_stats.average_quiz_score, 2),
+                'pass_rate': round(user_stats.quiz_success_rate, 2),
             },
             'difficulty_progress': list(difficulty_progress),
-            'current_rank': self._get_user_rank(user),
+            'current_rank': XpRankNode.rank_for(user.xp),
+            'current_percentile': round(XpRankNode.percentile_for(user.xp), 1),
         }
         
         return Response(data)
-    
-    def _get_user_rank(self, user):
-        """Obtiene el ranking del usuario basado en XP."""
-        user_count = User.objects.filter(
-            xp__gt=user.xp, 
-            is_active=True, 
-            role='user'
-        ).count()
-        return user_count + 1
 
 
 class AdminProgressStatisticsView(APIView):
@@ -200,20 +158,22 @@ class AdminProgressStatisticsView(APIView):
     def get(self, request):
         from django.db.models import Count, Avg, Sum
         from apps.courses.models import Course
+        from apps.quizzes.models import QuizAttempt
         
         # Estadísticas generales
         total_users = User.objects.filter(role='user', is_active=True).count()
         total_courses = Course.objects.filter(is_active=True).count()
         total_quizzes_completed = QuizAttempt.objects.filter(passed=True).count()
         
-        # Progreso promedio de usuarios
-        avg_global_progress = GlobalProgress.objects.aggregate(
-            avg_progress=Avg('average_progress')
+        # Progreso promedio de usuarios (entre los que tienen algún curso)
+        avg_global_progress = UserStatistic.objects.filter(
+            total_courses_started__gt=0
+        ).aggregate(
+            avg_progress=Avg(F('course_progress_sum') / F('total_courses_started'), output_field=FloatField())
         )['avg_progress'] or 0
         
         # Cursos más populares (con más inscripciones)
         popular_courses = Course.objects.filter(is_active=True).annotate(
-            enrollment_count=Count('enrollments'),
             avg_progress=Avg('progress_records__percentage')
         ).order_by('-enrollment_count')[:10]
         
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Quiz, Question, QuizAttempt
+from .models import Quiz, Question, QuizAttempt, QuizAggregate
 
 
 class QuestionInline(admin.TabularInline):
@@ -64,4 +64,15 @@ class QuizAttemptAdmin(admin.ModelAdmin):
         ('Fechas', {
             'fields': ('completed_at',)
         }),
-    )
\ No newline at end of file
+    )
+
+
+@admin.register(QuizAggregate)
+class QuizAggregateAdmin(admin.ModelAdmin):
+    list_display = ('quiz', 'attempts', 'passes', 'pass_rate', 'mean_score', 'updated_at')
+    search_fields = ('quiz__title',)
+    list_select_related = ('quiz',)
+    readonly_fields = (
+        'quiz', 'attempts', 'passes', 'score_sum', 'score_sq_sum', 'passed_score_sum',
+        'time_taken_sum', 'time_histogram', 'updated_at'
+    )
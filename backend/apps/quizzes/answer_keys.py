@@ -0,0 +1,70 @@
+"""
+Claves de respuestas compiladas por quiz.
+
+Cada clave es una tupla de AnswerKeyEntry (una por pregunta, en orden) con
+la respuesta correcta ya normalizada según el tipo de pregunta. Se guardan
+en memoria del proceso junto con Quiz.answers_version: cualquier cambio en
+las preguntas incrementa esa versión (ver signals.py), y como la versión se
+lee de la fila del quiz en cada petición, un proceso con una clave antigua
+la recompila sin necesidad de avisos entre procesos.
+"""
+from collections import namedtuple
+
+AnswerKeyEntry = namedtuple(
+    'AnswerKeyEntry',
+    ['question_id', 'question_type', 'normalized_answer', 'correct_answer', 'explanation']
+)
+
+# quiz_id -> (answers_version, tupla de AnswerKeyEntry)
+_keys = {}
+
+
+def normalize(question_type, answer):
+    """Forma comparable de una respuesta según el tipo de pregunta."""
+    if question_type == 'true_false':
+        return answer.lower()
+    if question_type == 'multiple_choice':
+        return answer
+    # short_answer
+    return answer.strip().lower()
+
+
+def compile_keys(quiz_ids):
+    """{quiz_id: clave} de varios quizzes con una sola consulta de preguntas."""
+    from .models import Question
+
+    keys = {quiz_id: [] for quiz_id in quiz_ids}
+    questions = Question.objects.filter(quiz_id__in=keys).order_by('quiz_id', 'order', 'pk').values_list(
+        'quiz_id', 'pk', 'question_type', 'correct_answer', 'explanation'
+    )
+    for quiz_id, pk, question_type, correct_answer, explanation in questions:
+        keys[quiz_id].append(AnswerKeyEntry(
+            pk, question_type, normalize(question_type, correct_answer), correct_answer, explanation
+        ))
+    return {quiz_id: tuple(entries) for quiz_id, entries in keys.items()}
+
+
+def for_quiz(quiz):
+    """Clave del quiz para su answers_version actual (la compila si hace falta)."""
+    return for_quizzes([quiz])[quiz.pk]
+
+
+def for_quizzes(quizzes):
+    """{quiz_id: clave} de varios quizzes; las que falten se compilan juntas."""
+    keys = {}
+    stale = {}
+    for quiz in quizzes:
+        cached = _keys.get(quiz.pk)
+        if cached is not None and cached[0] == quiz.answers_version:
+            keys[quiz.pk] = cached[1]
+        else:
+            stale[quiz.pk] = quiz.answers_version
+    if stale:
+        for quiz_id, key in compile_keys(stale).items():
+            _keys[quiz_id] = (stale[quiz_id], key)
+            keys[quiz_id] = key
+    return keys
+
+
+def forget(quiz_id):
+    _keys.pop(quiz_id, None)
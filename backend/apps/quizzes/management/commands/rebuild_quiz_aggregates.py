@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.quizzes.models import Quiz, QuizAggregate
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula desde QuizAttempt las estadísticas acumuladas por quiz (QuizAggregate). "
+        "En operación normal se actualizan con cada intento; usar para datos previos o reparación."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--quiz", type=int, help="Limitar a un quiz por id.")
+
+    def handle(self, *args, **options):
+        quizzes = Quiz.objects.all()
+        if options["quiz"]:
+            quizzes = quizzes.filter(pk=options["quiz"])
+            if not quizzes.exists():
+                raise CommandError(f"Quiz {options['quiz']} no encontrado.")
+
+        total = QuizAggregate.rebuild(quizzes)
+        self.stdout.write(self.style.SUCCESS(f"{total} estadísticas de quiz recalculadas."))
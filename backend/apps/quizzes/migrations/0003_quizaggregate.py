@@ -0,0 +1,62 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:55
+
+from bisect import bisect_left
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+TIME_BUCKETS = [60, 120, 300, 600, 1200, 1800]
+
+
+def backfill_quiz_aggregates(apps, schema_editor):
+    """Construye las estadísticas por quiz a partir de los intentos existentes."""
+    QuizAttempt = apps.get_model('quizzes', 'QuizAttempt')
+    QuizAggregate = apps.get_model('quizzes', 'QuizAggregate')
+
+    aggregates = {}
+    attempts = QuizAttempt.objects.order_by().values_list('quiz_id', 'score', 'passed', 'time_taken')
+    for quiz_id, score, passed, time_taken in attempts.iterator(chunk_size=5000):
+        aggregate = aggregates.get(quiz_id)
+        if aggregate is None:
+            aggregate = aggregates[quiz_id] = QuizAggregate(
+                quiz_id=quiz_id,
+                time_histogram=[0] * (len(TIME_BUCKETS) + 1)
+            )
+        aggregate.attempts += 1
+        aggregate.passes += 1 if passed else 0
+        aggregate.score_sum += score
+        aggregate.score_sq_sum += score * score
+        aggregate.passed_score_sum += score if passed else 0
+        aggregate.time_taken_sum += time_taken
+        aggregate.time_histogram[bisect_left(TIME_BUCKETS, time_taken)] += 1
+
+    QuizAggregate.objects.bulk_create(aggregates.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0002_alter_question_options_alter_quiz_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('passes', models.PositiveIntegerField(default=0)),
+                ('score_sum', models.FloatField(default=0.0)),
+                ('score_sq_sum', models.FloatField(default=0.0, help_text='Suma de los cuadrados de las notas')),
+                ('passed_score_sum', models.FloatField(default=0.0)),
+                ('time_taken_sum', models.PositiveBigIntegerField(default=0)),
+                ('time_histogram', models.JSONField(default=list, help_text='Intentos por tramo de TIME_BUCKETS')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('quiz', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='quizzes.quiz')),
+            ],
+            options={
+                'verbose_name_plural': 'Quiz Aggregates',
+            },
+        ),
+        migrations.RunPython(backfill_quiz_aggregates, migrations.RunPython.noop),
+    ]
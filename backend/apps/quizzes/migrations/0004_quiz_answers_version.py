@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0003_quizaggregate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='answers_version',
+            field=models.PositiveIntegerField(default=0, help_text='Se incrementa al cambiar las preguntas; invalida la clave de respuestas compilada'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0004_quiz_answers_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='quizattempt',
+            index=models.Index(fields=['quiz', '-completed_at', '-id'], name='quizzes_qui_quiz_id_b98e2e_idx'),
+        ),
+    ]
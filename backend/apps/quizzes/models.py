@@ -1,9 +1,11 @@
 from django.db import models
 from django.conf import settings
+from apps.core import identity_map
+from apps.core.tracking import TrackedFieldsMixin
 from apps.courses.models import Course
 
 
-class Quiz(models.Model):
+class Quiz(TrackedFieldsMixin, models.Model):
     """Quiz asociado a un curso específico."""
     
     DIFFICULTY_CHOICES = [
@@ -21,6 +23,10 @@ class Quiz(models.Model):
     time_limit = models.PositiveIntegerField(default=10, help_text="Tiempo límite en minutos")
     is_active = models.BooleanField(default=True)
     max_attempts = models.PositiveIntegerField(default=3, help_text="Número máximo de intentos permitidos")
+    answers_version = models.PositiveIntegerField(
+        default=0,
+        help_text="Se incrementa al cambiar las preguntas; invalida la clave de respuestas compilada"
+    )
     
     created_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -32,6 +38,12 @@ class Quiz(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Lo que cuenta para los contadores del curso y el progreso de los inscritos
+    TRACKED_FIELDS = ('course_id', 'is_active', 'xp_reward')
+
+    # Solo bump_answers_version la incrementa: un save() completo no la retrocede
+    ATOMIC_FIELDS = ('answers_version',)
+
     class Meta:
         ordering = ["course", "title"]
         verbose_name_plural = "Quizzes"
@@ -45,24 +57,56 @@ class Quiz(models.Model):
 
     @property
     def question_count(self):
+        # Anotado por with_statistics(); si no, se consulta (p. ej. un quiz suelto)
+        if hasattr(self, 'question_total'):
+            return self.question_total
         return self.questions.count()
 
+    @property
+    def aggregate_stats(self):
+        """Fila de QuizAggregate, o None si el quiz aún no tiene intentos."""
+        try:
+            return self.stats
+        except QuizAggregate.DoesNotExist:
+            return None
+
     @property
     def average_score(self):
-        from django.db.models import Avg
-        avg = self.attempts.filter(passed=True).aggregate(avg_score=Avg('score'))
-        return avg['avg_score'] or 0
+        stats = self.aggregate_stats
+        return stats.average_passed_score if stats else 0
 
     @property
     def completion_rate(self):
-        total_attempts = self.attempts.count()
-        if total_attempts == 0:
-            return 0
-        passed_attempts = self.attempts.filter(passed=True).count()
-        return (passed_attempts / total_attempts) * 100
+        stats = self.aggregate_stats
+        return stats.pass_rate if stats else 0
+
+    @classmethod
+    def bump_answers_version(cls, *quiz_ids):
+        """Marca como obsoletas las claves de respuestas compiladas de los quizzes."""
+        from django.db.models import F
+
+        cls.objects.filter(pk__in=quiz_ids).update(answers_version=F('answers_version') + 1)
+        identity_map.forget(cls, *quiz_ids)
+
+    @classmethod
+    def with_statistics(cls, queryset=None):
+        """
+        Añade lo que usan question_count, average_score y completion_rate
+        en la misma consulta: el número de preguntas y la fila de QuizAggregate.
+        """
+        from django.db.models import Count, IntegerField, OuterRef, Subquery
+        from django.db.models.functions import Coalesce
 
+        queryset = cls.objects.all() if queryset is None else queryset
+        questions = Question.objects.filter(quiz=OuterRef('pk')).values('quiz').annotate(
+            total=Count('id')
+        ).values('total')[:1]
+        return queryset.select_related('stats').annotate(
+            question_total=Coalesce(Subquery(questions), 0, output_field=IntegerField()),
+        )
 
-class Question(models.Model):
+
+class Question(TrackedFieldsMixin, models.Model):
     """Preguntas asociadas a un quiz."""
     
     QUESTION_TYPES = [
@@ -78,6 +122,9 @@ class Question(models.Model):
     correct_answer = models.CharField(max_length=255, help_text="Respuesta correcta")
     explanation = models.TextField(blank=True, null=True, help_text="Explicación de la respuesta correcta")
     order = models.PositiveIntegerField(default=0, help_text="Orden de la pregunta en el quiz")
+
+    # Al mover la pregunta de quiz cambian las claves de los dos quizzes
+    TRACKED_FIELDS = ('quiz_id',)
     
     class Meta:
         ordering = ["quiz", "order"]
@@ -111,6 +158,8 @@ class QuizAttempt(models.Model):
         indexes = [
             models.Index(fields=['user', 'quiz']),
             models.Index(fields=['completed_at']),
+            # Paginación por clave de los intentos de un quiz (QuizAttemptsView)
+            models.Index(fields=['quiz', '-completed_at', '-id']),
         ]
 
     def __str__(self):
@@ -119,51 +168,218 @@ class QuizAttempt(models.Model):
 
     def evaluate(self, user_answers):
         """Evalúa las respuestas del usuario y calcula el score."""
-        total_questions = self.quiz.questions.count()
-        if total_questions == 0:
+        from . import answer_keys
+
+        # Clave compilada en memoria: sin consultas de preguntas si está al día
+        answer_key = answer_keys.for_quiz(self.quiz)
+        self._grade(answer_key, user_answers)
+        self.save()
+
+        # Otorgar XP si aprueba
+        if self.passed:
+            self.user.add_xp(**self._xp_reward())
+
+        self._notify_evaluated()
+
+    def _xp_reward(self):
+        """Argumentos de add_xp por aprobar el intento (envío suelto y en lote)."""
+        return {
+            'amount': self.quiz.xp_reward,
+            'source': 'quiz',
+            'related_quiz': self.quiz,
+            'related_course': self.quiz.course,
+        }
+
+    def _grade(self, answer_key, user_answers):
+        """Calcula score, passed y el detalle de respuestas (sin guardar)."""
+        from .answer_keys import normalize
+
+        if not answer_key:
             self.score = 0
             self.passed = False
-            self.save()
             return
 
         correct_answers = 0
         detailed_answers = {}
         
-        for question in self.quiz.questions.all():
-            user_answer = user_answers.get(str(question.id), '')
-            is_correct = self._check_answer(question, user_answer)
+        for entry in answer_key:
+            user_answer = user_answers.get(str(entry.question_id), '')
+            is_correct = normalize(entry.question_type, user_answer) == entry.normalized_answer
             
             if is_correct:
                 correct_answers += 1
                 
-            detailed_answers[str(question.id)] = {
+            detailed_answers[str(entry.question_id)] = {
                 'user_answer': user_answer,
-                'correct_answer': question.correct_answer,
+                'correct_answer': entry.correct_answer,
                 'is_correct': is_correct,
-                'explanation': question.explanation
+                'explanation': entry.explanation
             }
 
-        self.score = (correct_answers / total_questions) * 100
+        self.score = (correct_answers / len(answer_key)) * 100
         self.passed = self.score >= self.quiz.passing_score
         self.answers = detailed_answers
-        self.save()
 
-        # Otorgar XP si aprueba
-        if self.passed:
-            self.user.add_xp(self.quiz.xp_reward, source="quiz")
+    @classmethod
+    def submit_batch(cls, user, entries):
+        """
+        Califica varios envíos del mismo usuario (sincronización sin conexión).
+        `entries` son dicts con quiz_id, answers y time_taken. Las validaciones
+        de SubmitQuizSerializer se hacen para todo el lote con unas pocas
+        consultas; los envíos válidos se guardan con bulk_create, la XP se
+        suma en un solo UPDATE y los efectos posteriores (agregados,
+        progreso, estadísticas) se aplican una vez con
+        quiz_batch_evaluated_signal. Cada intento se califica y da XP igual
+        que con evaluate().
+
+        Devuelve, por cada envío y en el mismo orden, el intento creado o el
+        mensaje de error que lo descartó.
+        """
+        from collections import Counter
+        from django.db import transaction
+        from django.db.models import Count
+        from apps.courses.models import Enrollment
+        from apps.stats.models import ActivityDay, XpHistory
+        from apps.quizzes.signals import quiz_batch_evaluated_signal
+        from . import answer_keys
+
+        quiz_ids = {entry['quiz_id'] for entry in entries}
+        quizzes = Quiz.objects.filter(pk__in=quiz_ids, is_active=True).select_related('course').in_bulk()
+        # El progreso de cada curso (signals) reutiliza estos cursos
+        identity_map.remember(*quizzes.values())
+        enrolled = set(Enrollment.objects.filter(
+            user=user,
+            course_id__in={quiz.course_id for quiz in quizzes.values()}
+        ).values_list('course_id', flat=True))
+        previous = dict(
+            cls.objects.filter(user=user, quiz_id__in=quizzes).order_by().values('quiz')
+            .annotate(total=Count('id')).values_list('quiz', 'total')
+        )
+        keys = answer_keys.for_quizzes(quizzes.values())
+        in_batch = Counter()
+
+        results = []
+        for entry in entries:
+            quiz = quizzes.get(entry['quiz_id'])
+            if quiz is None:
+                results.append("Quiz no encontrado o inactivo")
+                continue
+            if quiz.course_id not in enrolled:
+                results.append("No estás inscrito en este curso")
+                continue
+            in_batch[quiz.pk] += 1
+            attempts = previous.get(quiz.pk, 0) + in_batch[quiz.pk]
+            if attempts > quiz.max_attempts:
+                results.append("Has alcanzado el número máximo de intentos para este quiz")
+                continue
+            # unique_together (user, quiz): un solo intento guardado por quiz
+            if attempts > 1:
+                results.append("Ya enviaste este quiz")
+                continue
+
+            attempt = cls(user=user, quiz=quiz, time_taken=entry['time_taken'])
+            attempt._grade(keys[quiz.pk], entry['answers'])
+            results.append(attempt)
+
+        attempts = [result for result in results if isinstance(result, cls)]
+        if not attempts:
+            return results
+
+        with transaction.atomic():
+            inserted = cls._insert_attempts(attempts)
+            events = []
+            for attempt in inserted:
+                if attempt.passed:
+                    reward = attempt._xp_reward()
+                    events.append(XpHistory(user=user, xp_gained=reward.pop('amount'), **reward))
+            user.add_xp_bulk(events)
+
+        # Otro envío del mismo quiz guardado entre la validación y el INSERT
+        if len(inserted) < len(attempts):
+            results = [
+                "Ya enviaste este quiz" if isinstance(result, cls) and result.pk is None else result
+                for result in results
+            ]
+            attempts = inserted
+            if not attempts:
+                return results
+
+        # Como _notify_evaluated, para todo el lote
+        ActivityDay.record_many(
+            user.pk,
+            max(attempt.completed_at for attempt in attempts),
+            [attempt.quiz.course_id for attempt in attempts]
+        )
+        quiz_batch_evaluated_signal.send(sender=cls, user=user, attempts=attempts)
+        return results
+
+    @classmethod
+    def _insert_attempts(cls, attempts):
+        """
+        Inserta los intentos con un bulk_create. Si alguno choca con
+        unique_together (envío simultáneo del mismo quiz), los inserta uno a
+        uno y descarta los repetidos, que quedan sin pk. Devuelve los insertados.
+        """
+        from django.db import IntegrityError, transaction
+
+        try:
+            with transaction.atomic():
+                cls.objects.bulk_create(attempts)
+            return attempts
+        except IntegrityError:
+            for attempt in attempts:
+                attempt.pk = None
+
+        inserted = []
+        for attempt in attempts:
+            try:
+                with transaction.atomic():
+                    cls.objects.bulk_create([attempt])
+            except IntegrityError:
+                attempt.pk = None
+                continue
+            inserted.append(attempt)
+        return inserted
+
+    def _notify_evaluated(self):
+        """
+        Registra el día de actividad y emite quiz_evaluated_signal. El día se
+        registra antes de la signal para que las rachas calculadas por los
+        receptores (p. ej. Progress) ya lo incluyan.
+        """
+        from apps.stats.models import ActivityDay
+        from apps.quizzes.signals import quiz_evaluated_signal
 
-    def _check_answer(self, question, user_answer):
-        """Verifica si la respuesta del usuario es correcta."""
-        if question.question_type == 'true_false':
-            return user_answer.lower() == question.correct_answer.lower()
-        elif question.question_type == 'multiple_choice':
-            return user_answer == question.correct_answer
-        else:  # short_answer
-            return user_answer.strip().lower() == question.correct_answer.strip().lower()
+        ActivityDay.record(self.user_id, self.completed_at, self.quiz.course_id)
+        quiz_evaluated_signal.send(sender=self.__class__, attempt=self)
+
+    @classmethod
+    def with_attempt_numbers(cls, queryset=None):
+        """
+        Anota attempt_index (número de intento del usuario en el quiz) con
+        ROW_NUMBER() OVER (PARTITION BY user, quiz ORDER BY completed_at):
+        el listado no hace una consulta COUNT por fila.
+
+        La ventana se calcula sobre las filas que deja el WHERE: cada
+        partición (usuario, quiz) debe quedar completa o recortada solo por
+        sus intentos más recientes, como hace la paginación por clave.
+        """
+        from django.db.models import F, Window
+        from django.db.models.functions import RowNumber
+
+        queryset = cls.objects.all() if queryset is None else queryset
+        return queryset.annotate(attempt_index=Window(
+            RowNumber(),
+            partition_by=[F('user'), F('quiz')],
+            order_by=[F('completed_at').asc(), F('pk').asc()],
+        ))
 
     @property
     def attempt_number(self):
         """Número de intento para este usuario y quiz"""
+        # Anotado por with_attempt_numbers(); si no, se consulta (p. ej. un intento suelto)
+        if hasattr(self, 'attempt_index'):
+            return self.attempt_index
         return QuizAttempt.objects.filter(
             user=self.user, 
             quiz=self.quiz,
@@ -175,4 +391,143 @@ class QuizAttempt(models.Model):
         """Verifica si el usuario puede volver a intentar el quiz"""
         if self.passed:
             return False
-        return self.attempt_number < self.quiz.max_attempts
\ No newline at end of file
+        return self.attempt_number < self.quiz.max_attempts
+
+class QuizAggregate(models.Model):
+    """
+    Estadísticas acumuladas de un quiz, actualizadas con cada intento
+    calificado (ver record). Evita recorrer QuizAttempt al serializar.
+    """
+
+    # Límites superiores (segundos) de los tramos del histograma de tiempo;
+    # el último tramo recoge todo lo que supera el último límite
+    TIME_BUCKETS = [60, 120, 300, 600, 1200, 1800]
+
+    quiz = models.OneToOneField(Quiz, on_delete=models.CASCADE, related_name="stats")
+    attempts = models.PositiveIntegerField(default=0)
+    passes = models.PositiveIntegerField(default=0)
+    score_sum = models.FloatField(default=0.0)
+    score_sq_sum = models.FloatField(default=0.0, help_text="Suma de los cuadrados de las notas")
+    passed_score_sum = models.FloatField(default=0.0)
+    time_taken_sum = models.PositiveBigIntegerField(default=0)
+    time_histogram = models.JSONField(default=list, help_text="Intentos por tramo de TIME_BUCKETS")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Quiz Aggregates"
+
+    def __str__(self):
+        return f"Estadísticas de {self.quiz.title}"
+
+    @property
+    def mean_score(self):
+        return self.score_sum / self.attempts if self.attempts else 0
+
+    @property
+    def score_stddev(self):
+        if not self.attempts:
+            return 0
+        variance = self.score_sq_sum / self.attempts - self.mean_score ** 2
+        return max(variance, 0) ** 0.5
+
+    @property
+    def average_passed_score(self):
+        return self.passed_score_sum / self.passes if self.passes else 0
+
+    @property
+    def pass_rate(self):
+        return (self.passes / self.attempts) * 100 if self.attempts else 0
+
+    @property
+    def average_time_taken(self):
+        return self.time_taken_sum / self.attempts if self.attempts else 0
+
+    @classmethod
+    def bucket_for(cls, seconds):
+        from bisect import bisect_left
+        return bisect_left(cls.TIME_BUCKETS, seconds)
+
+    @classmethod
+    def empty_histogram(cls):
+        return [0] * (len(cls.TIME_BUCKETS) + 1)
+
+    def _add(self, score, passed, time_taken):
+        self.attempts += 1
+        self.passes += 1 if passed else 0
+        self.score_sum += score
+        self.score_sq_sum += score * score
+        self.passed_score_sum += score if passed else 0
+        self.time_taken_sum += time_taken
+        histogram = self.time_histogram or self.empty_histogram()
+        histogram[self.bucket_for(time_taken)] += 1
+        self.time_histogram = histogram
+
+    @classmethod
+    def record(cls, attempt):
+        """Suma un intento calificado con la fila bloqueada (select_for_update)."""
+        from django.db import transaction
+
+        with transaction.atomic():
+            aggregate, _ = cls.objects.select_for_update().get_or_create(quiz_id=attempt.quiz_id)
+            aggregate._add(float(attempt.score), attempt.passed, attempt.time_taken)
+            aggregate.save()
+        return aggregate
+
+    @classmethod
+    def record_many(cls, attempts):
+        """
+        Como record, para varios intentos: bloquea una vez las filas de los
+        quizzes afectados y las escribe con un solo bulk_update.
+        """
+        from collections import defaultdict
+        from django.db import transaction
+        from django.utils import timezone
+
+        by_quiz = defaultdict(list)
+        for attempt in attempts:
+            by_quiz[attempt.quiz_id].append(attempt)
+        if not by_quiz:
+            return
+
+        with transaction.atomic():
+            cls.objects.bulk_create(
+                [cls(quiz_id=quiz_id, time_histogram=cls.empty_histogram()) for quiz_id in by_quiz],
+                ignore_conflicts=True
+            )
+            aggregates = list(cls.objects.select_for_update().filter(quiz_id__in=by_quiz).order_by('quiz_id'))
+            now = timezone.now()
+            for aggregate in aggregates:
+                for attempt in by_quiz[aggregate.quiz_id]:
+                    aggregate._add(float(attempt.score), attempt.passed, attempt.time_taken)
+                aggregate.updated_at = now
+            cls.objects.bulk_update(
+                aggregates,
+                ['attempts', 'passes', 'score_sum', 'score_sq_sum', 'passed_score_sum',
+                 'time_taken_sum', 'time_histogram', 'updated_at']
+            )
+
+    @classmethod
+    def rebuild(cls, quizzes=None):
+        """
+        Recalcula desde QuizAttempt las filas de `quizzes` (queryset) o de
+        todos los quizzes. Devuelve el número de filas escritas.
+        """
+        from django.db import transaction
+
+        quizzes = Quiz.objects.all() if quizzes is None else quizzes
+        quiz_ids = list(quizzes.values_list('pk', flat=True))
+
+        aggregates = {
+            quiz_id: cls(quiz_id=quiz_id, time_histogram=cls.empty_histogram())
+            for quiz_id in quiz_ids
+        }
+        attempts = QuizAttempt.objects.filter(quiz_id__in=quiz_ids).order_by().values_list(
+            'quiz_id', 'score', 'passed', 'time_taken'
+        )
+        for quiz_id, score, passed, time_taken in attempts.iterator(chunk_size=5000):
+            aggregates[quiz_id]._add(score, passed, time_taken)
+
+        with transaction.atomic():
+            cls.objects.filter(quiz_id__in=quiz_ids).delete()
+            cls.objects.bulk_create(aggregates.values(), batch_size=500)
+        return len(aggregates)
@@ -0,0 +1,84 @@
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class AttemptKeysetPagination(BasePagination):
+    """
+    Paginación por clave (completed_at, id) descendente: cada página filtra
+    las filas anteriores a la última entregada en lugar de usar OFFSET, así
+    que pedir la página 500 cuesta lo mismo que la primera.
+
+    Solo avanza (hay `next`, no `previous`): el filtro quita únicamente
+    intentos más recientes, con lo que la numeración de
+    QuizAttempt.with_attempt_numbers sigue siendo correcta en cada página.
+    """
+    cursor_query_param = 'after'
+    page_size_query_param = 'page_size'
+    page_size = 20
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        after = request.query_params.get(self.cursor_query_param)
+        if after:
+            completed_at, pk = self.decode_cursor(after)
+            queryset = queryset.filter(
+                Q(completed_at__lt=completed_at) | Q(completed_at=completed_at, pk__lt=pk)
+            )
+
+        rows = list(queryset.order_by('-completed_at', '-pk')[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def encode_cursor(self, attempt):
+        raw = json.dumps([attempt.completed_at.isoformat(), attempt.pk])
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, value):
+        try:
+            completed_at, pk = json.loads(base64.urlsafe_b64decode(value.encode()).decode())
+            completed_at = parse_datetime(completed_at)
+            if completed_at is None:
+                raise ValueError
+            return completed_at, int(pk)
+        except (TypeError, ValueError):
+            raise NotFound("Cursor inválido")
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Quiz, Question, QuizAttempt
+from apps.core import identity_map
+from .models import Quiz, Question, QuizAttempt, QuizAggregate
 from apps.courses.models import Enrollment
 
 
@@ -30,35 +31,50 @@ class QuizSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ["created_by", "created_at"]
 
-    def get_user_attempts(self, obj):
+    def _user_quiz_state(self):
+        """
+        Intentos del usuario por quiz ({quiz_id: (intentos, mejor nota)}) y
+        cursos en los que está inscrito. Se consultan una sola vez por
+        petición: el contexto es compartido por todos los quizzes de la lista.
+        """
+        from django.db.models import Count, Max
+
         request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return obj.attempts.filter(user=request.user).count()
-        return 0
+        if not (request and request.user.is_authenticated):
+            return {}, set()
+        if 'user_quiz_state' not in self.context:
+            attempts = {
+                quiz_id: (count, best)
+                for quiz_id, count, best in QuizAttempt.objects.filter(user=request.user).values(
+                    'quiz_id'
+                ).annotate(count=Count('id'), best=Max('score')).values_list('quiz_id', 'count', 'best')
+            }
+            enrolled = set(Enrollment.objects.filter(user=request.user).values_list('course_id', flat=True))
+            self.context['user_quiz_state'] = (attempts, enrolled)
+        return self.context['user_quiz_state']
+
+    def get_user_attempts(self, obj):
+        attempts, _ = self._user_quiz_state()
+        return attempts.get(obj.pk, (0, 0))[0]
 
     def get_can_attempt(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            # Verificar si el usuario está inscrito en el curso
-            is_enrolled = Enrollment.objects.filter(
-                user=request.user, 
-                course=obj.course
-            ).exists()
-            
-            if not is_enrolled:
-                return False
-            
-            # Verificar intentos máximos
-            attempts_count = obj.attempts.filter(user=request.user).count()
-            return attempts_count < obj.max_attempts
-        return False
+        attempts, enrolled = self._user_quiz_state()
+        # Verificar si el usuario está inscrito en el curso
+        if obj.course_id not in enrolled:
+            return False
+        # Verificar intentos máximos
+        return attempts.get(obj.pk, (0, 0))[0] < obj.max_attempts
 
     def get_best_score(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            best_attempt = obj.attempts.filter(user=request.user).order_by('-score').first()
-            return best_attempt.score if best_attempt else 0
-        return 0
+        attempts, _ = self._user_quiz_state()
+        return attempts.get(obj.pk, (0, 0))[1]
+
+
+class QuizListSerializer(QuizSerializer):
+    """Representación ligera para listados: sin las preguntas anidadas."""
+
+    class Meta(QuizSerializer.Meta):
+        fields = [field for field in QuizSerializer.Meta.fields if field != "questions"]
 
 
 class CreateQuizSerializer(serializers.ModelSerializer):
@@ -123,25 +139,29 @@ class QuizAttemptSerializer(serializers.ModelSerializer):
         read_only_fields = ["id", "passed", "completed_at"]
 
 
-class SubmitQuizSerializer(serializers.Serializer):
+class QuizAnswersSerializer(serializers.Serializer):
+    """Forma de un envío de respuestas (sin consultas a la base de datos)."""
     quiz_id = serializers.IntegerField()
     answers = serializers.JSONField()
     time_taken = serializers.IntegerField(min_value=0)
 
-    def validate_quiz_id(self, value):
-        try:
-            quiz = Quiz.objects.get(id=value, is_active=True)
-        except Quiz.DoesNotExist:
-            raise serializers.ValidationError("Quiz no encontrado o inactivo")
-        return value
-
     def validate_answers(self, value):
         if not isinstance(value, dict):
             raise serializers.ValidationError("Las respuestas deben ser un objeto JSON")
         return value
 
+
+class SubmitQuizSerializer(QuizAnswersSerializer):
+
     def validate(self, attrs):
-        quiz = Quiz.objects.get(id=attrs['quiz_id'])
+        # Una sola lectura del quiz (con su curso) para validar, para la vista
+        # y para las signals del envío (mapa de identidad de la petición)
+        try:
+            quiz = identity_map.get(Quiz.objects.select_related('course'), attrs['quiz_id'])
+        except Quiz.DoesNotExist:
+            quiz = None
+        if quiz is None or not quiz.is_active:
+            raise serializers.ValidationError({'quiz_id': "Quiz no encontrado o inactivo"})
         user = self.context['request'].user
         
         # Verificar inscripción en el curso
@@ -153,12 +173,48 @@ class SubmitQuizSerializer(serializers.Serializer):
         if attempts_count >= quiz.max_attempts:
             raise serializers.ValidationError("Has alcanzado el número máximo de intentos para este quiz")
         
+        # La vista reutiliza el quiz ya cargado
+        attrs['quiz'] = quiz
         return attrs
 
 
+class SubmitQuizBatchSerializer(serializers.Serializer):
+    """
+    Varios envíos acumulados sin conexión. Aquí solo se valida la forma; la
+    inscripción y los intentos se comprueban para todo el lote en
+    QuizAttempt.submit_batch.
+    """
+    MAX_ATTEMPTS = 50
+
+    attempts = QuizAnswersSerializer(many=True, allow_empty=False, max_length=MAX_ATTEMPTS)
+
+
 class QuizStatisticsSerializer(serializers.Serializer):
     total_quizzes = serializers.IntegerField()
     total_attempts = serializers.IntegerField()
     average_score = serializers.FloatField()
     pass_rate = serializers.FloatField()
-    popular_quizzes = serializers.ListField()
\ No newline at end of file
+    popular_quizzes = serializers.ListField()
+
+
+class QuizAggregateSerializer(serializers.ModelSerializer):
+    quiz_title = serializers.CharField(source='quiz.title', read_only=True)
+    mean_score = serializers.FloatField(read_only=True)
+    score_stddev = serializers.FloatField(read_only=True)
+    average_passed_score = serializers.FloatField(read_only=True)
+    pass_rate = serializers.FloatField(read_only=True)
+    average_time_taken = serializers.FloatField(read_only=True)
+    time_buckets = serializers.SerializerMethodField()
+
+    class Meta:
+        model = QuizAggregate
+        fields = [
+            "quiz", "quiz_title", "attempts", "passes", "pass_rate",
+            "mean_score", "score_stddev", "average_passed_score",
+            "average_time_taken", "time_buckets", "time_histogram", "updated_at"
+        ]
+        read_only_fields = fields
+
+    def get_time_buckets(self, obj):
+        """Límite superior en segundos de cada tramo del histograma (None = sin límite)."""
+        return QuizAggregate.TIME_BUCKETS + [None]
@@ -1,8 +1,16 @@
-from django.db.models.signals import post_save
-from django.dispatch import receiver
-from .models import QuizAttempt
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver, Signal
+from . import answer_keys
+from .models import Quiz, Question, QuizAttempt, QuizAggregate
 from apps.notifications.models import Notification
 
+# Signal personalizada para cuando se califica un intento (score y passed definitivos)
+quiz_evaluated_signal = Signal()
+
+# Lote de intentos calificados con QuizAttempt.submit_batch (kwargs: user, attempts).
+# Los intentos se crean con bulk_create: no hay post_save ni quiz_evaluated_signal
+quiz_batch_evaluated_signal = Signal()
+
 
 @receiver(post_save, sender=QuizAttempt)
 def notify_quiz_result(sender, instance, created, **kwargs):
@@ -14,4 +22,29 @@ def notify_quiz_result(sender, instance, created, **kwargs):
             message=f"Felicidades, aprobaste '{instance.quiz.title}' y ganaste {instance.quiz.xp_reward} XP",
             related_quiz_id=instance.quiz.id,
             related_course_id=instance.quiz.course.id,
-        )
\ No newline at end of file
+        )
+
+
+@receiver(quiz_evaluated_signal)
+def update_quiz_aggregate(sender, attempt, **kwargs):
+    QuizAggregate.record(attempt)
+
+
+@receiver(quiz_batch_evaluated_signal)
+def update_quiz_aggregates_on_batch(sender, attempts, **kwargs):
+    QuizAggregate.record_many(attempts)
+
+
+# ---------- Claves de respuestas compiladas ----------
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def invalidate_answer_key(sender, instance, **kwargs):
+    # Si la pregunta cambió de quiz, también queda obsoleta la clave del anterior
+    quiz_ids = {instance.quiz_id, instance.previous_value('quiz_id')} - {None}
+    Quiz.bump_answers_version(*quiz_ids)
+
+
+@receiver(post_delete, sender=Quiz)
+def forget_answer_key(sender, instance, **kwargs):
+    answer_keys.forget(instance.pk)
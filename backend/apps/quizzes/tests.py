@@ -1,3 +1,487 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient, APIRequestFactory
+
+from apps.core import identity_map
+from apps.courses.models import Course, Enrollment
+from apps.notifications.models import Notification
+from apps.progress.models import Progress
+from apps.stats.models import ActivityDay, LeaderboardEntry, UserStatistic, XpDailyRollup, XpHistory
+from apps.users.models import User
+from . import answer_keys
+from .models import Quiz, Question, QuizAggregate, QuizAttempt
+from .serializers import SubmitQuizSerializer
+
+
+class QuizTestCase(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user("admin@x.com", "pw", role="admin")
+        self.student = User.objects.create_user("u@x.com", "pw", role="user")
+        self.course = Course.objects.create(title="C1", description="d", created_by=self.admin)
+        self.quiz = self.create_quiz("Q1")
+        Enrollment.objects.create(user=self.student, course=self.course)
+
+    def create_quiz(self, title, course=None, **extra_fields):
+        extra_fields = {'xp_reward': 20, 'passing_score': 50, **extra_fields}
+        quiz = Quiz.objects.create(course=course or self.course, title=title, **extra_fields)
+        Question.objects.create(quiz=quiz, text="1 + 1", question_type="short_answer", correct_answer="2", order=1)
+        Question.objects.create(quiz=quiz, text="2 + 2", question_type="short_answer", correct_answer="4", order=2)
+        return quiz
+
+
+class SubmitQuizSerializerTests(QuizTestCase):
+    def serializer(self, quiz_id):
+        request = APIRequestFactory().post('/api/quizzes/submit/')
+        request.user = self.student
+        return SubmitQuizSerializer(
+            data={'quiz_id': quiz_id, 'answers': {}, 'time_taken': 10},
+            context={'request': request}
+        )
+
+    def test_quiz_is_loaded_once(self):
+        serializer = self.serializer(self.quiz.pk)
+        # Quiz con su curso, inscripción e intentos previos
+        with self.assertNumQueries(3):
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual(serializer.validated_data['quiz'], self.quiz)
+
+    def test_inactive_quiz_is_rejected_on_quiz_id(self):
+        self.quiz.is_active = False
+        self.quiz.save()
+
+        serializer = self.serializer(self.quiz.pk)
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('quiz_id', serializer.errors)
+
+
+class IdentityMapTests(QuizTestCase):
+    def selects(self, queries, table):
+        """Lecturas por pk de `table`."""
+        return [
+            query for query in queries
+            if query['sql'].startswith(f'SELECT "{table}"."id"') and f'WHERE "{table}"."id" = ' in query['sql']
+        ]
+
+    def test_rows_are_read_once_per_scope(self):
+        with identity_map.activate() as current:
+            with self.assertNumQueries(1):
+                quiz = identity_map.get(Quiz.objects.select_related('course'), self.quiz.pk)
+                # El curso vino con select_related: también queda en el mapa
+                self.assertIs(identity_map.get(Course, self.course.pk), quiz.course)
+                self.assertIs(identity_map.get(Quiz, self.quiz.pk), quiz)
+            self.assertEqual(current.stats()['models'], {
+                'courses.course': {'hits': 1, 'misses': 0},
+                'quizzes.quiz': {'hits': 1, 'misses': 1},
+            })
+
+            # Un UPDATE de contadores saca el curso del mapa
+            Course.adjust_counters(self.course.pk, enrollment_count=1)
+            with self.assertNumQueries(1):
+                self.assertEqual(identity_map.get(Course, self.course.pk).enrollment_count, 2)
+
+        # Fuera de una petición no hay mapa
+        with self.assertNumQueries(2):
+            self.assertIsNot(identity_map.get(Quiz, self.quiz.pk), identity_map.get(Quiz, self.quiz.pk))
+
+    @override_settings(DEBUG=True)
+    def test_submit_reads_quiz_and_course_once(self):
+        client = APIClient()
+        client.force_authenticate(self.student)
+        answers = {str(pk): "2" for pk in self.quiz.questions.values_list('pk', flat=True)}
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.post(
+                '/api/quizzes/submit/', {'quiz_id': self.quiz.pk, 'answers': answers, 'time_taken': 5}, format='json'
+            )
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(len(self.selects(queries, 'quizzes_quiz')), 1)
+        self.assertEqual(self.selects(queries, 'courses_course'), [])
+        self.assertEqual(self.selects(queries, 'users_user'), [])
+        self.assertIn('misses=1', response['X-Identity-Map'])
+
+
+class AnswerKeyTests(QuizTestCase):
+    def setUp(self):
+        super().setUp()
+        answer_keys._keys.clear()
+
+    def fresh(self, quiz):
+        return Quiz.objects.get(pk=quiz.pk)
+
+    def answers(self, quiz):
+        return [entry.correct_answer for entry in answer_keys.for_quiz(self.fresh(quiz))]
+
+    def test_warm_key_needs_no_question_queries(self):
+        quiz = self.fresh(self.quiz)
+        answer_keys.for_quiz(quiz)
+        with self.assertNumQueries(0):
+            answer_keys.for_quiz(quiz)
+
+    def test_question_edit_invalidates_key(self):
+        self.assertEqual(self.answers(self.quiz), ["2", "4"])
+
+        question = self.quiz.questions.get(order=2)
+        question.correct_answer = "cuatro"
+        question.save()
+        self.assertEqual(self.answers(self.quiz), ["2", "cuatro"])
+
+        question.delete()
+        self.assertEqual(self.answers(self.quiz), ["2"])
+
+    def test_question_move_invalidates_both_keys(self):
+        other = self.create_quiz("Q2")
+        self.assertEqual(self.answers(self.quiz), ["2", "4"])
+        self.assertEqual(self.answers(other), ["2", "4"])
+
+        question = Question.objects.get(quiz=self.quiz, order=2)
+        question.quiz = other
+        question.order = 3
+        question.save()
+
+        self.assertEqual(self.answers(self.quiz), ["2"])
+        self.assertEqual(self.answers(other), ["2", "4", "4"])
+
+    def test_full_quiz_save_keeps_answers_version(self):
+        stale = self.fresh(self.quiz)
+        self.assertEqual(self.answers(self.quiz), ["2", "4"])
+
+        question = self.quiz.questions.get(order=1)
+        question.correct_answer = "dos"
+        question.save()
+        bumped = self.fresh(self.quiz).answers_version
+
+        # Edición del quiz con una instancia cargada antes del cambio de preguntas
+        stale.title = "Q1 editado"
+        stale.save()
+
+        self.assertEqual(self.fresh(self.quiz).answers_version, bumped)
+        self.assertEqual(self.answers(self.quiz), ["dos", "4"])
+
+
+class SubmitBatchTests(QuizTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other_course = Course.objects.create(title="C2", description="d", created_by=self.admin)
+        self.quizzes = [
+            self.quiz,
+            self.create_quiz("Q2", xp_reward=90),
+            self.create_quiz("Q3", course=self.other_course, xp_reward=200),
+            self.create_quiz("Q4", course=self.other_course),
+        ]
+        self.twin = User.objects.create_user("twin@x.com", "pw", role="user")
+        Enrollment.objects.create(user=self.student, course=self.other_course)
+        for course in (self.course, self.other_course):
+            Enrollment.objects.create(user=self.twin, course=course)
+        Notification.objects.all().delete()
+
+    def entries(self, quizzes=None):
+        entries = []
+        for i, quiz in enumerate(quizzes or self.quizzes):
+            questions = list(quiz.questions.values_list('pk', flat=True))
+            # El último quiz se suspende
+            answers = {str(questions[0]): "2", str(questions[1]): "4"} if i < 3 else {str(questions[0]): "0"}
+            entries.append({'quiz_id': quiz.pk, 'answers': answers, 'time_taken': 30 + i})
+        return entries
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def state(self, user):
+        user = User.objects.get(pk=user.pk)
+        statistic = UserStatistic.objects.get(user=user)
+        return {
+            'user': (user.xp, user.level),
+            'attempts': sorted(
+                QuizAttempt.objects.filter(user=user).values_list('quiz__title', 'score', 'passed', 'time_taken', 'answers')
+            ),
+            'xp_history': sorted(
+                XpHistory.objects.filter(user=user).values_list('xp_gained', 'source', 'related_quiz__title', 'related_course__title')
+            ),
+            'rollups': sorted(XpDailyRollup.objects.filter(user=user).values_list('day', 'xp', 'events')),
+            'statistic': (
+                statistic.total_quizzes_attempted, statistic.total_quizzes_passed,
+                round(statistic.average_quiz_score, 6), statistic.total_xp_earned,
+                statistic.total_quizzes_completed, round(statistic.course_progress_sum, 6),
+                statistic.total_courses_completed, statistic.days_active, statistic.current_streak_days,
+            ),
+            'progress': sorted(
+                Progress.objects.filter(user=user).values_list(
+                    'course__title', 'completed_quizzes', 'percentage', 'xp_earned', 'course_completed', 'streak_days'
+                )
+            ),
+            'activity_days': sorted(
+                (title or '', day) for title, day in ActivityDay.objects.filter(user=user).values_list('course__title', 'day')
+            ),
+            'leaderboard': sorted(LeaderboardEntry.objects.filter(user=user).values_list('metric', 'value')),
+            'notifications': sorted(Notification.objects.filter(user=user).values_list('type', 'title', 'message')),
+        }
+
+    def test_batch_matches_single_submissions(self):
+        single = self.client_for(self.student)
+        for entry in self.entries():
+            response = single.post('/api/quizzes/submit/', entry, format='json')
+            self.assertEqual(response.status_code, 201, response.content)
+
+        response = self.client_for(self.twin).post(
+            '/api/quizzes/submit/batch/', {'attempts': self.entries()}, format='json'
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+
+        self.assertEqual(self.state(self.twin), self.state(self.student))
+
+        # Los agregados incrementales coinciden con los recalculados
+        incremental = sorted(QuizAggregate.objects.values_list('quiz_id', 'attempts', 'passes', 'score_sum', 'time_histogram'))
+        QuizAggregate.rebuild()
+        self.assertEqual(
+            sorted(QuizAggregate.objects.values_list('quiz_id', 'attempts', 'passes', 'score_sum', 'time_histogram')),
+            incremental
+        )
+
+    def test_batch_queries_do_not_grow_per_quiz(self):
+        extra = [self.create_quiz(f"Q{i}", course=self.other_course) for i in range(5, 9)]
+
+        def batch_queries(user, quizzes):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client_for(user).post(
+                    '/api/quizzes/submit/batch/', {'attempts': self.entries(quizzes)[:2]}, format='json'
+                )
+            self.assertEqual(response.status_code, 201, response.content)
+            return len(queries)
+
+        # Dos quizzes del mismo curso frente a cuatro: solo cambian los INSERT
+        two = batch_queries(self.student, extra[:2])
+        entries = self.entries(extra)[:2] + self.entries(extra[2:])[:2]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client_for(self.twin).post('/api/quizzes/submit/batch/', {'attempts': entries}, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(len(queries), two)
+
+    def test_concurrent_duplicate_is_reported_per_entry(self):
+        compile_keys = answer_keys.for_quizzes
+
+        # Otro envío del primer quiz se guarda después de las comprobaciones del lote
+        def submit_meanwhile(quizzes):
+            QuizAttempt.objects.create(user=self.student, quiz=self.quiz, score=0, passed=False)
+            return compile_keys(quizzes)
+
+        with mock.patch.object(answer_keys, 'for_quizzes', side_effect=submit_meanwhile):
+            response = self.client_for(self.student).post(
+                '/api/quizzes/submit/batch/', {'attempts': self.entries()[:2]}, format='json'
+            )
+
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.data['results'][0], {'error': "Ya enviaste este quiz"})
+        self.assertIn('attempt', response.data['results'][1])
+        self.assertEqual(User.objects.get(pk=self.student.pk).xp, 90)
+
+    def test_repeated_single_submission_is_a_client_error(self):
+        client = self.client_for(self.student)
+        entry = self.entries()[0]
+        self.assertEqual(client.post('/api/quizzes/submit/', entry, format='json').status_code, 201)
+
+        response = client.post('/api/quizzes/submit/', entry, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'error': "Ya enviaste este quiz"})
+
+
+class QuizListQueryTests(QuizTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def get_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response, len(queries)
+
+    def test_course_quizzes_queries_do_not_grow_per_quiz(self):
+        url = f'/api/quizzes/course/{self.course.pk}/'
+        _, one = self.get_queries(url)
+        _, one_with_questions = self.get_queries(url + '?include=questions')
+        # Inscripción, COUNT, quizzes anotados, intentos e inscripciones del usuario
+        self.assertEqual(one, 5)
+
+        for i in range(2, 6):
+            self.create_quiz(f"Q{i}")
+        response, many = self.get_queries(url)
+        self.assertEqual(many, one)
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertNotIn('questions', response.data['results'][0])
+
+        _, many_with_questions = self.get_queries(url + '?include=questions')
+        self.assertEqual(many_with_questions, one_with_questions)
+        self.assertEqual(many_with_questions, one + 1)
+
+    def test_available_quizzes_query_count(self):
+        for i in range(2, 6):
+            self.create_quiz(f"Q{i}")
+        with self.assertNumQueries(4):
+            self.client.get('/api/quizzes/available/')
+        with self.assertNumQueries(5):
+            self.client.get('/api/quizzes/available/?include=questions')
+
+    def test_course_quizzes_matches_available_quizzes(self):
+        self.create_quiz("Q2")
+        available = self.client.get('/api/quizzes/available/').data
+        course = self.client.get(f'/api/quizzes/course/{self.course.pk}/').data
+        self.assertEqual(course, available)
+
+
+class QuizAggregateTests(QuizTestCase):
+    FIELDS = (
+        'attempts', 'passes', 'score_sum', 'score_sq_sum', 'passed_score_sum', 'time_taken_sum', 'time_histogram'
+    )
+
+    def aggregates(self):
+        return {
+            row[0]: row[1:]
+            for row in QuizAggregate.objects.order_by('quiz_id').values_list('quiz_id', *self.FIELDS)
+        }
+
+    def test_incremental_aggregates_match_rebuild(self):
+        from io import StringIO
+        from statistics import mean, pstdev
+        from django.core.management import call_command
+
+        quizzes = [self.quiz, self.create_quiz("Q2"), self.create_quiz("Q3")]
+        # Respuestas: ambas bien, una bien (50 %, aprueba) y ninguna
+        answer_sets = [("2", "4"), ("2", "0"), ("0", "0")]
+        for i in range(6):
+            student = User.objects.create_user(f"v{i}@x.com", "pw", role="user")
+            Enrollment.objects.create(user=student, course=self.course)
+            client = APIClient()
+            client.force_authenticate(student)
+            entries = []
+            for j, quiz in enumerate(quizzes):
+                questions = [str(pk) for pk in quiz.questions.values_list('pk', flat=True)]
+                entries.append({
+                    'quiz_id': quiz.pk,
+                    'answers': dict(zip(questions, answer_sets[(i + j) % 3])),
+                    'time_taken': [30, 60, 61, 299, 1800, 5000][(i + j) % 6],
+                })
+            if i % 2:
+                response = client.post('/api/quizzes/submit/batch/', {'attempts': entries}, format='json')
+                self.assertEqual(response.status_code, 201, response.content)
+            else:
+                for entry in entries:
+                    response = client.post('/api/quizzes/submit/', entry, format='json')
+                    self.assertEqual(response.status_code, 201, response.content)
+
+        incremental = self.aggregates()
+        self.assertEqual(len(incremental), 3)
+        call_command('rebuild_quiz_aggregates', stdout=StringIO())
+        rebuilt = self.aggregates()
+        for quiz_id, values in incremental.items():
+            for field, value, expected in zip(self.FIELDS, values, rebuilt[quiz_id]):
+                if isinstance(value, float):
+                    self.assertAlmostEqual(value, expected, msg=field)
+                else:
+                    self.assertEqual(value, expected, field)
+
+        # Las medidas derivadas coinciden con las de los intentos
+        attempts = QuizAttempt.objects.filter(quiz=quizzes[0])
+        scores = list(attempts.values_list('score', flat=True))
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        data = client.get(f'/api/quizzes/{quizzes[0].pk}/statistics/').json()
+        self.assertEqual(data['attempts'], 6)
+        self.assertAlmostEqual(data['mean_score'], mean(scores))
+        self.assertAlmostEqual(data['score_stddev'], pstdev(scores))
+        self.assertAlmostEqual(data['pass_rate'], attempts.filter(passed=True).count() / 6 * 100)
+        self.assertEqual(sum(data['time_histogram']), 6)
+
+    def test_time_histogram_bucket_edges(self):
+        self.assertEqual(
+            [QuizAggregate.bucket_for(seconds) for seconds in (0, 60, 61, 120, 1800, 1801, 10 ** 6)],
+            [0, 0, 1, 1, 5, 6, 6]
+        )
+
+
+class QuizAttemptListTests(QuizTestCase):
+    def setUp(self):
+        super().setUp()
+        from datetime import timedelta
+        from django.utils import timezone
+
+        # 25 intentos del quiz con empates en completed_at (de tres en tres)
+        base = timezone.now() - timedelta(days=1)
+        self.attempts = []
+        for i in range(25):
+            student = User.objects.create_user(f"v{i}@x.com", "pw", role="user")
+            attempt = QuizAttempt.objects.create(user=student, quiz=self.quiz, score=i)
+            QuizAttempt.objects.filter(pk=attempt.pk).update(completed_at=base + timedelta(minutes=i // 3))
+            self.attempts.append(attempt)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def expected_order(self):
+        attempts = QuizAttempt.objects.filter(quiz=self.quiz).order_by('-completed_at', '-pk')
+        return list(attempts.values_list('pk', flat=True))
+
+    def pages(self, url, page_size):
+        """Ids de cada página siguiendo los enlaces `next` (que ya llevan page_size)."""
+        ids = []
+        if '?' not in url:
+            url = f'{url}?page_size={page_size}'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            data = response.json()
+            self.assertLessEqual(len(data['results']), page_size)
+            ids.append([row['id'] for row in data['results']])
+            url = data['next']
+        return ids
+
+    def test_keyset_pages_cover_every_attempt_once(self):
+        pages = self.pages(f'/api/quizzes/{self.quiz.pk}/attempts/', 7)
+        self.assertEqual([len(page) for page in pages], [7, 7, 7, 4])
+        self.assertEqual([pk for page in pages for pk in page], self.expected_order())
+
+    def test_new_attempts_do_not_shift_later_pages(self):
+        url = f'/api/quizzes/{self.quiz.pk}/attempts/'
+        first = self.client.get(url, {'page_size': 10}).json()
+        expected_rest = self.expected_order()[10:]
+
+        # Intento nuevo entre una página y la siguiente: no se repiten ni se saltan filas
+        QuizAttempt.objects.create(user=self.student, quiz=self.quiz, score=100)
+        rest = self.pages(first['next'], 10)
+        self.assertEqual([pk for page in rest for pk in page], expected_rest)
+
+    def test_invalid_cursor_and_page_size(self):
+        url = f'/api/quizzes/{self.quiz.pk}/attempts/'
+        self.assertEqual(self.client.get(url, {'after': 'no-es-un-cursor'}).status_code, 404)
+        self.assertEqual(len(self.client.get(url, {'page_size': 1000}).json()['results']), 25)
+        self.assertEqual(len(self.client.get(url, {'page_size': 'x'}).json()['results']), 20)
+
+    def test_row_numbers_match_the_count_per_attempt(self):
+        quizzes = [self.quiz] + [self.create_quiz(f"Q{i}") for i in range(2, 6)]
+        for quiz in quizzes:
+            QuizAttempt.objects.get_or_create(user=self.student, quiz=quiz)
+
+        numbered = {
+            attempt.pk: attempt.attempt_number
+            for attempt in QuizAttempt.with_attempt_numbers().select_related('user', 'quiz')
+        }
+        # Sin la anotación, attempt_number cuenta los intentos anteriores con una consulta
+        counted = {
+            attempt.pk: attempt.attempt_number
+            for attempt in QuizAttempt.objects.select_related('user', 'quiz')
+        }
+        self.assertEqual(numbered, counted)
+
+        client = APIClient()
+        client.force_authenticate(self.student)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/quizzes/my-attempts/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 5)
+        self.assertEqual({row['attempt_number'] for row in response.json()['results']}, {1})
+        # Ninguna consulta COUNT por fila (la de attempt_number sin anotar)
+        self.assertFalse([query for query in queries if '"quizzes_quizattempt"."completed_at" <' in query['sql']])
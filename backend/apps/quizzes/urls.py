@@ -5,9 +5,11 @@ from .views import (
     CreateQuizView,
     UpdateQuizView,
     SubmitQuizView,
+    SubmitQuizBatchView,
     UserAttemptsView,
     QuizAttemptsView,
     QuizStatisticsView,
+    QuizAggregateView,
     CourseQuizzesView,
 )
 
@@ -23,9 +25,11 @@ urlpatterns = [
     
     # Intentos de quiz
     path("submit/", SubmitQuizView.as_view(), name="submit-quiz"),
+    path("submit/batch/", SubmitQuizBatchView.as_view(), name="submit-quiz-batch"),
     path("my-attempts/", UserAttemptsView.as_view(), name="user-attempts"),
     path("<int:quiz_id>/attempts/", QuizAttemptsView.as_view(), name="quiz-attempts"),
     
     # Estadísticas
     path("statistics/", QuizStatisticsView.as_view(), name="quiz-statistics"),
+    path("<int:quiz_id>/statistics/", QuizAggregateView.as_view(), name="quiz-aggregate"),
 ]
\ No newline at end of file
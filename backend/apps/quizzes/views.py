@@ -1,37 +1,55 @@
 from rest_framework import generics, permissions, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from django.db import IntegrityError, transaction
 from django.db.models import Q, Count, Avg, F
 from django.shortcuts import get_object_or_404
 
-from .models import Quiz, Question, QuizAttempt
+from .models import Quiz, Question, QuizAttempt, QuizAggregate
 from .serializers import (
     QuizSerializer,
+    QuizListSerializer,
     CreateQuizSerializer,
     QuizAttemptSerializer,
     SubmitQuizSerializer,
+    SubmitQuizBatchSerializer,
     QuizStatisticsSerializer,
+    QuizAggregateSerializer,
 )
+from .pagination import AttemptKeysetPagination
 from apps.users.permissions import IsAdmin, IsModerator, IsAdminOrModerator
 
 class AvailableQuizzesView(generics.ListAPIView):
-    """Lista los quizzes disponibles para el usuario."""
-    serializer_class = QuizSerializer
+    """
+    Lista los quizzes disponibles para el usuario. Sin preguntas salvo
+    con ?include=questions.
+    """
     permission_classes = [permissions.IsAuthenticated]
 
+    def include_questions(self):
+        return 'questions' in self.request.query_params.get('include', '').split(',')
+
+    def get_serializer_class(self):
+        return QuizSerializer if self.include_questions() else QuizListSerializer
+
+    def listed_quizzes(self, **filters):
+        # Estadísticas anotadas; los intentos del usuario se cargan una vez en el serializer
+        quizzes = Quiz.with_statistics(Quiz.objects.filter(is_active=True, **filters).select_related('course'))
+        if self.include_questions():
+            quizzes = quizzes.prefetch_related('questions')
+        return quizzes
+
     def get_queryset(self):
         user = self.request.user
+        quizzes = self.listed_quizzes()
         # Para admin/moderator ven todos los quizzes activos
         if user.role in ['admin', 'moderator']:
-            return Quiz.objects.filter(is_active=True).select_related('course')
+            return quizzes
         else:
             # Para usuarios regulares, solo quizzes de cursos en los que están inscritos
             from apps.courses.models import Enrollment
             enrolled_courses = Enrollment.objects.filter(user=user).values_list('course_id', flat=True)
-            return Quiz.objects.filter(
-                course_id__in=enrolled_courses,
-                is_active=True
-            ).select_related('course')
+            return quizzes.filter(course_id__in=enrolled_courses)
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -43,7 +61,7 @@ class QuizDetailView(generics.RetrieveAPIView):
     """Detalle de un quiz específico."""
     serializer_class = QuizSerializer
     permission_classes = [permissions.IsAuthenticated]
-    queryset = Quiz.objects.filter(is_active=True)
+    queryset = Quiz.with_statistics(Quiz.objects.filter(is_active=True).select_related('course'))
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -113,16 +131,20 @@ class SubmitQuizView(APIView):
         serializer = SubmitQuizSerializer(data=request.data, context={'request': request})
         serializer.is_valid(raise_exception=True)
         
-        quiz = get_object_or_404(Quiz, id=serializer.validated_data['quiz_id'])
+        quiz = serializer.validated_data['quiz']
         answers = serializer.validated_data['answers']
         time_taken = serializer.validated_data['time_taken']
 
-        # Crear attempt
-        attempt = QuizAttempt.objects.create(
-            user=request.user,
-            quiz=quiz,
-            time_taken=time_taken
-        )
+        # Crear attempt (otro envío simultáneo del mismo quiz choca con unique_together)
+        try:
+            with transaction.atomic():
+                attempt = QuizAttempt.objects.create(
+                    user=request.user,
+                    quiz=quiz,
+                    time_taken=time_taken
+                )
+        except IntegrityError:
+            return Response({"error": "Ya enviaste este quiz"}, status=status.HTTP_400_BAD_REQUEST)
         
         # Evaluar respuestas
         attempt.evaluate(answers)
@@ -139,23 +161,62 @@ class SubmitQuizView(APIView):
         }, status=status.HTTP_201_CREATED)
 
 
+class SubmitQuizBatchView(APIView):
+    """
+    Envía varios quizzes de una vez (sincronización de la app sin conexión).
+    Cada envío se acepta o se rechaza por separado; la respuesta trae un
+    resultado por envío, en el mismo orden.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = SubmitQuizBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        previous_xp = request.user.xp
+        results = QuizAttempt.submit_batch(request.user, serializer.validated_data['attempts'])
+
+        attempts = [result for result in results if isinstance(result, QuizAttempt)]
+        attempt_data = iter(QuizAttemptSerializer(attempts, many=True).data)
+        response_results = [
+            {"attempt": next(attempt_data)} if isinstance(result, QuizAttempt) else {"error": result}
+            for result in results
+        ]
+
+        return Response({
+            "message": f"{len(attempts)} de {len(results)} quizzes registrados",
+            "results": response_results,
+            "xp_gained": request.user.xp - previous_xp,
+            "current_level": request.user.level,
+            "total_xp": request.user.xp
+        }, status=status.HTTP_201_CREATED if attempts else status.HTTP_400_BAD_REQUEST)
+
+
 class UserAttemptsView(generics.ListAPIView):
     """Lista los intentos de quiz del usuario."""
     serializer_class = QuizAttemptSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return QuizAttempt.objects.filter(user=self.request.user).select_related('quiz', 'quiz__course')
+        return QuizAttempt.with_attempt_numbers(
+            QuizAttempt.objects.filter(user=self.request.user).select_related('quiz', 'quiz__course')
+        )
 
 
 class QuizAttemptsView(generics.ListAPIView):
-    """Lista los intentos de un quiz específico (solo para admin/moderator)."""
+    """
+    Lista los intentos de un quiz específico (solo para admin/moderator),
+    del más reciente al más antiguo, con paginación por clave (?after=).
+    """
     serializer_class = QuizAttemptSerializer
     permission_classes = [IsAdminOrModerator]
+    pagination_class = AttemptKeysetPagination
 
     def get_queryset(self):
         quiz_id = self.kwargs['quiz_id']
-        return QuizAttempt.objects.filter(quiz_id=quiz_id).select_related('user')
+        return QuizAttempt.with_attempt_numbers(
+            QuizAttempt.objects.filter(quiz_id=quiz_id).select_related('user', 'quiz__course')
+        )
 
 
 class QuizStatisticsView(APIView):
@@ -163,25 +224,28 @@ class QuizStatisticsView(APIView):
     permission_classes = [IsAdminOrModerator]
 
     def get(self, request):
-        from django.db.models import Count, Avg, F
+        from django.db.models import Sum
+        from django.db.models.functions import Coalesce
         
         total_quizzes = Quiz.objects.filter(is_active=True).count()
-        total_attempts = QuizAttempt.objects.count()
         
-        stats = QuizAttempt.objects.aggregate(
-            average_score=Avg('score'),
-            pass_rate=Avg(F('passed'), output_field=models.FloatField()) * 100
-            )
+        # Totales desde los acumulados por quiz (QuizAggregate), sin recorrer los intentos
+        stats = QuizAggregate.objects.aggregate(
+            attempts=Sum('attempts'),
+            passes=Sum('passes'),
+            score_sum=Sum('score_sum')
+        )
+        total_attempts = stats['attempts'] or 0
         
         popular_quizzes = Quiz.objects.filter(is_active=True).annotate(
-            attempt_count=Count('attempts')
+            attempt_count=Coalesce('stats__attempts', 0)
         ).order_by('-attempt_count')[:5].values('id', 'title', 'attempt_count')
         
         data = {
             'total_quizzes': total_quizzes,
             'total_attempts': total_attempts,
-            'average_score': stats['average_score'] or 0,
-            'pass_rate': stats['pass_rate'] or 0,
+            'average_score': stats['score_sum'] / total_attempts if total_attempts else 0,
+            'pass_rate': stats['passes'] / total_attempts * 100 if total_attempts else 0,
             'popular_quizzes': list(popular_quizzes)
         }
         
@@ -189,25 +253,29 @@ class QuizStatisticsView(APIView):
         return Response(serializer.data)
 
 
-class CourseQuizzesView(generics.ListAPIView):
-    """Lista los quizzes de un curso específico."""
-    serializer_class = QuizSerializer
-    permission_classes = [permissions.IsAuthenticated]
+class QuizAggregateView(generics.RetrieveAPIView):
+    """Estadísticas acumuladas de un quiz (solo admin/moderator)."""
+    serializer_class = QuizAggregateSerializer
+    permission_classes = [IsAdminOrModerator]
+
+    def get_object(self):
+        quiz = get_object_or_404(Quiz, pk=self.kwargs['quiz_id'])
+        return quiz.aggregate_stats or QuizAggregate(quiz=quiz, time_histogram=QuizAggregate.empty_histogram())
+
+
+class CourseQuizzesView(AvailableQuizzesView):
+    """
+    Lista los quizzes de un curso específico, con el mismo queryset anotado
+    y los mismos serializers que AvailableQuizzesView.
+    """
 
     def get_queryset(self):
         course_id = self.kwargs['course_id']
         user = self.request.user
         
         # Verificar que el usuario esté inscrito en el curso o sea admin/moderator
-        if user.role in ['admin', 'moderator']:
-            return Quiz.objects.filter(course_id=course_id, is_active=True)
-        else:
+        if user.role not in ['admin', 'moderator']:
             from apps.courses.models import Enrollment
             if not Enrollment.objects.filter(user=user, course_id=course_id).exists():
                 return Quiz.objects.none()
-            return Quiz.objects.filter(course_id=course_id, is_active=True)
-
-    def get_serializer_context(self):
-        context = super().get_serializer_context()
-        context['request'] = self.request
-        return context
\ No newline at end of file
+        return self.listed_quizzes(course_id=course_id)
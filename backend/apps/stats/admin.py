@@ -1,5 +1,14 @@
 from django.contrib import admin
-from .models import XpHistory, UserStatistic, PlatformStatistic
+from .models import (
+    XpHistory,
+    XpArchive,
+    XpDailyRollup,
+    ActivityDay,
+    ActiveUserSketch,
+    UserStatistic,
+    PlatformStatistic,
+    LeaderboardEntry,
+)
 
 
 @admin.register(XpHistory)
@@ -23,6 +32,35 @@ class XpHistoryAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(XpArchive)
+class XpArchiveAdmin(admin.ModelAdmin):
+    list_display = ("month", "rows", "file_name", "created_at")
+    readonly_fields = ("month", "rows", "file_name", "created_at")
+
+
+@admin.register(XpDailyRollup)
+class XpDailyRollupAdmin(admin.ModelAdmin):
+    list_display = ("user", "day", "source", "xp", "events")
+    list_filter = ("source", "day")
+    search_fields = ("user__email",)
+    list_select_related = ("user",)
+
+
+@admin.register(ActivityDay)
+class ActivityDayAdmin(admin.ModelAdmin):
+    list_display = ("user", "day", "course")
+    list_filter = ("day",)
+    search_fields = ("user__email",)
+    list_select_related = ("user", "course")
+
+
+@admin.register(ActiveUserSketch)
+class ActiveUserSketchAdmin(admin.ModelAdmin):
+    list_display = ("day", "count", "updated_at")
+    exclude = ("users",)
+    readonly_fields = ("day", "count", "updated_at")
+
+
 @admin.register(UserStatistic)
 class UserStatisticAdmin(admin.ModelAdmin):
     list_display = ("user", "total_xp_earned", "total_courses_completed", "current_streak_days", "updated_at")
@@ -84,4 +122,13 @@ class PlatformStatisticAdmin(admin.ModelAdmin):
         ('Metadatos', {
             'fields': ('created_at', 'updated_at')
         }),
-    )
\ No newline at end of file
+    )
+
+@admin.register(LeaderboardEntry)
+class LeaderboardEntryAdmin(admin.ModelAdmin):
+    list_display = ("metric", "user", "value", "xp", "level", "updated_at")
+    list_filter = ("metric",)
+    search_fields = ("user__email",)
+    readonly_fields = ("updated_at",)
+    list_select_related = ("user",)
+    ordering = ("metric", "-value", "-xp", "user_id")
@@ -0,0 +1,125 @@
+"""
+Exportaciones en streaming (CSV o NDJSON, opcionalmente gzip).
+
+Cada conjunto de datos se lee con iterator(chunk_size=...), que en
+PostgreSQL usa un cursor del lado del servidor, y se emite fila a fila:
+la memoria usada no depende del tamaño de la tabla.
+"""
+import csv
+import json
+import zlib
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+OUTPUTS = ('csv', 'ndjson')
+CHUNK_SIZE = 2000
+
+
+def _datasets():
+    from apps.courses.models import Enrollment
+    from apps.media_content.models import MediaView
+    from apps.progress.models import Progress
+    from apps.quizzes.models import QuizAttempt
+    from apps.stats.models import XpHistory
+
+    return {
+        'xp-history': (XpHistory, 'created_at', [
+            'id', 'user_id', 'user__email', 'xp_gained', 'source', 'description',
+            'related_quiz_id', 'related_course_id', 'created_at',
+        ]),
+        'quiz-attempts': (QuizAttempt, 'completed_at', [
+            'id', 'user_id', 'user__email', 'quiz_id', 'quiz__title',
+            'score', 'passed', 'time_taken', 'completed_at',
+        ]),
+        'enrollments': (Enrollment, 'enrolled_at', [
+            'id', 'user_id', 'user__email', 'course_id', 'course__title', 'progress',
+            'course_completed', 'enrolled_at', 'completed_at', 'last_accessed',
+        ]),
+        'progress': (Progress, 'updated_at', [
+            'id', 'user_id', 'user__email', 'course_id', 'course__title',
+            'completed_quizzes', 'total_quizzes', 'percentage', 'xp_earned',
+            'course_completed', 'completed_at', 'streak_days', 'updated_at',
+        ]),
+        'media-views': (MediaView, 'viewed_at', [
+            'id', 'media_id', 'media__title', 'user_id', 'user__email',
+            'duration_watched', 'viewed_at',
+        ]),
+    }
+
+
+DATASETS = ('xp-history', 'quiz-attempts', 'enrollments', 'progress', 'media-views')
+
+
+def export_rows(dataset, start=None, end=None):
+    """
+    Devuelve (cabecera, generador de tuplas) del conjunto `dataset` entre las
+    fechas locales `start` y `end` (incluidas), en orden de id.
+    """
+    model, date_field, fields = _datasets()[dataset]
+    queryset = model.objects.all()
+    if start:
+        queryset = queryset.filter(**{
+            f'{date_field}__gte': timezone.make_aware(datetime.combine(start, time.min))
+        })
+    if end:
+        queryset = queryset.filter(**{
+            f'{date_field}__lt': timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min))
+        })
+
+    rows = queryset.order_by('id').values_list(*fields).iterator(chunk_size=CHUNK_SIZE)
+    header = [field.replace('__', '_') for field in fields]
+    return header, rows
+
+
+def _format(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+class _Echo:
+    """Pseudo-fichero para csv.writer: devuelve la línea en vez de guardarla."""
+
+    def write(self, value):
+        return value
+
+
+def render_csv(header, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(header).encode('utf-8')
+    for row in rows:
+        yield writer.writerow([_format(value) for value in row]).encode('utf-8')
+
+
+def render_ndjson(header, rows):
+    for row in rows:
+        record = dict(zip(header, (_format(value) for value in row)))
+        yield (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+
+
+def render(output, header, rows):
+    if output == 'ndjson':
+        return render_ndjson(header, rows)
+    return render_csv(header, rows)
+
+
+def gzip_stream(chunks, flush_every=256 * 1024):
+    """Comprime un flujo de bytes en formato gzip sin acumularlo en memoria."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: cabecera gzip
+    pending = 0
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        pending += len(chunk)
+        if data:
+            yield data
+        # Vaciar de vez en cuando para que el cliente reciba datos con regularidad
+        if pending >= flush_every:
+            yield compressor.flush(zlib.Z_SYNC_FLUSH)
+            pending = 0
+    yield compressor.flush()
+
+
+def file_name(dataset, output, compressed):
+    stamp = timezone.localdate().strftime('%Y%m%d')
+    return f"{dataset}_{stamp}.{output}" + ('.gz' if compressed else '')
@@ -0,0 +1,32 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.stats.models import XpDailyRollup
+from apps.users.models import User
+
+
+class Command(BaseCommand):
+    help = "Reconstruye los acumulados diarios de XP (XpDailyRollup) a partir de XpHistory."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", help="Primer día a reconstruir (YYYY-MM-DD, hora local).")
+        parser.add_argument("--end", help="Último día a reconstruir (YYYY-MM-DD, hora local).")
+        parser.add_argument("--user", type=int, help="Limitar a un usuario por id.")
+
+    def handle(self, *args, **options):
+        try:
+            start = date.fromisoformat(options["start"]) if options["start"] else None
+            end = date.fromisoformat(options["end"]) if options["end"] else None
+        except ValueError:
+            raise CommandError("Las fechas deben tener el formato YYYY-MM-DD.")
+
+        user = None
+        if options["user"]:
+            try:
+                user = User.objects.get(pk=options["user"])
+            except User.DoesNotExist:
+                raise CommandError(f"Usuario {options['user']} no encontrado.")
+
+        total = XpDailyRollup.backfill(start=start, end=end, user=user)
+        self.stdout.write(self.style.SUCCESS(f"{total} filas de acumulado diario generadas."))
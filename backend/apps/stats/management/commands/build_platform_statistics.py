@@ -0,0 +1,41 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from apps.stats.models import PlatformStatistic
+from apps.users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Construye las estadísticas diarias de la plataforma (PlatformStatistic). "
+        "Sin fechas continúa desde el último día guardado hasta hoy."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", help="Primer día a construir (YYYY-MM-DD, hora local).")
+        parser.add_argument("--end", help="Último día a construir (YYYY-MM-DD, hora local).")
+
+    def handle(self, *args, **options):
+        try:
+            start = date.fromisoformat(options["start"]) if options["start"] else None
+            end = date.fromisoformat(options["end"]) if options["end"] else None
+        except ValueError:
+            raise CommandError("Las fechas deben tener el formato YYYY-MM-DD.")
+
+        end = end or timezone.localdate()
+        if start is None:
+            # El último día guardado puede estar incompleto: se vuelve a calcular
+            start = PlatformStatistic.objects.aggregate(last=Max("date"))["last"]
+        if start is None:
+            first_join = User.objects.aggregate(first=Min("date_joined"))["first"]
+            start = timezone.localdate(first_join) if first_join else end
+        if start > end:
+            raise CommandError("--start no puede ser posterior a --end.")
+
+        total = PlatformStatistic.build_range(start, end)
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} días de estadísticas de plataforma generados ({start} a {end})."
+        ))
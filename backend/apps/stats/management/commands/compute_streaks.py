@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.progress.models import Progress
+from apps.stats.models import ActivityDay, LeaderboardEntry, UserStatistic
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula (pensado para ejecutarse cada noche) las rachas de todos los usuarios "
+        "y cursos con una sola consulta gaps-and-islands sobre ActivityDay."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--backfill",
+            action="store_true",
+            help="Reconstruye antes el libro ActivityDay desde XpHistory y QuizAttempt."
+        )
+
+    def handle(self, *args, **options):
+        if options["backfill"]:
+            total = ActivityDay.backfill()
+            self.stdout.write(f"{total} días activos registrados.")
+
+        user_streaks = {}
+        course_streaks = {}
+        for user_id, course_id, current, longest, days_active, last_day in ActivityDay.streaks_for_all():
+            if course_id is None:
+                user_streaks[user_id] = (current, longest, days_active, last_day)
+            else:
+                course_streaks[(user_id, course_id)] = (current, last_day)
+
+        with transaction.atomic():
+            stats = []
+            for stat in UserStatistic.objects.all().iterator(chunk_size=1000):
+                current, longest, days_active, last_day = user_streaks.get(stat.user_id, (0, 0, 0, None))
+                values = (current, max(longest, stat.longest_streak_days), days_active, last_day)
+                if values != (stat.current_streak_days, stat.longest_streak_days, stat.days_active, stat.last_active_date):
+                    (stat.current_streak_days, stat.longest_streak_days,
+                     stat.days_active, stat.last_active_date) = values
+                    stats.append(stat)
+            UserStatistic.objects.bulk_update(
+                stats,
+                ['current_streak_days', 'longest_streak_days', 'days_active', 'last_active_date'],
+                batch_size=1000
+            )
+
+            progresses = []
+            for progress in Progress.objects.all().iterator(chunk_size=1000):
+                values = course_streaks.get((progress.user_id, progress.course_id), (0, None))
+                if values != (progress.streak_days, progress.last_study_date):
+                    progress.streak_days, progress.last_study_date = values
+                    progresses.append(progress)
+            Progress.objects.bulk_update(progresses, ['streak_days', 'last_study_date'], batch_size=1000)
+
+        # Las rachas rotas cambian el orden de la métrica "streak"
+        LeaderboardEntry.rebuild()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rachas actualizadas: {len(stats)} usuarios y {len(progresses)} progresos por curso."
+        ))
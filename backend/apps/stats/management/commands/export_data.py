@@ -0,0 +1,46 @@
+import sys
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.stats import exports
+
+
+class Command(BaseCommand):
+    help = (
+        "Exporta en streaming (memoria constante) XpHistory, QuizAttempt, Enrollment, "
+        "Progress o MediaView a CSV/NDJSON, opcionalmente comprimido con gzip."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("dataset", choices=exports.DATASETS)
+        parser.add_argument("--output", choices=exports.OUTPUTS, default="csv")
+        parser.add_argument("--start", help="Primer día a exportar (YYYY-MM-DD, hora local).")
+        parser.add_argument("--end", help="Último día a exportar (YYYY-MM-DD, hora local).")
+        parser.add_argument("--gzip", action="store_true", help="Comprimir la salida con gzip.")
+        parser.add_argument("--file", help="Fichero de destino (por defecto, la salida estándar).")
+
+    def handle(self, *args, **options):
+        try:
+            start = date.fromisoformat(options["start"]) if options["start"] else None
+            end = date.fromisoformat(options["end"]) if options["end"] else None
+        except ValueError:
+            raise CommandError("Las fechas deben tener el formato YYYY-MM-DD.")
+
+        header, rows = exports.export_rows(options["dataset"], start, end)
+        chunks = exports.render(options["output"], header, rows)
+        if options["gzip"]:
+            chunks = exports.gzip_stream(chunks)
+
+        target = open(options["file"], "wb") if options["file"] else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                target.write(chunk)
+        finally:
+            if options["file"]:
+                target.close()
+            else:
+                target.flush()
+
+        if options["file"]:
+            self.stderr.write(self.style.SUCCESS(f"Exportación guardada en {options['file']}."))
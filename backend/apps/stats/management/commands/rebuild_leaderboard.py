@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from apps.stats.models import LeaderboardEntry
+
+
+class Command(BaseCommand):
+    help = "Recalcula desde cero las tablas de clasificación precalculadas."
+
+    def handle(self, *args, **options):
+        total = LeaderboardEntry.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Leaderboard reconstruido: {total} estudiantes en {len(LeaderboardEntry.METRICS)} métricas."
+        ))
@@ -0,0 +1,53 @@
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.stats.models import XpRankNode
+from apps.users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruye el índice de ranking por XP (árbol de Fenwick) y, con --check, "
+        "compara sus respuestas contra el COUNT de SQL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Solo verifica el índice actual sin reconstruirlo.",
+        )
+        parser.add_argument(
+            "--sample",
+            type=int,
+            default=0,
+            help="Número de valores de XP a verificar (0 = todos los distintos).",
+        )
+
+    def handle(self, *args, **options):
+        if not options["check"]:
+            total = XpRankNode.rebuild()
+            self.stdout.write(self.style.SUCCESS(f"Índice reconstruido con {total} estudiantes."))
+
+        students = User.objects.filter(is_active=True, role="user")
+        xp_values = list(students.values_list("xp", flat=True).distinct().order_by("xp"))
+        if options["sample"] and options["sample"] < len(xp_values):
+            xp_values = random.sample(xp_values, options["sample"])
+
+        mismatches = 0
+        checked = 0
+        for xp in xp_values:
+            expected = students.filter(xp__gt=xp).count() + 1
+            actual = XpRankNode.rank_for(xp)
+            checked += 1
+            if expected != actual:
+                mismatches += 1
+                self.stdout.write(self.style.WARNING(f"XP {xp}: índice={actual} SQL={expected}"))
+
+        if mismatches:
+            raise CommandError(
+                f"{mismatches} de {checked} valores de XP no coinciden. "
+                "Ejecuta el comando sin --check para reconstruir el índice."
+            )
+        self.stdout.write(self.style.SUCCESS(f"Índice consistente ({checked} valores de XP verificados)."))
@@ -0,0 +1,129 @@
+import json
+import os
+import tempfile
+import time
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from apps.courses.models import Course
+from apps.progress.models import Progress
+from apps.stats.models import LeaderboardEntry, UserStatistic, XpRankNode
+from apps.users.models import User
+
+
+def _init_worker():
+    # Las conexiones heredadas del proceso padre no se pueden compartir
+    connections.close_all()
+
+
+def rebuild_chunk(user_ids):
+    """Reconstruye Progress y UserStatistic de un bloque de usuarios."""
+    Progress.bulk_recompute(user_ids=user_ids, notify=False)
+    # Después de Progress: UserStatistic suma sus quizzes y porcentajes
+    UserStatistic.bulk_rebuild(user_ids)
+    return user_ids[0], user_ids[-1], len(user_ids)
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruye Progress y UserStatistic de todos los estudiantes "
+        "repartiendo bloques de usuarios entre varios procesos. Se puede reanudar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Procesos en paralelo (1 = en este mismo proceso)."
+        )
+        parser.add_argument("--chunk-size", type=int, default=500, help="Usuarios por bloque.")
+        parser.add_argument(
+            "--checkpoint",
+            default=os.path.join(tempfile.gettempdir(), "rebuild_user_data.json"),
+            help="Fichero de progreso para reanudar una ejecución interrumpida."
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignora el checkpoint existente y empieza desde cero."
+        )
+
+    def handle(self, *args, **options):
+        checkpoint = options["checkpoint"]
+        done_ranges = [] if options["restart"] else self._load_checkpoint(checkpoint)
+        if done_ranges:
+            self.stdout.write(f"Reanudando: {len(done_ranges)} bloques ya procesados.")
+
+        ranges = sorted(done_ranges)
+        starts = [first for first, _ in ranges]
+
+        def already_done(user_id):
+            index = bisect_right(starts, user_id) - 1
+            return index >= 0 and user_id <= ranges[index][1]
+
+        user_ids = [
+            user_id
+            for user_id in User.objects.filter(role="user").order_by("id").values_list("id", flat=True)
+            if not already_done(user_id)
+        ]
+        size = options["chunk_size"]
+        chunks = [user_ids[i:i + size] for i in range(0, len(user_ids), size)]
+        total = len(user_ids)
+        self.stdout.write(f"{total} usuarios en {len(chunks)} bloques con {options['workers']} procesos.")
+
+        processed = 0
+        started = time.monotonic()
+
+        def report(result):
+            nonlocal processed
+            first, last, count = result
+            processed += count
+            done_ranges.append([first, last])
+            self._save_checkpoint(checkpoint, done_ranges)
+
+            elapsed = time.monotonic() - started
+            rate = processed / elapsed if elapsed else 0
+            remaining = (total - processed) / rate if rate else 0
+            self.stdout.write(
+                f"{processed}/{total} ({processed / total:.0%}) · "
+                f"{rate:.0f} usuarios/s · quedan ~{remaining:.0f}s"
+            )
+
+        if options["workers"] <= 1:
+            for chunk in chunks:
+                report(rebuild_chunk(chunk))
+        else:
+            # Cada proceso abre su propia conexión
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options["workers"], initializer=_init_worker) as pool:
+                for future in as_completed([pool.submit(rebuild_chunk, chunk) for chunk in chunks]):
+                    report(future.result())
+
+        # Las tablas derivadas de todo el conjunto se rehacen una sola vez al final
+        LeaderboardEntry.rebuild()
+        XpRankNode.rebuild()
+        # Sin signals (notify=False) los cursos completados no llegan a los contadores
+        Course.repair_counters()
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Reconstrucción completa: {processed} usuarios en {elapsed:.1f}s."
+        ))
+
+    def _load_checkpoint(self, path):
+        if not os.path.exists(path):
+            return []
+        with open(path) as checkpoint:
+            return json.load(checkpoint)["done"]
+
+    def _save_checkpoint(self, path, done_ranges):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as checkpoint:
+            json.dump({"done": done_ranges}, checkpoint)
+        os.replace(tmp_path, path)
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.stats.models import UserStatistic
+from apps.users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula desde cero las estadísticas de usuario (UserStatistic). "
+        "En operación normal se mantienen por eventos; usar solo para reparar desajustes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, help="Limitar a un usuario por id.")
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(role="user")
+        if options["user"]:
+            users = User.objects.filter(pk=options["user"])
+            if not users.exists():
+                raise CommandError(f"Usuario {options['user']} no encontrado.")
+
+        total = 0
+        for user in users.iterator():
+            stat, _ = UserStatistic.objects.get_or_create(user=user)
+            stat.update_statistics()
+            total += 1
+
+        self.stdout.write(self.style.SUCCESS(f"{total} estadísticas de usuario recalculadas."))
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Min
+from django.utils import timezone
+
+from apps.stats import partitions
+from apps.stats.models import XpArchive, XpHistory
+
+
+class Command(BaseCommand):
+    help = (
+        "Mantiene las particiones mensuales de XpHistory (PostgreSQL) y archiva "
+        "en XP_ARCHIVE_DIR los meses fríos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--ahead",
+            type=int,
+            default=3,
+            help="Meses futuros con partición creada de antemano (por defecto 3)."
+        )
+        parser.add_argument(
+            "--archive-after",
+            type=int,
+            help="Archiva los meses con más de N meses de antigüedad (p. ej. 12)."
+        )
+
+    def handle(self, *args, **options):
+        current = partitions.month_start(timezone.localdate())
+
+        if partitions.is_partitioned():
+            created = [
+                month for month in (partitions.add_months(current, n) for n in range(options["ahead"] + 1))
+                if partitions.ensure_partition(month)
+            ]
+            self.stdout.write(f"{len(created)} particiones nuevas.")
+        else:
+            self.stdout.write("XpHistory no está particionada en esta base de datos; solo se archiva.")
+
+        if options["archive_after"] is None:
+            return
+
+        cutoff = partitions.add_months(current, -options["archive_after"])
+        first = XpHistory.objects.aggregate(first=Min("created_at"))["first"]
+        month = partitions.month_start(timezone.localdate(first)) if first else cutoff
+
+        while month < cutoff:
+            archive = XpArchive.archive_month(month)
+            if archive is None:
+                self.stdout.write(f"{month:%Y-%m}: sin registros, no se archiva.")
+            else:
+                self.stdout.write(f"{month:%Y-%m}: {archive.rows} registros en {archive.file_path}")
+            month = partitions.add_months(month, 1)
+
+        self.stdout.write(self.style.SUCCESS(f"Meses anteriores a {cutoff:%Y-%m} archivados."))
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stats', '0002_platformstatistic_userstatistic_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(choices=[('xp', 'XP'), ('level', 'Nivel'), ('courses', 'Cursos completados'), ('quizzes', 'Quizzes aprobados'), ('streak', 'Racha')], max_length=10)),
+                ('rank', models.PositiveIntegerField()),
+                ('value', models.PositiveIntegerField(default=0)),
+                ('xp', models.PositiveIntegerField(default=0)),
+                ('level', models.PositiveIntegerField(default=1)),
+                ('courses_completed', models.PositiveIntegerField(default=0)),
+                ('quizzes_passed', models.PositiveIntegerField(default=0)),
+                ('streak_days', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Leaderboard Entries',
+                'ordering': ['metric', 'rank'],
+                'indexes': [models.Index(fields=['metric', 'rank'], name='stats_leade_metric_38d00b_idx'), models.Index(fields=['metric', 'value', 'xp'], name='stats_leade_metric_bf0b07_idx')],
+                'unique_together': {('metric', 'user')},
+            },
+        ),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:23
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Q
+
+
+SIZE = 1 << 16
+
+
+def build_rankings(apps, schema_editor):
+    """Llena el índice de ranking y el leaderboard con los estudiantes existentes."""
+    User = apps.get_model('users', 'User')
+    XpRankNode = apps.get_model('stats', 'XpRankNode')
+    LeaderboardEntry = apps.get_model('stats', 'LeaderboardEntry')
+
+    students = list(User.objects.filter(is_active=True, role='user').annotate(
+        courses_completed=Count(
+            'progress_records',
+            filter=Q(progress_records__course_completed=True),
+            distinct=True
+        ),
+        quizzes_passed=Count(
+            'quiz_attempts__quiz',
+            filter=Q(quiz_attempts__passed=True),
+            distinct=True
+        ),
+        streak_days=Max('progress_records__streak_days'),
+    ).values('id', 'xp', 'level', 'courses_completed', 'quizzes_passed', 'streak_days'))
+
+    # Árbol de Fenwick sobre el histograma de XP
+    tree = [0] * (SIZE + 1)
+    for student in students:
+        tree[min(student['xp'], SIZE - 1) + 1] += 1
+    for index in range(1, SIZE + 1):
+        parent = index + (index & -index)
+        if parent <= SIZE:
+            tree[parent] += tree[index]
+    XpRankNode.objects.bulk_create(
+        [XpRankNode(index=index, count=tree[index]) for index in range(1, SIZE + 1)],
+        batch_size=5000
+    )
+
+    # Leaderboard precalculado
+    metrics = {
+        'xp': 'xp',
+        'level': 'level',
+        'courses': 'courses_completed',
+        'quizzes': 'quizzes_passed',
+        'streak': 'streak_days',
+    }
+    entries = []
+    for metric, field in metrics.items():
+        ordered = sorted(students, key=lambda s: (-(s[field] or 0), -s['xp'], s['id']))
+        for rank, student in enumerate(ordered, 1):
+            entries.append(LeaderboardEntry(
+                user_id=student['id'],
+                metric=metric,
+                rank=rank,
+                value=student[field] or 0,
+                xp=student['xp'],
+                level=student['level'],
+                courses_completed=student['courses_completed'],
+                quizzes_passed=student['quizzes_passed'],
+                streak_days=student['streak_days'] or 0,
+            ))
+    LeaderboardEntry.objects.all().delete()
+    LeaderboardEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stats', '0003_leaderboardentry'),
+        ('progress', '0002_globalprogress_alter_progress_options_and_more'),
+        ('quizzes', '0002_alter_question_options_alter_quiz_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='XpRankNode',
+            fields=[
+                ('index', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['index'],
+            },
+        ),
+        migrations.RunPython(build_rankings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:24
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def backfill_rollups(apps, schema_editor):
+    """Genera los acumulados diarios del historial de XP existente."""
+    XpHistory = apps.get_model('stats', 'XpHistory')
+    XpDailyRollup = apps.get_model('stats', 'XpDailyRollup')
+
+    grouped = XpHistory.objects.annotate(
+        day=TruncDate('created_at', tzinfo=timezone.get_default_timezone())
+    ).values('user_id', 'day', 'source').annotate(
+        total_xp=Sum('xp_gained'),
+        total_events=Count('id')
+    ).order_by()
+
+    XpDailyRollup.objects.bulk_create(
+        [
+            XpDailyRollup(
+                user_id=row['user_id'],
+                day=row['day'],
+                source=row['source'],
+                xp=row['total_xp'],
+                events=row['total_events']
+            )
+            for row in grouped.iterator()
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stats', '0004_xpranknode'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='XpDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('source', models.CharField(choices=[('quiz', 'Quiz'), ('course_completion', 'Completación de Curso'), ('daily_streak', 'Racha Diaria'), ('achievement', 'Logro'), ('system_bonus', 'Bonus del Sistema'), ('level_up', 'Subida de Nivel'), ('correction', 'Corrección')], default='quiz', max_length=20)),
+                ('xp', models.PositiveIntegerField(default=0)),
+                ('events', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='xp_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'XP Daily Rollups',
+                'ordering': ['-day'],
+                'indexes': [models.Index(fields=['day'], name='stats_xpdai_day_d2cdbb_idx')],
+                'unique_together': {('user', 'day', 'source')},
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
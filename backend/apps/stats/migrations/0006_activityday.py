@@ -0,0 +1,62 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def backfill_activity_days(apps, schema_editor):
+    """Genera el libro de días activos a partir del historial de XP y de quizzes."""
+    XpHistory = apps.get_model('stats', 'XpHistory')
+    QuizAttempt = apps.get_model('quizzes', 'QuizAttempt')
+    ActivityDay = apps.get_model('stats', 'ActivityDay')
+
+    local_tz = timezone.get_default_timezone()
+    xp_days = XpHistory.objects.annotate(
+        day=TruncDate('created_at', tzinfo=local_tz)
+    ).values_list('user_id', 'related_course_id', 'day').distinct().order_by()
+    quiz_days = QuizAttempt.objects.annotate(
+        day=TruncDate('completed_at', tzinfo=local_tz)
+    ).values_list('user_id', 'quiz__course_id', 'day').distinct().order_by()
+
+    keys = set()
+    for user_id, course_id, day in list(xp_days) + list(quiz_days):
+        keys.add((user_id, None, day))
+        if course_id:
+            keys.add((user_id, course_id, day))
+
+    ActivityDay.objects.bulk_create(
+        [ActivityDay(user_id=u, course_id=c, day=d) for u, c, d in keys],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0002_course_difficulty_course_estimated_duration_and_more'),
+        ('quizzes', '0002_alter_question_options_alter_quiz_options_and_more'),
+        ('stats', '0005_xpdailyrollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('course', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='activity_days', to='courses.course')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity_days', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Activity Days',
+                'ordering': ['-day'],
+                'indexes': [models.Index(fields=['user', 'course', '-day'], name='stats_activ_user_id_d8cec0_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('course__isnull', True)), fields=('user', 'day'), name='unique_user_activity_day'), models.UniqueConstraint(condition=models.Q(('course__isnull', False)), fields=('user', 'course', 'day'), name='unique_user_course_activity_day')],
+            },
+        ),
+        migrations.RunPython(backfill_activity_days, migrations.RunPython.noop),
+    ]
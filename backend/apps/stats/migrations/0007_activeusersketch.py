@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0002_course_difficulty_course_estimated_duration_and_more'),
+        ('stats', '0006_activityday'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActiveUserSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('users', models.BinaryField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Active User Sketches',
+                'ordering': ['-day'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='activityday',
+            index=models.Index(fields=['day'], name='stats_activ_day_8ae914_idx'),
+        ),
+    ]
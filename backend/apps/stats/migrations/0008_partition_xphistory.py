@@ -0,0 +1,115 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:38
+
+from datetime import date, datetime, time
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def _add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _bound(month):
+    return timezone.make_aware(datetime.combine(month, time.min)).isoformat()
+
+
+def partition_xp_history(apps, schema_editor):
+    """
+    Convierte stats_xphistory en una tabla particionada por meses locales
+    (solo PostgreSQL). La clave primaria pasa a ser (id, created_at), como
+    exige el particionado; los ids siguen saliendo de una única secuencia.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+
+    XpHistory = apps.get_model('stats', 'XpHistory')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Quiz = apps.get_model('quizzes', 'Quiz')
+    Course = apps.get_model('courses', 'Course')
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT min(created_at) FROM stats_xphistory")
+        first = cursor.fetchone()[0]
+
+    today = timezone.localdate()
+    month = date(today.year, today.month, 1)
+    if first:
+        first_day = timezone.localdate(first)
+        month = min(month, date(first_day.year, first_day.month, 1))
+    last_month = _add_months(date(today.year, today.month, 1), 3)
+
+    statements = [
+        "ALTER TABLE stats_xphistory RENAME TO stats_xphistory_legacy",
+        "ALTER TABLE stats_xphistory_legacy RENAME CONSTRAINT stats_xphistory_pkey TO stats_xphistory_legacy_pkey",
+        "CREATE TABLE stats_xphistory (LIKE stats_xphistory_legacy INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+        "PARTITION BY RANGE (created_at)",
+        "CREATE SEQUENCE stats_xphistory_part_id_seq OWNED BY stats_xphistory.id",
+        "ALTER TABLE stats_xphistory ALTER COLUMN id SET DEFAULT nextval('stats_xphistory_part_id_seq')",
+        "ALTER TABLE stats_xphistory ADD PRIMARY KEY (id, created_at)",
+    ]
+    while month <= last_month:
+        next_month = _add_months(month, 1)
+        statements.append(
+            f"CREATE TABLE stats_xphistory_p{month.year:04d}_{month.month:02d} "
+            f"PARTITION OF stats_xphistory FOR VALUES FROM ('{_bound(month)}') TO ('{_bound(next_month)}')"
+        )
+        month = next_month
+    statements += [
+        "CREATE TABLE stats_xphistory_default PARTITION OF stats_xphistory DEFAULT",
+        "INSERT INTO stats_xphistory SELECT * FROM stats_xphistory_legacy",
+        "SELECT setval('stats_xphistory_part_id_seq', COALESCE((SELECT max(id) FROM stats_xphistory), 0) + 1, false)",
+        "DROP TABLE stats_xphistory_legacy",
+    ]
+
+    # Claves foráneas e índices (con los mismos nombres que declara el modelo)
+    for column, model in (
+        ('user_id', User),
+        ('related_quiz_id', Quiz),
+        ('related_course_id', Course),
+    ):
+        statements.append(
+            f"ALTER TABLE stats_xphistory ADD CONSTRAINT stats_xphistory_{column}_fk "
+            f"FOREIGN KEY ({column}) REFERENCES {model._meta.db_table} (id) DEFERRABLE INITIALLY DEFERRED"
+        )
+    statements += [
+        "CREATE INDEX stats_xphistory_related_quiz_id_idx ON stats_xphistory (related_quiz_id)",
+        "CREATE INDEX stats_xphistory_related_course_id_idx ON stats_xphistory (related_course_id)",
+    ]
+    for index in XpHistory._meta.indexes:
+        columns = ', '.join(XpHistory._meta.get_field(name).column for name in index.fields)
+        statements.append(f"CREATE INDEX {index.name} ON stats_xphistory ({columns})")
+
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0002_course_difficulty_course_estimated_duration_and_more'),
+        ('quizzes', '0002_alter_question_options_alter_quiz_options_and_more'),
+        ('stats', '0007_activeusersketch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='XpArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='Primer día del mes archivado (hora local)', unique=True)),
+                ('file_name', models.CharField(max_length=255)),
+                ('rows', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name_plural': 'XP Archives',
+                'ordering': ['-month'],
+            },
+        ),
+        # La tabla particionada es compatible con el modelo: revertir no la toca
+        migrations.RunPython(partition_xp_history, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:46
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def backfill_progress_totals(apps, schema_editor):
+    """Copia en UserStatistic la suma de quizzes completados y de porcentajes de Progress."""
+    Progress = apps.get_model('progress', 'Progress')
+    UserStatistic = apps.get_model('stats', 'UserStatistic')
+
+    totals = {
+        row['user_id']: row
+        for row in Progress.objects.values('user_id').annotate(
+            quizzes=Sum('completed_quizzes'),
+            percentage=Sum('percentage')
+        ).order_by()
+    }
+    stats = list(UserStatistic.objects.filter(user_id__in=totals))
+    for stat in stats:
+        stat.total_quizzes_completed = totals[stat.user_id]['quizzes'] or 0
+        stat.course_progress_sum = totals[stat.user_id]['percentage'] or 0.0
+    UserStatistic.objects.bulk_update(
+        stats,
+        ['total_quizzes_completed', 'course_progress_sum'],
+        batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('progress', '0002_globalprogress_alter_progress_options_and_more'),
+        ('stats', '0008_partition_xphistory'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstatistic',
+            name='course_progress_sum',
+            field=models.FloatField(default=0.0, help_text='Suma de Progress.percentage de sus cursos'),
+        ),
+        migrations.AddField(
+            model_name='userstatistic',
+            name='total_quizzes_completed',
+            field=models.PositiveIntegerField(default=0, help_text='Suma de Progress.completed_quizzes de sus cursos'),
+        ),
+        migrations.RunPython(backfill_progress_totals, migrations.RunPython.noop),
+    ]
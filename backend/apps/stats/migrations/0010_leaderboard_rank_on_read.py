@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stats', '0009_userstatistic_progress_totals'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='leaderboardentry',
+            options={'ordering': ['metric', '-value', '-xp', 'user_id'], 'verbose_name_plural': 'Leaderboard Entries'},
+        ),
+        migrations.RemoveIndex(
+            model_name='leaderboardentry',
+            name='stats_leade_metric_38d00b_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='leaderboardentry',
+            name='stats_leade_metric_bf0b07_idx',
+        ),
+        migrations.RemoveField(
+            model_name='leaderboardentry',
+            name='rank',
+        ),
+        migrations.AddIndex(
+            model_name='leaderboardentry',
+            index=models.Index(fields=['metric', '-value', '-xp', 'user'], name='stats_leaderboard_rank_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:32
+
+from django.db import migrations
+
+
+def drop_bitmap_sketches(apps, schema_editor):
+    """
+    Los sketches guardados como un bitmap por id de usuario no se pueden leer
+    con el formato por bloques; se derivan del libro ActivityDay, así que se
+    borran y se recalculan en la siguiente consulta.
+    """
+    apps.get_model('stats', 'ActiveUserSketch').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stats', '0010_leaderboard_rank_on_read'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_bitmap_sketches, migrations.RunPython.noop),
+    ]
@@ -55,6 +55,668 @@ class XpHistory(models.Model):
         return f"{self.user.email} +{self.xp_gained} XP ({self.source})"
 
 
+class XpArchive(models.Model):
+    """
+    Mes de XpHistory archivado fuera de la base de datos: un fichero JSON
+    Lines comprimido con gzip en XP_ARCHIVE_DIR, ordenado por usuario y
+    fecha descendente. En PostgreSQL la partición del mes se elimina.
+    """
+
+    month = models.DateField(unique=True, help_text="Primer día del mes archivado (hora local)")
+    file_name = models.CharField(max_length=255)
+    rows = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    FIELDS = [
+        'id', 'user_id', 'xp_gained', 'source', 'description',
+        'related_quiz_id', 'related_course_id', 'created_at',
+    ]
+
+    class Meta:
+        ordering = ["-month"]
+        verbose_name_plural = "XP Archives"
+
+    def __str__(self):
+        return f"XP {self.month:%Y-%m} ({self.rows} registros)"
+
+    @property
+    def file_path(self):
+        from pathlib import Path
+        return Path(settings.XP_ARCHIVE_DIR) / self.file_name
+
+    def iter_rows(self, user_id=None):
+        """Lee las filas del fichero; con `user_id` se detiene al pasar su bloque."""
+        import gzip
+        import json
+        from datetime import datetime
+
+        with gzip.open(self.file_path, 'rt', encoding='utf-8') as archive:
+            for line in archive:
+                row = json.loads(line)
+                if user_id is not None:
+                    if row['user_id'] < user_id:
+                        continue
+                    if row['user_id'] > user_id:
+                        break
+                row['created_at'] = datetime.fromisoformat(row['created_at'])
+                yield row
+
+    @classmethod
+    def rows_between(cls, start=None, end=None, user_id=None):
+        """Filas archivadas con created_at en [start, end), del mes más reciente al más antiguo."""
+        from django.utils import timezone
+        from apps.stats.partitions import month_start
+
+        archives = cls.objects.all()
+        if start:
+            archives = archives.filter(month__gte=month_start(timezone.localdate(start)))
+        if end:
+            archives = archives.filter(month__lte=month_start(timezone.localdate(end)))
+
+        for archive in archives.order_by('-month'):
+            for row in archive.iter_rows(user_id):
+                if start and row['created_at'] < start:
+                    continue
+                if end and row['created_at'] >= end:
+                    continue
+                yield row
+
+    @classmethod
+    def history(cls, user, since=None, limit=100):
+        """
+        Historial archivado del usuario como instancias XpHistory (sin guardar),
+        con quiz y curso relacionados cargados en dos consultas.
+        """
+        from itertools import islice
+        from apps.courses.models import Course
+        from apps.quizzes.models import Quiz
+
+        entries = [
+            XpHistory(**row)
+            for row in islice(cls.rows_between(start=since, user_id=user.id), limit)
+        ]
+        quizzes = Quiz.objects.in_bulk({e.related_quiz_id for e in entries if e.related_quiz_id})
+        courses = Course.objects.in_bulk({e.related_course_id for e in entries if e.related_course_id})
+        for entry in entries:
+            entry.user = user
+            entry.related_quiz = quizzes.get(entry.related_quiz_id)
+            entry.related_course = courses.get(entry.related_course_id)
+        return entries
+
+    @classmethod
+    def archive_month(cls, month):
+        """
+        Exporta el mes a disco y lo elimina de XpHistory (DETACH + DROP de la
+        partición en PostgreSQL, DELETE en otros motores). Un mes sin registros
+        y sin archivo previo no se archiva: devuelve None.
+        """
+        import gzip
+        import json
+        import os
+        from pathlib import Path
+        from django.db import transaction
+        from apps.stats import partitions
+
+        start, end = partitions.month_bounds(month)
+        events = XpHistory.objects.filter(created_at__gte=start, created_at__lt=end)
+        rows = events.order_by('user_id', '-created_at').values(*cls.FIELDS).iterator(chunk_size=5000)
+
+        existing = cls.objects.filter(month=month).first()
+        if not events.exists():
+            return existing
+        if existing:
+            # Filas tardías de un mes ya archivado: se fusionan con el fichero
+            rows = sorted(
+                list(existing.iter_rows()) + list(rows),
+                key=lambda row: (row['user_id'], -row['created_at'].timestamp())
+            )
+
+        directory = Path(settings.XP_ARCHIVE_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        file_name = f"xp_history_{month:%Y_%m}.jsonl.gz"
+        tmp_path = directory / f".{file_name}.tmp"
+
+        total = 0
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as archive:
+            for row in rows:
+                row['created_at'] = row['created_at'].isoformat()
+                archive.write(json.dumps(row) + '\n')
+                total += 1
+        os.replace(tmp_path, directory / file_name)
+
+        with transaction.atomic():
+            if partitions.is_partitioned() and month in partitions.partition_months():
+                partitions.drop_partition(month)
+            else:
+                events.delete()
+            archive, _ = cls.objects.update_or_create(
+                month=month,
+                defaults={'file_name': file_name, 'rows': total}
+            )
+        return archive
+
+
+class XpDailyRollup(models.Model):
+    """
+    XP ganada por usuario, día y fuente. Los días se agrupan en la zona
+    horaria del proyecto (TIME_ZONE), no en UTC.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="xp_rollups"
+    )
+    day = models.DateField()
+    source = models.CharField(max_length=20, choices=XpHistory.SOURCE_CHOICES, default='quiz')
+    xp = models.PositiveIntegerField(default=0)
+    events = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["-day"]
+        unique_together = ("user", "day", "source")
+        verbose_name_plural = "XP Daily Rollups"
+        indexes = [
+            models.Index(fields=['day']),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.day} +{self.xp} XP ({self.source})"
+
+    @classmethod
+    def record(cls, xp_event):
+        """Suma un registro de XpHistory recién creado a su día."""
+        cls.record_many([xp_event])
+
+    @classmethod
+    def record_many(cls, xp_events):
+        """Suma varios registros de XpHistory: una escritura por (usuario, día, fuente)."""
+        from django.db import IntegrityError, transaction
+        from django.utils import timezone
+
+        totals = {}
+        for xp_event in xp_events:
+            key = (xp_event.user_id, timezone.localdate(xp_event.created_at), xp_event.source)
+            xp, events = totals.get(key, (0, 0))
+            totals[key] = (xp + xp_event.xp_gained, events + 1)
+
+        for (user_id, day, source), (xp, events) in totals.items():
+            rollup = cls.objects.filter(user_id=user_id, day=day, source=source)
+            delta = {
+                'xp': models.F('xp') + xp,
+                'events': models.F('events') + events,
+            }
+
+            if rollup.update(**delta):
+                continue
+            try:
+                with transaction.atomic():
+                    cls.objects.create(user_id=user_id, day=day, source=source, xp=xp, events=events)
+            except IntegrityError:
+                # Otro proceso creó la fila del día entre el UPDATE y el INSERT
+                rollup.update(**delta)
+
+    @classmethod
+    def backfill(cls, start=None, end=None, user=None):
+        """
+        Reconstruye los acumulados a partir de XpHistory.
+        `start` y `end` son fechas locales incluidas; sin ellas se procesa todo.
+        """
+        from datetime import datetime, time, timedelta
+        from django.db import transaction
+        from django.db.models.functions import TruncDate
+        from django.utils import timezone
+
+        events = XpHistory.objects.all()
+        rollups = cls.objects.all()
+        start_at = end_at = None
+        if user is not None:
+            events = events.filter(user=user)
+            rollups = rollups.filter(user=user)
+        if start:
+            start_at = timezone.make_aware(datetime.combine(start, time.min))
+            events = events.filter(created_at__gte=start_at)
+            rollups = rollups.filter(day__gte=start)
+        if end:
+            end_at = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min))
+            events = events.filter(created_at__lt=end_at)
+            rollups = rollups.filter(day__lte=end)
+
+        grouped = events.annotate(
+            day=TruncDate('created_at', tzinfo=timezone.get_default_timezone())
+        ).values('user_id', 'day', 'source').annotate(
+            total_xp=models.Sum('xp_gained'),
+            total_events=models.Count('id')
+        ).order_by()
+
+        totals = {
+            (row['user_id'], row['day'], row['source']): [row['total_xp'], row['total_events']]
+            for row in grouped.iterator()
+        }
+
+        # Meses archivados fuera de la base de datos
+        archived = XpArchive.rows_between(start_at, end_at, user.id if user is not None else None)
+        for row in archived:
+            key = (row['user_id'], timezone.localdate(row['created_at']), row['source'])
+            total = totals.setdefault(key, [0, 0])
+            total[0] += row['xp_gained']
+            total[1] += 1
+
+        rows = [
+            cls(user_id=user_id, day=day, source=source, xp=xp, events=count)
+            for (user_id, day, source), (xp, count) in totals.items()
+        ]
+
+        with transaction.atomic():
+            rollups.delete()
+            cls.objects.bulk_create(rows, batch_size=1000)
+        return len(rows)
+
+
+class ActivityDay(models.Model):
+    """
+    Libro de días activos: una fila por usuario y día local con actividad
+    (course vacío) y otra por curso estudiado ese día. Las rachas y los
+    días activos se derivan de aquí, no del momento en que se consulta.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="activity_days"
+    )
+    course = models.ForeignKey(
+        'courses.Course',
+        on_delete=models.CASCADE,
+        related_name="activity_days",
+        null=True,
+        blank=True
+    )
+    day = models.DateField()
+
+    class Meta:
+        ordering = ["-day"]
+        verbose_name_plural = "Activity Days"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'day'],
+                condition=models.Q(course__isnull=True),
+                name='unique_user_activity_day'
+            ),
+            models.UniqueConstraint(
+                fields=['user', 'course', 'day'],
+                condition=models.Q(course__isnull=False),
+                name='unique_user_course_activity_day'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'course', '-day']),
+            models.Index(fields=['day']),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.day} (curso {self.course_id or '-'})"
+
+    @classmethod
+    def record(cls, user_id, when=None, course_id=None):
+        """Marca el día local de `when` como activo (idempotente, un INSERT)."""
+        cls.record_many(user_id, when, [course_id])
+
+    @classmethod
+    def record_many(cls, user_id, when=None, course_ids=()):
+        """
+        Como record, para varios cursos en el mismo INSERT. RETURNING indica
+        qué filas eran nuevas: si el día lo es para el usuario (se insertó la
+        fila sin curso) se suma a sus estadísticas, llegue en orden o no, y se
+        descarta el sketch de usuarios activos de ese día si ya estaba cerrado.
+        """
+        from django.db import connection, transaction
+        from django.utils import timezone
+
+        day = timezone.localdate(when) if when else timezone.localdate()
+        course_ids = [None] + [course_id for course_id in set(course_ids) if course_id]
+        params = []
+        for course_id in course_ids:
+            params += [user_id, course_id, day]
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {cls._meta.db_table} (user_id, course_id, day) VALUES "
+                + ", ".join("(%s, %s, %s)" for _ in course_ids)
+                + " ON CONFLICT DO NOTHING RETURNING course_id",
+                params,
+            )
+            created = [course_id for course_id, in cursor.fetchall()]
+
+        if None in created:
+            UserStatistic.record_active_day(user_id, day)
+            # Día nuevo del usuario en una jornada ya cerrada (registro con `when`
+            # pasado o transacción que confirma tras medianoche): su sketch
+            # guardado ya no lo incluye. Se comprueba al confirmar.
+            transaction.on_commit(lambda: ActiveUserSketch.discard_closed_day(day))
+
+    @classmethod
+    def _days(cls, user, course=None):
+        return cls.objects.filter(
+            user=user,
+            course=course
+        ).order_by('-day').values_list('day', flat=True)
+
+    @classmethod
+    def current_streak(cls, user, course=None, today=None):
+        """
+        Días consecutivos hasta hoy (o ayer, si hoy aún no hubo actividad).
+        Lee solo los días de la racha: O(longitud de la racha).
+        """
+        from datetime import timedelta
+        from django.utils import timezone
+
+        today = today or timezone.localdate()
+        expected = None
+        streak = 0
+        for day in cls._days(user, course).iterator(chunk_size=64):
+            if expected is None:
+                if day < today - timedelta(days=1):
+                    return 0
+            elif day != expected:
+                break
+            streak += 1
+            expected = day - timedelta(days=1)
+        return streak
+
+    @classmethod
+    def summary(cls, user, course=None, today=None):
+        """Racha actual, racha más larga, días activos y último día activo."""
+        return cls.summarize(cls._days(user, course).iterator(chunk_size=500), today)
+
+    @staticmethod
+    def summarize(days, today=None):
+        """Resume una secuencia de días activos ordenada del más reciente al más antiguo."""
+        from datetime import timedelta
+        from django.utils import timezone
+
+        today = today or timezone.localdate()
+        longest = run = days_active = current = 0
+        last_day = previous = None
+        in_first_run = True
+        for day in days:
+            last_day = last_day or day
+            consecutive = previous is not None and previous - day == timedelta(days=1)
+            if previous is not None and not consecutive:
+                in_first_run = False
+            run = run + 1 if consecutive else 1
+            longest = max(longest, run)
+            days_active += 1
+            if in_first_run:
+                current = run
+            previous = day
+
+        if last_day is None or last_day < today - timedelta(days=1):
+            current = 0
+        return {
+            'current_streak': current,
+            'longest_streak': longest,
+            'days_active': days_active,
+            'last_active_date': last_day,
+        }
+
+    # Gaps-and-islands: día - row_number es constante dentro de cada racha
+    ISLANDS_SQL = """
+        WITH numbered AS (
+            SELECT user_id, course_id, day,
+                   day - CAST(ROW_NUMBER() OVER (
+                       PARTITION BY user_id, course_id ORDER BY day
+                   ) AS integer) AS island
+            FROM stats_activityday
+        ), islands AS (
+            SELECT user_id, course_id, MAX(day) AS last_day, COUNT(*) AS length
+            FROM numbered
+            GROUP BY user_id, course_id, island
+        )
+        SELECT user_id, course_id,
+               MAX(CASE WHEN last_day >= %s THEN length ELSE 0 END) AS current_streak,
+               MAX(length) AS longest_streak,
+               SUM(length) AS days_active,
+               MAX(last_day) AS last_active_date
+        FROM islands
+        GROUP BY user_id, course_id
+    """
+
+    @classmethod
+    def streaks_for_all(cls, today=None):
+        """
+        Calcula en una sola pasada SQL las rachas de todos los usuarios.
+        Devuelve tuplas (user_id, course_id, current, longest, days_active, last_day).
+        """
+        from datetime import timedelta
+        from django.db import connection
+        from django.utils import timezone
+
+        today = today or timezone.localdate()
+        with connection.cursor() as cursor:
+            cursor.execute(cls.ISLANDS_SQL, [today - timedelta(days=1)])
+            while True:
+                rows = cursor.fetchmany(1000)
+                if not rows:
+                    break
+                yield from rows
+
+    @classmethod
+    def backfill(cls):
+        """Reconstruye el libro a partir de XpHistory (incluido el archivo) y QuizAttempt."""
+        from itertools import chain
+        from django.db import transaction
+        from django.db.models.functions import TruncDate
+        from django.utils import timezone
+        from apps.quizzes.models import QuizAttempt
+
+        local_tz = timezone.get_default_timezone()
+        xp_days = XpHistory.objects.annotate(
+            day=TruncDate('created_at', tzinfo=local_tz)
+        ).values_list('user_id', 'related_course_id', 'day').distinct().order_by()
+        quiz_days = QuizAttempt.objects.annotate(
+            day=TruncDate('completed_at', tzinfo=local_tz)
+        ).values_list('user_id', 'quiz__course_id', 'day').distinct().order_by()
+
+        archived_days = (
+            (row['user_id'], row['related_course_id'], timezone.localdate(row['created_at']))
+            for row in XpArchive.rows_between()
+        )
+
+        keys = set()
+        for user_id, course_id, day in chain(xp_days, quiz_days, archived_days):
+            keys.add((user_id, None, day))
+            if course_id:
+                keys.add((user_id, course_id, day))
+
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(
+                [cls(user_id=u, course_id=c, day=d) for u, c, d in keys],
+                batch_size=1000
+            )
+            # Los sketches de usuarios activos se derivan del libro
+            ActiveUserSketch.objects.all().delete()
+        return len(keys)
+
+
+class ActiveUserSketch(models.Model):
+    """
+    Conjunto exacto de estudiantes activos en un día local, guardado al estilo
+    roaring: los ids se reparten en bloques de 2**16 y cada bloque con algún
+    usuario se guarda como lista de uint16 (hasta ARRAY_MAX usuarios) o como
+    bitmap de 8 KB. Cada fila ocupa a lo sumo 6 bytes por bloque más
+    min(2 bytes por usuario activo, 8 KB) por bloque: crece con los usuarios
+    activos del día, no con el id máximo. Los usuarios activos de cualquier
+    ventana se obtienen uniendo (OR) los bloques diarios. Los días cerrados
+    se calculan una vez y se guardan; si luego llega un día activo atrasado,
+    ActivityDay.record_many borra el sketch de ese día (discard_closed_day).
+    """
+
+    CHUNK_BITS = 16
+    ARRAY_MAX = 4096  # por encima, la lista de uint16 ocuparía más que el bitmap
+    HEADER = '<IH'  # clave del bloque y número de usuarios - 1
+
+    day = models.DateField(unique=True)
+    users = models.BinaryField()
+    count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-day"]
+        verbose_name_plural = "Active User Sketches"
+
+    def __str__(self):
+        return f"{self.day}: {self.count} usuarios activos"
+
+    @classmethod
+    def add(cls, chunks, user_id):
+        """Añade un id a {clave de bloque: bitmap de 2**16 bits}."""
+        key = user_id >> cls.CHUNK_BITS
+        chunks[key] = chunks.get(key, 0) | (1 << (user_id & ((1 << cls.CHUNK_BITS) - 1)))
+
+    @staticmethod
+    def union(into, chunks):
+        """Une (OR) `chunks` en `into`, bloque a bloque."""
+        for key, bitmap in chunks.items():
+            into[key] = into.get(key, 0) | bitmap
+        return into
+
+    @staticmethod
+    def cardinality(chunks):
+        return sum(bitmap.bit_count() for bitmap in chunks.values())
+
+    @classmethod
+    def encode(cls, chunks):
+        import struct
+
+        data = bytearray()
+        for key in sorted(chunks):
+            bitmap = chunks[key]
+            count = bitmap.bit_count()
+            if not count:
+                continue
+            data += struct.pack(cls.HEADER, key, count - 1)
+            if count > cls.ARRAY_MAX:
+                data += bitmap.to_bytes(1 << (cls.CHUNK_BITS - 3), 'little')
+                continue
+            lows = []
+            while bitmap:
+                lows.append((bitmap & -bitmap).bit_length() - 1)
+                bitmap &= bitmap - 1
+            data += struct.pack(f'<{count}H', *lows)
+        return bytes(data)
+
+    @classmethod
+    def decode(cls, data):
+        import struct
+
+        data = bytes(data)
+        header = struct.calcsize(cls.HEADER)
+        chunk_bytes = 1 << (cls.CHUNK_BITS - 3)
+        chunks = {}
+        offset = 0
+        while offset < len(data):
+            key, count = struct.unpack_from(cls.HEADER, data, offset)
+            count += 1
+            offset += header
+            if count > cls.ARRAY_MAX:
+                chunks[key] = int.from_bytes(data[offset:offset + chunk_bytes], 'little')
+                offset += chunk_bytes
+                continue
+            bitmap = bytearray(chunk_bytes)
+            for (low,) in struct.iter_unpack('<H', data[offset:offset + 2 * count]):
+                bitmap[low >> 3] |= 1 << (low & 7)
+            chunks[key] = int.from_bytes(bitmap, 'little')
+            offset += 2 * count
+        return chunks
+
+    @classmethod
+    def discard_closed_day(cls, day):
+        """
+        Borra el sketch guardado de `day` si el día ya está cerrado; se vuelve
+        a calcular desde el libro en la siguiente lectura.
+        """
+        from django.utils import timezone
+
+        if day < timezone.localdate():
+            cls.objects.filter(day=day).delete()
+
+    @classmethod
+    def _live_chunks(cls, start, end):
+        """Bloques por día calculados desde el libro ActivityDay."""
+        days = {}
+        rows = ActivityDay.objects.filter(
+            course__isnull=True,
+            day__gte=start,
+            day__lte=end,
+            user__is_active=True,
+            user__role='user'
+        ).values_list('day', 'user_id').order_by()
+        for day, user_id in rows.iterator(chunk_size=5000):
+            cls.add(days.setdefault(day, {}), user_id)
+        return days
+
+    @classmethod
+    def chunks_between(cls, start, end):
+        """
+        Devuelve {día: bloques} de `start` a `end`. Los días pasados que aún
+        no tienen sketch se calculan y se guardan; hoy siempre se lee en vivo.
+        """
+        from datetime import timedelta
+        from django.utils import timezone
+
+        today = timezone.localdate()
+        days = {
+            row.day: cls.decode(row.users)
+            for row in cls.objects.filter(day__gte=start, day__lte=min(end, today - timedelta(days=1)))
+        }
+
+        missing = [
+            start + timedelta(days=i)
+            for i in range((end - start).days + 1)
+            if start + timedelta(days=i) not in days
+        ]
+        if missing:
+            live = cls._live_chunks(missing[0], missing[-1])
+            new_rows = []
+            for day in missing:
+                chunks = live.get(day, {})
+                days[day] = chunks
+                if day < today:
+                    new_rows.append(cls(day=day, users=cls.encode(chunks), count=cls.cardinality(chunks)))
+            cls.objects.bulk_create(new_rows, ignore_conflicts=True)
+        return days
+
+    @classmethod
+    def active_users(cls, start, end):
+        """Usuarios distintos activos entre `start` y `end` (días locales incluidos)."""
+        merged = {}
+        for chunks in cls.chunks_between(start, end).values():
+            cls.union(merged, chunks)
+        return cls.cardinality(merged)
+
+    @classmethod
+    def rolling_counts(cls, today=None, windows=(1, 7, 30)):
+        """
+        Usuarios activos en las últimas N jornadas para cada ventana
+        (DAU/WAU/MAU por defecto), leyendo los sketches una sola vez.
+        """
+        from datetime import timedelta
+        from django.utils import timezone
+
+        today = today or timezone.localdate()
+        days = cls.chunks_between(today - timedelta(days=max(windows) - 1), today)
+
+        counts = {}
+        merged = {}
+        for offset in range(max(windows)):
+            cls.union(merged, days.get(today - timedelta(days=offset), {}))
+            if offset + 1 in windows:
+                counts[offset + 1] = cls.cardinality(merged)
+        return counts
+
+
 class UserStatistic(models.Model):
     """Estadísticas acumuladas del usuario."""
     
@@ -72,6 +734,14 @@ class UserStatistic(models.Model):
     # Estadísticas de cursos
     total_courses_started = models.PositiveIntegerField(default=0)
     total_courses_completed = models.PositiveIntegerField(default=0)
+    total_quizzes_completed = models.PositiveIntegerField(
+        default=0,
+        help_text="Suma de Progress.completed_quizzes de sus cursos"
+    )
+    course_progress_sum = models.FloatField(
+        default=0.0,
+        help_text="Suma de Progress.percentage de sus cursos"
+    )
     
     # Tiempo y actividad
     total_study_time_minutes = models.PositiveIntegerField(default=0)
@@ -105,13 +775,161 @@ class UserStatistic(models.Model):
             return 0.0
         return (self.total_courses_completed / self.total_courses_started) * 100
 
+    @property
+    def average_progress(self):
+        """Progreso medio de los cursos inscritos."""
+        if self.total_courses_started == 0:
+            return 0.0
+        return self.course_progress_sum / self.total_courses_started
+
+    @property
+    def active_streak_days(self):
+        """Racha vigente: se anula si no hubo actividad ni hoy ni ayer."""
+        from django.utils import timezone
+        from datetime import timedelta
+
+        if not self.last_active_date:
+            return 0
+        if self.last_active_date < timezone.localdate() - timedelta(days=1):
+            return 0
+        return self.current_streak_days
+
+    # ------------------------------------------------------------------
+    # Mantenimiento incremental (disparado por signals)
+    # ------------------------------------------------------------------
+    @classmethod
+    def for_user(cls, user):
+        """
+        Devuelve la fila del usuario. Si no existía (usuarios previos a las
+        estadísticas o admins) se construye una única vez con update_statistics.
+        """
+        stat, created = cls.objects.get_or_create(user=user)
+        if created:
+            stat.update_statistics()
+        stat.user = user
+        return stat
+
+    @classmethod
+    def _apply(cls, user, **changes):
+        """
+        Aplica un UPDATE atómico sobre la fila del usuario. Si la fila no existe
+        se reconstruye completa, lo que ya incluye el evento que se está aplicando.
+        """
+        if not cls.objects.filter(user=user).update(**changes):
+            cls.for_user(user)
+
+    @classmethod
+    def record_active_day(cls, user_id, day):
+        """
+        Suma un día que ActivityDay acaba de insertar. Si es posterior al
+        último día activo, la racha avanza (o vuelve a empezar) en un UPDATE.
+        Si llega fuera de orden puede unir rachas ya cerradas, así que racha y
+        racha máxima se recalculan desde el libro con la fila bloqueada.
+        """
+        from datetime import timedelta
+        from django.db import transaction
+        from django.db.models import Case, When, Value, F, Q
+        from django.db.models.functions import Greatest
+
+        streak = Case(
+            When(last_active_date=day - timedelta(days=1), then=F('current_streak_days') + 1),
+            default=Value(1),
+            output_field=models.IntegerField(),
+        )
+        newer = Q(last_active_date__lt=day) | Q(last_active_date__isnull=True)
+        if cls.objects.filter(newer, user_id=user_id).update(
+            current_streak_days=streak,
+            longest_streak_days=Greatest(F('longest_streak_days'), streak),
+            days_active=F('days_active') + 1,
+            last_active_date=day,
+        ):
+            return
+
+        with transaction.atomic():
+            # Sin fila no hay nada que sumar: el _apply del evento la construye
+            # completa desde el libro, ya con este día
+            if not cls.objects.select_for_update().filter(user_id=user_id).exists():
+                return
+            days = list(ActivityDay._days(user_id))
+            # Racha que termina en el último día activo, como la incremental
+            summary = ActivityDay.summarize(days, today=days[0])
+            cls.objects.filter(user_id=user_id).update(
+                current_streak_days=summary['current_streak'],
+                longest_streak_days=summary['longest_streak'],
+                days_active=summary['days_active'],
+                last_active_date=summary['last_active_date'],
+            )
+
+    @classmethod
+    def record_quiz_attempt(cls, attempt):
+        """Suma un intento calificado y actualiza el promedio acumulado."""
+        cls.record_quiz_attempts(attempt.user, [attempt])
+
+    @classmethod
+    def record_quiz_attempts(cls, user, attempts):
+        """
+        Suma varios intentos calificados en un solo UPDATE. Los días activos
+        los suma ActivityDay al registrar el día (record_active_day).
+        """
+        from django.db.models import F
+
+        if not attempts:
+            return
+        count = len(attempts)
+        cls._apply(
+            user,
+            total_quizzes_attempted=F('total_quizzes_attempted') + count,
+            total_quizzes_passed=F('total_quizzes_passed') + sum(1 for a in attempts if a.passed),
+            # En un UPDATE todas las F() leen el valor previo de la fila
+            average_quiz_score=(
+                F('average_quiz_score') * F('total_quizzes_attempted') + sum(float(a.score) for a in attempts)
+            ) / (F('total_quizzes_attempted') + count),
+        )
+
+    @classmethod
+    def record_course_started(cls, user):
+        from django.db.models import F
+        cls._apply(user, total_courses_started=F('total_courses_started') + 1)
+
+    @classmethod
+    def record_course_completed(cls, user):
+        from django.db.models import F
+        cls._apply(user, total_courses_completed=F('total_courses_completed') + 1)
+
+    @classmethod
+    def record_progress_change(cls, user, quizzes_delta, percentage_delta):
+        """Aplica la diferencia de una o varias filas de Progress del usuario."""
+        from django.db.models import F
+
+        if not quizzes_delta and not percentage_delta:
+            return
+        cls._apply(
+            user,
+            total_quizzes_completed=F('total_quizzes_completed') + quizzes_delta,
+            course_progress_sum=F('course_progress_sum') + percentage_delta,
+        )
+
+    @classmethod
+    def record_xp(cls, xp_event):
+        """Suma la XP de un registro de XpHistory."""
+        cls.record_xp_events(xp_event.user, [xp_event])
+
+    @classmethod
+    def record_xp_events(cls, user, xp_events):
+        """Como record_xp, para varios registros en un solo UPDATE."""
+        from django.db.models import F
+
+        if not xp_events:
+            return
+        cls._apply(user, total_xp_earned=F('total_xp_earned') + sum(e.xp_gained for e in xp_events))
+
+    # ------------------------------------------------------------------
+    # Recalculo completo (solo para reparación: repair_user_statistics)
+    # ------------------------------------------------------------------
     def update_statistics(self):
-        """Actualiza todas las estadísticas del usuario."""
+        """Recalcula todas las estadísticas del usuario desde cero."""
         from apps.quizzes.models import QuizAttempt
         from apps.courses.models import Enrollment
-        from apps.progress.models import Progress
-        from django.utils import timezone
-        from datetime import date
         
         # Estadísticas de quizzes
         quiz_stats = QuizAttempt.objects.filter(user=self.user).aggregate(
@@ -132,10 +950,19 @@ class UserStatistic(models.Model):
         
         self.total_courses_started = course_stats['total_courses'] or 0
         self.total_courses_completed = course_stats['completed_courses'] or 0
+
+        # Progreso por curso (mantenido por Progress)
+        from apps.progress.models import Progress
+        progress_stats = Progress.objects.filter(user=self.user).aggregate(
+            quizzes=models.Sum('completed_quizzes'),
+            percentage=models.Sum('percentage')
+        )
+        self.total_quizzes_completed = progress_stats['quizzes'] or 0
+        self.course_progress_sum = progress_stats['percentage'] or 0.0
         
-        # XP total
-        xp_total = XpHistory.objects.filter(user=self.user).aggregate(
-            total=models.Sum('xp_gained')
+        # XP total (los acumulados diarios conservan también los meses archivados)
+        xp_total = XpDailyRollup.objects.filter(user=self.user).aggregate(
+            total=models.Sum('xp')
         )['total'] or 0
         self.total_xp_earned = xp_total
         
@@ -144,49 +971,88 @@ class UserStatistic(models.Model):
         
         self.save()
 
+    @classmethod
+    def bulk_rebuild(cls, user_ids):
+        """
+        Equivalente a update_statistics() para varios usuarios: una consulta
+        agrupada por tabla y escritura con bulk_create/bulk_update.
+        """
+        from django.db.models import Avg, Count, Q, Sum
+        from apps.quizzes.models import QuizAttempt
+        from apps.courses.models import Enrollment
+        from apps.progress.models import Progress
+
+        def grouped(queryset, **aggregates):
+            return {
+                row.pop('user_id'): row
+                for row in queryset.filter(user_id__in=user_ids).values('user_id').annotate(**aggregates).order_by()
+            }
+
+        quizzes = grouped(
+            QuizAttempt.objects.all(),
+            attempts=Count('id'),
+            passed=Count('id', filter=Q(passed=True)),
+            average=Avg('score')
+        )
+        courses = grouped(
+            Enrollment.objects.all(),
+            started=Count('id'),
+            completed=Count('id', filter=Q(course_completed=True))
+        )
+        xp = grouped(XpDailyRollup.objects.all(), total=Sum('xp'))
+        progress = grouped(
+            Progress.objects.all(),
+            quizzes=Sum('completed_quizzes'),
+            percentage=Sum('percentage')
+        )
+
+        days = {}
+        activity = ActivityDay.objects.filter(
+            user_id__in=user_ids,
+            course__isnull=True
+        ).order_by('user_id', '-day').values_list('user_id', 'day')
+        for user_id, day in activity.iterator(chunk_size=5000):
+            days.setdefault(user_id, []).append(day)
+
+        existing = {stat.user_id: stat for stat in cls.objects.filter(user_id__in=user_ids)}
+        to_create, to_update = [], []
+        for user_id in user_ids:
+            stat = existing.get(user_id) or cls(user_id=user_id)
+            quiz = quizzes.get(user_id, {})
+            course = courses.get(user_id, {})
+            summary = ActivityDay.summarize(days.get(user_id, []))
+
+            stat.total_quizzes_attempted = quiz.get('attempts', 0)
+            stat.total_quizzes_passed = quiz.get('passed', 0)
+            stat.average_quiz_score = quiz.get('average') or 0.0
+            stat.total_courses_started = course.get('started', 0)
+            stat.total_courses_completed = course.get('completed', 0)
+            stat.total_quizzes_completed = progress.get(user_id, {}).get('quizzes') or 0
+            stat.course_progress_sum = progress.get(user_id, {}).get('percentage') or 0.0
+            stat.total_xp_earned = xp.get(user_id, {}).get('total') or 0
+            stat.current_streak_days = summary['current_streak']
+            stat.longest_streak_days = summary['longest_streak']
+            stat.days_active = summary['days_active']
+            stat.last_active_date = summary['last_active_date']
+            (to_update if stat.pk else to_create).append(stat)
+
+        cls.objects.bulk_create(to_create, batch_size=500)
+        cls.objects.bulk_update(
+            to_update,
+            ['total_quizzes_attempted', 'total_quizzes_passed', 'average_quiz_score',
+             'total_courses_started', 'total_courses_completed', 'total_quizzes_completed',
+             'course_progress_sum', 'total_xp_earned', 'current_streak_days',
+             'longest_streak_days', 'days_active', 'last_active_date'],
+            batch_size=500
+        )
+
     def _update_streak_and_activity(self):
-        """Actualiza la racha y días activos del usuario."""
-        from django.utils import timezone
-        from datetime import timedelta
-        
-        today = timezone.now().date()
-        
-        # Obtener la última fecha de actividad (de quizzes o XP ganado)
-        last_quiz = self.user.quiz_attempts.order_by('-completed_at').first()
-        last_xp = self.user.xp_history.order_by('-created_at').first()
-        
-        last_activity = None
-        if last_quiz and last_xp:
-            last_activity = max(last_quiz.completed_at.date(), last_xp.created_at.date())
-        elif last_quiz:
-            last_activity = last_quiz.completed_at.date()
-        elif last_xp:
-            last_activity = last_xp.created_at.date()
-        
-        if last_activity:
-            self.last_active_date = last_activity
-            
-            # Calcular racha actual
-            if last_activity == today:
-                # El usuario estuvo activo hoy
-                if self.last_active_date and (today - self.last_active_date).days == 1:
-                    self.current_streak_days += 1
-                else:
-                    self.current_streak_days = 1
-                
-                # Actualizar racha más larga
-                if self.current_streak_days > self.longest_streak_days:
-                    self.longest_streak_days = self.current_streak_days
-            else:
-                # Rompió la racha
-                self.current_streak_days = 0
-        
-        # Calcular días activos totales (días distintos con actividad)
-        distinct_days = XpHistory.objects.filter(
-            user=self.user
-        ).dates('created_at', 'day').distinct().count()
-        
-        self.days_active = distinct_days
+        """Recalcula racha, racha máxima y días activos desde el libro ActivityDay."""
+        summary = ActivityDay.summary(self.user)
+        self.current_streak_days = summary['current_streak']
+        self.longest_streak_days = summary['longest_streak']
+        self.days_active = summary['days_active']
+        self.last_active_date = summary['last_active_date']
 
 
 class PlatformStatistic(models.Model):
@@ -221,60 +1087,572 @@ class PlatformStatistic(models.Model):
     def __str__(self):
         return f"Estadísticas de plataforma - {self.date}"
 
+    METRIC_FIELDS = [
+        'total_users', 'new_users_today', 'active_users_today',
+        'total_quizzes_taken', 'total_xp_gained',
+        'total_courses_started', 'total_courses_completed',
+        'average_user_level',
+    ]
+
     @classmethod
     def update_daily_statistics(cls):
-        """Actualiza las estadísticas diarias de la plataforma."""
+        """Actualiza las estadísticas del día de hoy."""
+        from django.utils import timezone
+
+        today = timezone.localdate()
+        cls.build_range(today, today)
+        return cls.objects.get(date=today)
+
+    @classmethod
+    def build_range(cls, start, end):
+        """
+        (Re)construye las filas de `start` a `end` (fechas locales incluidas)
+        con una consulta agrupada por día y por tabla, y las guarda con un
+        upsert. Es idempotente: repetir un rango deja las mismas filas.
+        """
+        from datetime import datetime, time, timedelta
+        from django.db.models import Avg, Count, Sum
+        from django.db.models.functions import TruncDate
         from django.utils import timezone
-        from django.db.models import Count, Avg, Sum
         from apps.users.models import User
         from apps.quizzes.models import QuizAttempt
         from apps.courses.models import Enrollment
-        
-        today = timezone.now().date()
-        
-        # Obtener o crear estadísticas para hoy
-        stats, created = cls.objects.get_or_create(date=today)
-        
-        # Usuarios
-        stats.total_users = User.objects.filter(is_active=True, role='user').count()
-        stats.new_users_today = User.objects.filter(
-            date_joined__date=today,
-            is_active=True,
-            role='user'
-        ).count()
-        
-        # Usuarios activos hoy (con actividad de quiz o XP)
-        active_users = User.objects.filter(
-            models.Q(quiz_attempts__completed_at__date=today) |
-            models.Q(xp_history__created_at__date=today),
-            is_active=True,
-            role='user'
-        ).distinct().count()
-        stats.active_users_today = active_users
-        
-        # Actividad de hoy
-        stats.total_quizzes_taken = QuizAttempt.objects.filter(
-            completed_at__date=today
-        ).count()
-        
-        stats.total_xp_gained = XpHistory.objects.filter(
-            created_at__date=today
-        ).aggregate(total=Sum('xp_gained'))['total'] or 0
-        
-        stats.total_courses_started = Enrollment.objects.filter(
-            enrolled_at__date=today
-        ).count()
-        
-        stats.total_courses_completed = Enrollment.objects.filter(
-            completed_at__date=today
-        ).count()
-        
-        # Métricas promedio
-        user_levels = User.objects.filter(
-            is_active=True, 
-            role='user'
-        ).aggregate(avg_level=Avg('level'))
-        stats.average_user_level = user_levels['avg_level'] or 1.0
-        
-        stats.save()
-        return stats
\ No newline at end of file
+
+        local_tz = timezone.get_default_timezone()
+        start_at = timezone.make_aware(datetime.combine(start, time.min))
+        end_at = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min))
+
+        def per_day(queryset, field, value=Count('id')):
+            return dict(
+                queryset.filter(**{f'{field}__gte': start_at, f'{field}__lt': end_at})
+                .annotate(day=TruncDate(field, tzinfo=local_tz))
+                .values('day')
+                .annotate(value=value)
+                .order_by()
+                .values_list('day', 'value')
+            )
+
+        students = User.objects.filter(is_active=True, role='user')
+        users_before = students.filter(date_joined__lt=start_at).count()
+        new_users = per_day(students, 'date_joined')
+        quizzes = per_day(QuizAttempt.objects.all(), 'completed_at')
+        started = per_day(Enrollment.objects.all(), 'enrolled_at')
+        completed = per_day(Enrollment.objects.all(), 'completed_at')
+
+        # Días ya agregados por los acumulados/libro diarios: GROUP BY directo
+        day_range = {'day__gte': start, 'day__lte': end}
+        xp = dict(
+            XpDailyRollup.objects.filter(**day_range)
+            .values('day').annotate(value=Sum('xp')).order_by()
+            .values_list('day', 'value')
+        )
+        active = dict(
+            ActivityDay.objects.filter(
+                course__isnull=True,
+                user__is_active=True,
+                user__role='user',
+                **day_range
+            ).values('day').annotate(value=Count('id')).order_by()
+            .values_list('day', 'value')
+        )
+
+        # El nivel medio es una foto del momento: solo se recalcula para hoy
+        today = timezone.localdate()
+        levels = dict(cls.objects.filter(date__gte=start, date__lte=end).values_list('date', 'average_user_level'))
+        if start <= today <= end:
+            levels[today] = students.aggregate(avg=Avg('level'))['avg'] or 1.0
+
+        rows = []
+        total_users = users_before
+        day = start
+        while day <= end:
+            total_users += new_users.get(day, 0)
+            rows.append(cls(
+                date=day,
+                total_users=total_users,
+                new_users_today=new_users.get(day, 0),
+                active_users_today=active.get(day, 0),
+                total_quizzes_taken=quizzes.get(day, 0),
+                total_xp_gained=max(xp.get(day, 0) or 0, 0),
+                total_courses_started=started.get(day, 0),
+                total_courses_completed=completed.get(day, 0),
+                average_user_level=levels.get(day, 1.0),
+            ))
+            day += timedelta(days=1)
+
+        cls.objects.bulk_create(
+            rows,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['date'],
+            update_fields=cls.METRIC_FIELDS + ['updated_at'],
+        )
+        return len(rows)
+
+
+class LeaderboardEntry(models.Model):
+    """
+    Valores de un estudiante en cada tabla de clasificación.
+
+    La posición no se guarda: se calcula al leer con el orden indexado
+    (metric, -value, -xp, user). Así actualizar a un estudiante solo toca sus
+    propias filas y dos actualizaciones simultáneas no pueden dejar posiciones
+    repetidas o saltadas.
+    """
+
+    METRIC_CHOICES = [
+        ('xp', 'XP'),
+        ('level', 'Nivel'),
+        ('courses', 'Cursos completados'),
+        ('quizzes', 'Quizzes aprobados'),
+        ('streak', 'Racha'),
+    ]
+    METRICS = [metric for metric, _ in METRIC_CHOICES]
+
+    # Columna de la que sale `value` en cada métrica
+    METRIC_FIELDS = {
+        'xp': 'xp',
+        'level': 'level',
+        'courses': 'courses_completed',
+        'quizzes': 'quizzes_passed',
+        'streak': 'streak_days',
+    }
+
+    # Orden de la tabla (desempate: xp y luego id de usuario)
+    RANK_ORDER = ['-value', '-xp', 'user_id']
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="leaderboard_entries"
+    )
+    metric = models.CharField(max_length=10, choices=METRIC_CHOICES)
+
+    # Valor que define el orden
+    value = models.PositiveIntegerField(default=0)
+
+    # Datos del estudiante copiados al momento de actualizar la entrada
+    xp = models.PositiveIntegerField(default=0)
+    level = models.PositiveIntegerField(default=1)
+    courses_completed = models.PositiveIntegerField(default=0)
+    quizzes_passed = models.PositiveIntegerField(default=0)
+    streak_days = models.PositiveIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["metric", "-value", "-xp", "user_id"]
+        unique_together = ("metric", "user")
+        verbose_name_plural = "Leaderboard Entries"
+        indexes = [
+            models.Index(
+                fields=['metric', '-value', '-xp', 'user'],
+                name='stats_leaderboard_rank_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user.email} ({self.metric}: {self.value})"
+
+    @staticmethod
+    def _ahead_of(value, xp, user_id):
+        """Filtro de las filas que quedan por delante de la clave (value, xp, user_id)."""
+        return (
+            models.Q(value__gt=value) |
+            models.Q(value=value, xp__gt=xp) |
+            models.Q(value=value, xp=xp, user_id__lt=user_id)
+        )
+
+    @staticmethod
+    def is_ranked(user):
+        return user.is_active and user.role == 'user'
+
+    @classmethod
+    def snapshot_for(cls, user):
+        """Calcula los valores de todas las métricas para un estudiante."""
+        from apps.progress.models import Progress
+        from apps.quizzes.models import QuizAttempt
+
+        progress_stats = Progress.objects.filter(user=user).aggregate(
+            courses=models.Count('id', filter=models.Q(course_completed=True)),
+            streak=models.Max('streak_days')
+        )
+        quizzes_passed = QuizAttempt.objects.filter(
+            user=user,
+            passed=True
+        ).values('quiz').distinct().count()
+
+        return {
+            'xp': user.xp,
+            'level': user.level,
+            'courses_completed': progress_stats['courses'] or 0,
+            'quizzes_passed': quizzes_passed,
+            'streak_days': progress_stats['streak'] or 0,
+        }
+
+    @classmethod
+    def metric_value(cls, metric, snapshot):
+        return {
+            'xp': snapshot['xp'],
+            'level': snapshot['level'],
+            'courses': snapshot['courses_completed'],
+            'quizzes': snapshot['quizzes_passed'],
+            'streak': snapshot['streak_days'],
+        }[metric]
+
+    @classmethod
+    def refresh_for_user(cls, user):
+        """
+        Recalcula todas las métricas del usuario desde sus valores actuales.
+        Es el camino completo, para cambios del propio usuario (rol, estado,
+        XP editada a mano) o si aún no tiene filas; los eventos de XP, quizzes
+        y progreso solo tocan su métrica (record_xp, record_quizzes_passed,
+        record_progress).
+
+        Las filas del usuario se bloquean antes de leer sus valores, de modo
+        que dos actualizaciones simultáneas se aplican en orden. Si nada
+        cambió no escribe; si cambió, un solo UPDATE cubre las cinco métricas.
+        """
+        from django.db import transaction
+        from django.utils import timezone
+        from apps.users.models import User
+
+        if not cls.is_ranked(user):
+            cls.remove_user(user)
+            return
+
+        with transaction.atomic():
+            entries = {
+                entry.metric: entry
+                for entry in cls.objects.select_for_update().filter(user=user).order_by()
+            }
+            # XP y nivel de la base de datos: la instancia puede venir de antes de add_xp
+            current = User.objects.filter(pk=user.pk).values('xp', 'level').first()
+            if current is None:
+                return
+            snapshot = cls.snapshot_for(User(pk=user.pk, **current))
+
+            stale = [
+                metric for metric, entry in entries.items()
+                if entry.value != cls.metric_value(metric, snapshot) or any(
+                    getattr(entry, field) != value for field, value in snapshot.items()
+                )
+            ]
+            if stale:
+                cls.objects.filter(user=user, metric__in=stale).update(
+                    value=models.Case(
+                        *[
+                            models.When(metric=metric, then=models.Value(cls.metric_value(metric, snapshot)))
+                            for metric in stale
+                        ],
+                        output_field=models.PositiveIntegerField()
+                    ),
+                    updated_at=timezone.now(),
+                    **snapshot
+                )
+
+            missing = [metric for metric in cls.METRICS if metric not in entries]
+            if missing:
+                cls.objects.bulk_create(
+                    [
+                        cls(user=user, metric=metric, value=cls.metric_value(metric, snapshot), **snapshot)
+                        for metric in missing
+                    ],
+                    ignore_conflicts=True
+                )
+
+    @classmethod
+    def _update_fields(cls, user, **changes):
+        """
+        Aplica `changes` (campo: valor o expresión) a las filas del usuario
+        con un UPDATE, sin bloquear ni releer nada: en las métricas de esos
+        campos `value` toma el mismo valor. Si el usuario aún no tiene filas
+        se crean completas con refresh_for_user.
+        """
+        from django.utils import timezone
+
+        if not cls.is_ranked(user):
+            return
+        value = models.Case(
+            *[
+                models.When(metric=metric, then=changes[field])
+                for metric, field in cls.METRIC_FIELDS.items() if field in changes
+            ],
+            default=models.F('value'),
+            output_field=models.PositiveIntegerField()
+        )
+        if not cls.objects.filter(user=user).update(value=value, updated_at=timezone.now(), **changes):
+            cls.refresh_for_user(user)
+
+    @classmethod
+    def record_xp(cls, user, xp, level):
+        """
+        XP y nivel devueltos por el UPDATE de User.add_xp. Solo crecen, así
+        que Greatest evita que una ganancia que confirma tarde pise a otra.
+        """
+        from django.db.models.functions import Greatest
+
+        cls._update_fields(
+            user,
+            xp=Greatest(models.F('xp'), models.Value(xp)),
+            level=Greatest(models.F('level'), models.Value(level)),
+        )
+
+    @classmethod
+    def record_quizzes_passed(cls, user, delta):
+        """Suma `delta` quizzes aprobados (un intento por usuario y quiz)."""
+        if delta:
+            cls._update_fields(user, quizzes_passed=models.F('quizzes_passed') + delta)
+
+    @classmethod
+    def record_progress(cls, user, courses_delta=0, streak_days=None, streak_grew=True):
+        """
+        Aplica el cambio de un Progress: `courses_delta` cursos completados y
+        su nueva racha. Si la racha creció basta con quedarse con la mayor; si
+        bajó, la máxima del usuario se recalcula dentro del mismo UPDATE.
+        """
+        from django.db.models.functions import Coalesce, Greatest
+        from apps.progress.models import Progress
+
+        changes = {}
+        if courses_delta:
+            changes['courses_completed'] = models.F('courses_completed') + courses_delta
+        if streak_days is not None and streak_grew:
+            changes['streak_days'] = Greatest(models.F('streak_days'), models.Value(streak_days))
+        elif streak_days is not None:
+            longest = Progress.objects.filter(user=user).order_by().values('user').annotate(
+                longest=models.Max('streak_days')
+            ).values('longest')
+            changes['streak_days'] = Coalesce(models.Subquery(longest), 0)
+        if changes:
+            cls._update_fields(user, **changes)
+
+    @classmethod
+    def remove_user(cls, user):
+        cls.objects.filter(user=user).delete()
+
+    @classmethod
+    def rank_of(cls, entry):
+        """Posición de una entrada: 1 + filas por delante (cuenta sobre el índice)."""
+        return cls.objects.filter(metric=entry.metric).filter(
+            cls._ahead_of(entry.value, entry.xp, entry.user_id)
+        ).count() + 1
+
+    @classmethod
+    def rebuild(cls):
+        """Recalcula todas las entradas desde cero (comando rebuild_leaderboard)."""
+        from django.db import transaction
+        from apps.users.models import User
+
+        students = User.objects.filter(is_active=True, role='user').annotate(
+            courses_completed=models.Count(
+                'progress_records',
+                filter=models.Q(progress_records__course_completed=True),
+                distinct=True
+            ),
+            quizzes_passed=models.Count(
+                'quiz_attempts__quiz',
+                filter=models.Q(quiz_attempts__passed=True),
+                distinct=True
+            ),
+            streak_days=models.Max('progress_records__streak_days'),
+        ).values('id', 'xp', 'level', 'courses_completed', 'quizzes_passed', 'streak_days')
+
+        snapshots = [
+            {
+                'user_id': row['id'],
+                'xp': row['xp'],
+                'level': row['level'],
+                'courses_completed': row['courses_completed'],
+                'quizzes_passed': row['quizzes_passed'],
+                'streak_days': row['streak_days'] or 0,
+            }
+            for row in students
+        ]
+
+        entries = [
+            cls(metric=metric, value=cls.metric_value(metric, snapshot), **snapshot)
+            for metric in cls.METRICS
+            for snapshot in snapshots
+        ]
+
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(entries, batch_size=1000)
+        return len(snapshots)
+
+    @classmethod
+    def top(cls, metric, limit, since=None):
+        """
+        Devuelve las primeras posiciones de una métrica en una sola consulta,
+        con `rank` asignado en cada entrada. Con `since` solo incluye
+        estudiantes con quizzes desde esa fecha (y numera dentro de ese grupo).
+        """
+        from apps.quizzes.models import QuizAttempt
+
+        if metric not in cls.METRICS:
+            metric = 'xp'
+
+        entries = cls.objects.filter(metric=metric)
+        if since:
+            entries = entries.filter(
+                user_id__in=QuizAttempt.objects.filter(
+                    completed_at__gte=since
+                ).values('user_id')
+            )
+        entries = list(entries.select_related('user').order_by(*cls.RANK_ORDER)[:limit])
+        for rank, entry in enumerate(entries, 1):
+            entry.rank = rank
+        return entries
+
+
+class XpRankNode(models.Model):
+    """
+    Nodo de un árbol de Fenwick sobre el histograma de XP de los estudiantes.
+    Cada nodo guarda cuántos estudiantes activos caen en su rango de XP, de
+    modo que el ranking y el percentil se responden leyendo O(log n) nodos.
+    """
+
+    # Capacidad del árbol (potencia de 2). Desde SIZE - 1 XP todos caen en el último cubo.
+    SIZE = 1 << 16
+
+    index = models.PositiveIntegerField(primary_key=True)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ["index"]
+
+    def __str__(self):
+        return f"Nodo {self.index}: {self.count}"
+
+    @classmethod
+    def _position(cls, xp):
+        return min(xp, cls.SIZE - 1) + 1
+
+    @classmethod
+    def _update_path(cls, position):
+        nodes = []
+        while position <= cls.SIZE:
+            nodes.append(position)
+            position += position & -position
+        return nodes
+
+    @classmethod
+    def _prefix_path(cls, position):
+        nodes = []
+        while position > 0:
+            nodes.append(position)
+            position -= position & -position
+        return nodes
+
+    @classmethod
+    def _apply(cls, added=None, removed=None):
+        """Suma 1 en el cubo de `added` y resta 1 en el de `removed` con un solo UPDATE."""
+        plus = set(cls._update_path(cls._position(added))) if added is not None else set()
+        minus = set(cls._update_path(cls._position(removed))) if removed is not None else set()
+        plus, minus = plus - minus, minus - plus
+        if not plus and not minus:
+            return
+
+        cls.objects.filter(index__in=plus | minus).update(
+            count=models.F('count') + models.Case(
+                models.When(index__in=plus, then=models.Value(1)),
+                default=models.Value(-1),
+                output_field=models.IntegerField()
+            )
+        )
+
+    @classmethod
+    def add(cls, xp):
+        cls._apply(added=xp)
+
+    @classmethod
+    def remove(cls, xp):
+        cls._apply(removed=xp)
+
+    @classmethod
+    def move(cls, old_xp, new_xp):
+        if cls._position(old_xp) != cls._position(new_xp):
+            cls._apply(added=new_xp, removed=old_xp)
+
+    @classmethod
+    def sync_user(cls, user, previous_xp):
+        """
+        Ajusta el índice tras un cambio de rol, estado o XP fuera de add_xp.
+        `previous_xp` es la XP con la que el usuario figuraba (None si no figuraba).
+        """
+        is_ranked = user.is_active and user.role == 'user'
+        if previous_xp is not None and is_ranked:
+            cls.move(previous_xp, user.xp)
+        elif previous_xp is not None:
+            cls.remove(previous_xp)
+        elif is_ranked:
+            cls.add(user.xp)
+
+    @classmethod
+    def _read(cls, *positions):
+        nodes = set()
+        for position in positions:
+            nodes.update(cls._prefix_path(position))
+        counts = dict(cls.objects.filter(index__in=nodes).values_list('index', 'count'))
+        return [
+            sum(counts.get(node, 0) for node in cls._prefix_path(position))
+            for position in positions
+        ]
+
+    @classmethod
+    def rank_for(cls, xp):
+        """Posición de quien tiene `xp`: 1 + estudiantes activos con más XP."""
+        position = cls._position(xp)
+        at_or_below, total = cls._read(position, cls.SIZE)
+        ahead = total - at_or_below
+
+        if position == cls.SIZE:
+            # En el último cubo el árbol no distingue valores: se cuentan exactamente
+            from apps.users.models import User
+            ahead += User.objects.filter(xp__gt=xp, is_active=True, role='user').count()
+
+        return ahead + 1
+
+    @classmethod
+    def percentile_for(cls, xp):
+        """Porcentaje de estudiantes activos con menos XP que `xp`."""
+        position = cls._position(xp)
+        below, total = cls._read(position - 1, cls.SIZE)
+        if total == 0:
+            return 0.0
+
+        if position == cls.SIZE:
+            # Como en rank_for: dentro del último cubo se cuenta exactamente
+            from apps.users.models import User
+            below += User.objects.filter(
+                xp__gte=cls.SIZE - 1, xp__lt=xp, is_active=True, role='user'
+            ).count()
+        return below / total * 100
+
+    @classmethod
+    def rebuild(cls):
+        """Reconstruye el árbol completo a partir del histograma de XP."""
+        from django.db import transaction
+        from apps.users.models import User
+
+        tree = [0] * (cls.SIZE + 1)
+        histogram = User.objects.filter(is_active=True, role='user').values('xp').annotate(
+            total=models.Count('id')
+        )
+        for row in histogram:
+            tree[cls._position(row['xp'])] += row['total']
+
+        # Construcción en O(n): cada nodo aporta su suma a su padre
+        for index in range(1, cls.SIZE + 1):
+            parent = index + (index & -index)
+            if parent <= cls.SIZE:
+                tree[parent] += tree[index]
+
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(
+                [cls(index=index, count=tree[index]) for index in range(1, cls.SIZE + 1)],
+                batch_size=5000
+            )
+        return tree[cls.SIZE]
@@ -0,0 +1,112 @@
+"""
+Particionado mensual de XpHistory (solo PostgreSQL).
+
+La tabla stats_xphistory se particiona por RANGE(created_at) en meses
+locales (TIME_ZONE): stats_xphistory_pAAAA_MM, más una partición DEFAULT
+que recoge filas fuera de rango. En otros motores la tabla es normal y
+estas funciones no hacen nada.
+"""
+from datetime import date, datetime, time
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+TABLE = "stats_xphistory"
+DEFAULT_PARTITION = f"{TABLE}_default"
+
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_bounds(month):
+    """Límites [inicio, fin) del mes como datetimes con zona horaria local."""
+    start = timezone.make_aware(datetime.combine(month, time.min))
+    end = timezone.make_aware(datetime.combine(add_months(month, 1), time.min))
+    return start, end
+
+
+def partition_name(month):
+    return f"{TABLE}_p{month.year:04d}_{month.month:02d}"
+
+
+def is_partitioned():
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = %s",
+            [TABLE],
+        )
+        return cursor.fetchone() is not None
+
+
+def partition_months():
+    """Meses que tienen partición propia, del más antiguo al más reciente."""
+    if not is_partitioned():
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits i "
+            "JOIN pg_class parent ON parent.oid = i.inhparent "
+            "JOIN pg_class child ON child.oid = i.inhrelid "
+            "WHERE parent.relname = %s",
+            [TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    prefix = f"{TABLE}_p"
+    return sorted(
+        date(int(name[len(prefix):len(prefix) + 4]), int(name[-2:]), 1)
+        for name in names
+        if name.startswith(prefix)
+    )
+
+
+def ensure_partition(month):
+    """
+    Crea la partición del mes si no existe. Si la partición DEFAULT ya tiene
+    filas de ese mes, se mueven a la nueva partición en la misma transacción.
+    """
+    if not is_partitioned() or month in partition_months():
+        return False
+
+    start, end = month_bounds(month)
+    # DDL sin parámetros: los límites son fechas generadas aquí, no entrada externa
+    create_sql = (
+        f"CREATE TABLE {partition_name(month)} PARTITION OF {TABLE} "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} "
+            f"WHERE created_at >= %s AND created_at < %s)",
+            [start, end],
+        )
+        if cursor.fetchone()[0]:
+            cursor.execute(f"ALTER TABLE {TABLE} DETACH PARTITION {DEFAULT_PARTITION}")
+            cursor.execute(create_sql)
+            cursor.execute(
+                f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+                f"WHERE created_at >= %s AND created_at < %s RETURNING *) "
+                f"INSERT INTO {TABLE} SELECT * FROM moved",
+                [start, end],
+            )
+            cursor.execute(f"ALTER TABLE {TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT")
+        else:
+            cursor.execute(create_sql)
+    return True
+
+
+def drop_partition(month):
+    """Separa y elimina la partición del mes (sus filas ya deben estar archivadas)."""
+    name = partition_name(month)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {TABLE} DETACH PARTITION {name}")
+        cursor.execute(f"DROP TABLE {name}")
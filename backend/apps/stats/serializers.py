@@ -27,6 +27,7 @@ class UserStatisticSerializer(serializers.ModelSerializer):
     user_level = serializers.IntegerField(source='user.level', read_only=True)
     quiz_success_rate = serializers.ReadOnlyField()
     course_completion_rate = serializers.ReadOnlyField()
+    current_streak_days = serializers.IntegerField(source='active_streak_days', read_only=True)
 
     class Meta:
         model = UserStatistic
@@ -67,6 +68,7 @@ class UserStatsOverviewSerializer(serializers.Serializer):
     success_rate = serializers.FloatField()
     current_streak = serializers.IntegerField()
     rank = serializers.IntegerField()
+    percentile = serializers.FloatField()
 
 
 class LeaderboardEntrySerializer(serializers.Serializer):
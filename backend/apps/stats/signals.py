@@ -1,11 +1,152 @@
-from django.db.models.signals import post_save
-from django.dispatch import receiver
-from .models import UserStatistic
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver, Signal
+from .models import UserStatistic, XpHistory, XpDailyRollup, ActivityDay, LeaderboardEntry, XpRankNode
 from apps.users.models import User
+from apps.courses.models import Enrollment
+from apps.courses.signals import course_completed_signal
+from apps.progress.models import Progress
+from apps.quizzes.models import QuizAttempt
+from apps.quizzes.signals import quiz_evaluated_signal, quiz_batch_evaluated_signal
+
+# XpHistory creado con bulk_create (User.add_xp_bulk), que no emite post_save.
+# kwargs: user, events (filas ya guardadas) y old_xp (XP previa del usuario)
+xp_history_bulk_created = Signal()
 
 
 @receiver(post_save, sender=User)
 def create_user_statistics(sender, instance, created, **kwargs):
     """Crea estadísticas cuando se crea un nuevo usuario."""
     if created and instance.role == 'user':
-        UserStatistic.objects.get_or_create(user=instance)
\ No newline at end of file
+        UserStatistic.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=XpHistory)
+def update_xp_daily_rollup(sender, instance, created, **kwargs):
+    """Mantiene el acumulado diario de XP al registrar cada evento."""
+    if created:
+        XpDailyRollup.record(instance)
+
+
+@receiver(xp_history_bulk_created)
+def update_xp_daily_rollup_bulk(sender, events, **kwargs):
+    XpDailyRollup.record_many(events)
+
+
+# ---------- Libro de días activos ----------
+
+@receiver(post_save, sender=XpHistory)
+def record_activity_on_xp(sender, instance, created, **kwargs):
+    if created:
+        ActivityDay.record(instance.user_id, instance.created_at, instance.related_course_id)
+
+
+@receiver(xp_history_bulk_created)
+def record_activity_on_xp_bulk(sender, user, events, **kwargs):
+    ActivityDay.record_many(
+        user.pk,
+        max(event.created_at for event in events),
+        [event.related_course_id for event in events]
+    )
+
+
+# ---------- Estadísticas del usuario (incrementales) ----------
+
+@receiver(post_save, sender=XpHistory)
+def update_user_statistics_on_xp(sender, instance, created, **kwargs):
+    if created:
+        UserStatistic.record_xp(instance)
+
+
+@receiver(xp_history_bulk_created)
+def update_user_statistics_on_xp_bulk(sender, user, events, **kwargs):
+    UserStatistic.record_xp_events(user, events)
+
+
+@receiver(quiz_evaluated_signal)
+def update_user_statistics_on_quiz(sender, attempt, **kwargs):
+    UserStatistic.record_quiz_attempt(attempt)
+
+
+@receiver(quiz_batch_evaluated_signal)
+def update_user_statistics_on_quiz_batch(sender, user, attempts, **kwargs):
+    UserStatistic.record_quiz_attempts(user, attempts)
+
+
+@receiver(post_save, sender=Enrollment)
+def update_user_statistics_on_enrollment(sender, instance, created, **kwargs):
+    if created:
+        UserStatistic.record_course_started(instance.user)
+
+
+@receiver(course_completed_signal)
+def update_user_statistics_on_completion(sender, enrollment, **kwargs):
+    UserStatistic.record_course_completed(enrollment.user)
+
+
+# ---------- Leaderboard ----------
+
+@receiver(post_save, sender=User)
+def sync_rankings_on_user_change(sender, instance, created, **kwargs):
+    """
+    Incluye o retira al usuario del leaderboard y del índice de ranking
+    cuando cambia su rol o estado (o se edita su XP fuera de add_xp).
+    """
+    if created or instance.has_changed('role', 'is_active', 'xp'):
+        # La entrada de XP guarda con qué XP figuraba el usuario en el índice
+        previous_xp = LeaderboardEntry.objects.filter(
+            user=instance,
+            metric='xp'
+        ).values_list('xp', flat=True).first()
+
+        XpRankNode.sync_user(instance, previous_xp)
+        LeaderboardEntry.refresh_for_user(instance)
+
+
+@receiver(pre_delete, sender=User)
+def remove_user_from_rankings(sender, instance, **kwargs):
+    previous_xp = LeaderboardEntry.objects.filter(
+        user=instance,
+        metric='xp'
+    ).values_list('xp', flat=True).first()
+    if previous_xp is not None:
+        XpRankNode.remove(previous_xp)
+
+    LeaderboardEntry.remove_user(instance)
+
+
+# La XP y el nivel los actualiza User._increment_xp con los valores de su UPDATE
+
+
+@receiver(quiz_evaluated_signal)
+def update_leaderboard_on_quiz(sender, attempt, **kwargs):
+    if attempt.passed:
+        LeaderboardEntry.record_quizzes_passed(attempt.user, 1)
+
+
+@receiver(quiz_batch_evaluated_signal)
+def update_leaderboard_on_quiz_batch(sender, user, attempts, **kwargs):
+    LeaderboardEntry.record_quizzes_passed(user, sum(1 for attempt in attempts if attempt.passed))
+
+
+@receiver(post_delete, sender=QuizAttempt)
+def update_leaderboard_on_attempt_delete(sender, instance, **kwargs):
+    if instance.passed:
+        LeaderboardEntry.record_quizzes_passed(instance.user, -1)
+
+
+@receiver(post_save, sender=Progress)
+def update_leaderboard_on_progress(sender, instance, created, **kwargs):
+    """Aplica la diferencia de cursos completados y la nueva racha del curso."""
+    # Un Progress recién creado parte de cero: no mueve ninguna métrica
+    if created or not instance.has_changed():
+        return
+    changed = instance.changed_fields()
+    previous_streak = instance.previous_value('streak_days')
+    LeaderboardEntry.record_progress(
+        instance.user,
+        courses_delta=(
+            (1 if instance.course_completed else -1) if 'course_completed' in changed else 0
+        ),
+        streak_days=instance.streak_days if 'streak_days' in changed else None,
+        streak_grew=previous_streak is None or instance.streak_days > previous_streak,
+    )
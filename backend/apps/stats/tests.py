@@ -1,3 +1,821 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+import os
+import tempfile
+from io import StringIO
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, models
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.courses.models import Course, Enrollment
+from apps.progress.models import Progress
+from apps.quizzes.models import Question, Quiz, QuizAttempt
+from apps.users.models import User
+from . import exports, partitions
+from .timeseries import columnar_series
+from .models import (
+    ActiveUserSketch, ActivityDay, LeaderboardEntry, PlatformStatistic, UserStatistic, XpArchive,
+    XpDailyRollup, XpHistory, XpRankNode
+)
+
+
+def create_student(email, **extra_fields):
+    return User.objects.create_user(email, "pw", role="user", **extra_fields)
+
+
+class LeaderboardEntryTests(TestCase):
+    def ranking(self, metric='xp'):
+        return [(entry.rank, entry.user_id, entry.value) for entry in LeaderboardEntry.top(metric, 100)]
+
+    def expected_ranking(self, metric='xp'):
+        snapshots = []
+        for user in User.objects.filter(is_active=True, role='user'):
+            snapshot = LeaderboardEntry.snapshot_for(user)
+            snapshots.append((LeaderboardEntry.metric_value(metric, snapshot), user.xp, user.pk))
+        snapshots.sort(key=lambda row: (-row[0], -row[1], row[2]))
+        return [(rank, user_id, value) for rank, (value, xp, user_id) in enumerate(snapshots, 1)]
+
+    def test_interleaved_updates_keep_ranks_dense(self):
+        students = [create_student(f"u{i}@x.com") for i in range(6)]
+        amounts = [50, 10, 100, 10, 5, 100, 60, 10, 250, 5, 10, 40]
+        for i, amount in enumerate(amounts):
+            # Instancias frescas y viejas mezcladas, como en peticiones concurrentes
+            user = students[i % len(students)] if i % 2 else User.objects.get(pk=students[(i * 5) % 6].pk)
+            user.add_xp(amount)
+
+        for metric in ('xp', 'level'):
+            ranking = self.ranking(metric)
+            self.assertEqual(ranking, self.expected_ranking(metric))
+            self.assertEqual([rank for rank, _, _ in ranking], list(range(1, len(students) + 1)))
+
+    def test_inactive_and_deleted_users_leave_the_ranking(self):
+        students = [create_student(f"u{i}@x.com") for i in range(4)]
+        for amount, user in zip([30, 20, 10, 40], students):
+            user.add_xp(amount)
+
+        students[3].is_active = False
+        students[3].save()
+        students[0].delete()
+
+        self.assertEqual(self.ranking(), [(1, students[1].pk, 20), (2, students[2].pk, 10)])
+        self.assertEqual(self.ranking(), self.expected_ranking())
+
+    def test_rank_of_matches_top(self):
+        students = [create_student(f"u{i}@x.com") for i in range(5)]
+        for amount, user in zip([10, 10, 30, 0, 20], students):
+            user.add_xp(amount)
+
+        for entry in LeaderboardEntry.top('xp', 100):
+            self.assertEqual(LeaderboardEntry.rank_of(entry), entry.rank)
+
+    def test_incremental_entries_match_rebuild(self):
+        students = [create_student(f"u{i}@x.com") for i in range(5)]
+        for amount, user in zip([10, 120, 30, 300, 20], students):
+            user.add_xp(amount)
+
+        fields = ('metric', 'user_id', 'value', 'xp', 'level', 'courses_completed', 'quizzes_passed', 'streak_days')
+        incremental = sorted(LeaderboardEntry.objects.values_list(*fields))
+        LeaderboardEntry.rebuild()
+        self.assertEqual(sorted(LeaderboardEntry.objects.values_list(*fields)), incremental)
+
+    def assertMatchesRebuild(self):
+        fields = ('metric', 'user_id', 'value', 'xp', 'level', 'courses_completed', 'quizzes_passed', 'streak_days')
+        incremental = sorted(LeaderboardEntry.objects.values_list(*fields))
+        LeaderboardEntry.rebuild()
+        self.assertEqual(sorted(LeaderboardEntry.objects.values_list(*fields)), incremental)
+
+    def test_quiz_course_and_streak_events_match_rebuild(self):
+        admin = User.objects.create_user("admin@x.com", "pw", role="admin")
+        students = [create_student(f"u{i}@x.com") for i in range(3)]
+        course = Course.objects.create(title="C1", description="d", created_by=admin)
+        quizzes = []
+        for i in range(2):
+            quiz = Quiz.objects.create(course=course, title=f"Q{i}", xp_reward=20, passing_score=50)
+            Question.objects.create(quiz=quiz, text="1 + 1", question_type="short_answer", correct_answer="2", order=1)
+            quizzes.append(quiz)
+
+        for student in students:
+            Enrollment.objects.create(user=student, course=course)
+        for i, student in enumerate(students):
+            client = APIClient()
+            client.force_authenticate(student)
+            for quiz in quizzes[:i + 1]:
+                answers = {str(quiz.questions.get().pk): "2" if i else "0"}
+                response = client.post(
+                    '/api/quizzes/submit/', {'quiz_id': quiz.pk, 'answers': answers, 'time_taken': 5}, format='json'
+                )
+                self.assertEqual(response.status_code, 201, response.content)
+        self.assertMatchesRebuild()
+
+        # Curso completado y racha que sube y luego baja
+        progress = Progress.objects.get(user=students[2], course=course)
+        self.assertTrue(progress.course_completed)
+        progress.streak_days = 4
+        progress.save()
+        self.assertMatchesRebuild()
+        progress.streak_days = 2
+        progress.course_completed = False
+        progress.save()
+        self.assertMatchesRebuild()
+
+        QuizAttempt.objects.filter(user=students[1]).delete()
+        self.assertMatchesRebuild()
+
+    def test_xp_event_does_not_reread_the_user(self):
+        user = create_student("u@x.com")
+        user.add_xp(10)
+
+        with CaptureQueriesContext(connection) as queries:
+            User.objects.get(pk=user.pk).add_xp(10)
+        reads = [
+            query['sql'] for query in queries
+            if query['sql'].startswith('SELECT') and any(
+                table in query['sql'] for table in ('"users_user"', '"progress_progress"', '"quizzes_quizattempt"')
+            )
+        ]
+        # Solo la carga de la instancia con que empieza la prueba
+        self.assertEqual(len(reads), 1)
+        self.assertFalse([query for query in queries if 'FOR UPDATE' in query['sql']])
+        self.assertEqual(LeaderboardEntry.objects.get(user=user, metric='xp').value, 20)
+
+    def test_refresh_writes_only_the_users_rows(self):
+        user = create_student("u@x.com")
+        user.add_xp(10)
+
+        # Savepoint, bloqueo de sus filas, XP actual, Progress, quizzes, un UPDATE y release
+        User.objects.filter(pk=user.pk).update(xp=20)
+        with self.assertNumQueries(7):
+            LeaderboardEntry.refresh_for_user(user)
+
+        # Sin cambios no escribe
+        with self.assertNumQueries(6):
+            LeaderboardEntry.refresh_for_user(user)
+
+
+class XpRankNodeTests(TestCase):
+    def setUp(self):
+        XpRankNode.rebuild()
+
+    def assertMatchesCount(self, xp_values):
+        students = User.objects.filter(is_active=True, role='user')
+        total = students.count()
+        for xp in xp_values:
+            self.assertEqual(XpRankNode.rank_for(xp), students.filter(xp__gt=xp).count() + 1, xp)
+            below = students.filter(xp__lt=xp).count()
+            self.assertAlmostEqual(XpRankNode.percentile_for(xp), below / total * 100 if total else 0.0)
+
+    def test_rank_and_percentile_match_sql_count(self):
+        students = [create_student(f"u{i}@x.com") for i in range(8)]
+        for amount, user in zip([0, 15, 15, 120, 7, 300, 15, 42], students):
+            if amount:
+                user.add_xp(amount)
+        # Por encima de la capacidad todos caen en el último cubo
+        students[0].add_xp(XpRankNode.SIZE + 10)
+        students[1].add_xp(XpRankNode.SIZE)
+        User.objects.create_user("admin@x.com", "pw", role="admin").add_xp(500)
+
+        xp_values = set(User.objects.values_list('xp', flat=True))
+        self.assertMatchesCount(xp_values | {1, 16, 10_000, XpRankNode.SIZE - 1, XpRankNode.SIZE + 100})
+
+    def test_role_state_and_deletion_keep_the_index_in_sync(self):
+        students = [create_student(f"u{i}@x.com") for i in range(4)]
+        for amount, user in zip([30, 20, 10, 40], students):
+            user.add_xp(amount)
+
+        students[0].is_active = False
+        students[0].save()
+        students[1].role = 'admin'
+        students[1].save()
+        students[3].delete()
+        # XP corregida a mano en el admin
+        students[2].xp = 25
+        students[2].save()
+
+        self.assertMatchesCount([0, 10, 20, 25, 30, 40])
+
+    def test_check_command_detects_drift(self):
+        for i, amount in enumerate([5, 50, 500]):
+            create_student(f"u{i}@x.com").add_xp(amount)
+        call_command('rebuild_rank_index', check=True, stdout=StringIO())
+
+        XpRankNode.objects.filter(index=XpRankNode.SIZE).update(count=models.F('count') + 1)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_rank_index', check=True, stdout=StringIO())
+
+        call_command('rebuild_rank_index', stdout=StringIO())
+        call_command('rebuild_rank_index', check=True, stdout=StringIO())
+
+
+def local_datetime(day):
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()).replace(hour=12))
+
+
+class XpDailyRollupTests(TestCase):
+    # Bogotá es UTC-5: 04:30 UTC todavía es el día anterior, 05:30 UTC ya no
+    MOMENTS = [
+        (datetime(2026, 3, 2, 4, 30, tzinfo=dt_timezone.utc), 10, 'quiz'),
+        (datetime(2026, 3, 2, 5, 30, tzinfo=dt_timezone.utc), 20, 'quiz'),
+        (datetime(2026, 3, 2, 23, 0, tzinfo=dt_timezone.utc), 5, 'quiz'),
+        (datetime(2026, 3, 3, 4, 59, tzinfo=dt_timezone.utc), 7, 'course'),
+    ]
+    EXPECTED = [
+        (date(2026, 3, 1), 'quiz', 10, 1),
+        (date(2026, 3, 2), 'course', 7, 1),
+        (date(2026, 3, 2), 'quiz', 25, 2),
+    ]
+
+    def setUp(self):
+        self.user = create_student("u@x.com")
+
+    def rollups(self):
+        return list(XpDailyRollup.objects.filter(user=self.user).order_by('day', 'source').values_list(
+            'day', 'source', 'xp', 'events'
+        ))
+
+    def test_events_are_bucketed_in_the_project_time_zone(self):
+        XpDailyRollup.record_many([
+            XpHistory(user=self.user, created_at=when, xp_gained=amount, source=source)
+            for when, amount, source in self.MOMENTS
+        ])
+        self.assertEqual(self.rollups(), self.EXPECTED)
+
+    def test_backfill_matches_incremental_and_is_idempotent(self):
+        for when, amount, source in self.MOMENTS:
+            event = XpHistory.objects.create(user=self.user, xp_gained=amount, source=source)
+            XpHistory.objects.filter(pk=event.pk).update(created_at=when)
+
+        self.assertEqual(XpDailyRollup.backfill(), 3)
+        self.assertEqual(self.rollups(), self.EXPECTED)
+        self.assertEqual(XpDailyRollup.backfill(), 3)
+        self.assertEqual(self.rollups(), self.EXPECTED)
+
+        # Un rango solo reescribe sus días locales
+        XpDailyRollup.objects.filter(day=date(2026, 3, 1)).update(xp=999)
+        XpDailyRollup.objects.filter(day=date(2026, 3, 2), source='quiz').update(xp=999)
+        call_command('backfill_xp_rollups', start='2026-03-02', end='2026-03-02', stdout=StringIO())
+        self.assertEqual(self.rollups(), [(date(2026, 3, 1), 'quiz', 999, 1), *self.EXPECTED[1:]])
+
+
+class ColumnarTimeSeriesTests(TestCase):
+    def setUp(self):
+        self.user = create_student("u@x.com")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.today = timezone.localdate()
+
+    def get(self, **params):
+        response = self.client.get('/api/stats/time-series/', {'layout': 'columnar', **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_series_fills_gaps_across_month_and_week_boundaries(self):
+        series = columnar_series(
+            [(date(2025, 11, 1), 3), (date(2026, 1, 1), 4)],
+            date(2025, 11, 15), date(2026, 2, 3), 'month', cumulative=True
+        )
+        self.assertEqual(series['dates'], ['2025-11-01', '2025-12-01', '2026-01-01', '2026-02-01'])
+        self.assertEqual(series['values'], [3, 0, 4, 0])
+        self.assertEqual(series['cumulative'], [3, 3, 7, 7])
+
+        # Semanas desde el lunes; una fila que cae a mitad de semana suma a su lunes
+        series = columnar_series(
+            [(date(2026, 3, 18), 2), (date(2026, 3, 2), 1)], date(2026, 3, 4), date(2026, 3, 20), 'week'
+        )
+        self.assertEqual(series['dates'], ['2026-03-02', '2026-03-09', '2026-03-16'])
+        self.assertEqual(series['values'], [1, 0, 2])
+        self.assertNotIn('cumulative', series)
+
+    def test_xp_days_are_gap_filled_with_cumulative(self):
+        for offset, source, xp in [(1, 'quiz', 10), (1, 'course', 5), (4, 'quiz', 10), (10, 'quiz', 99)]:
+            XpDailyRollup.objects.create(user=self.user, day=self.today - timedelta(days=offset), source=source, xp=xp)
+
+        series = self.get(type='xp', timeframe='week', cumulative='true')
+        self.assertEqual(series['dates'], [(self.today - timedelta(days=6 - i)).isoformat() for i in range(7)])
+        self.assertEqual(series['values'], [0, 0, 10, 0, 0, 15, 0])
+        self.assertEqual(series['cumulative'], [0, 0, 10, 10, 10, 25, 25])
+        self.assertEqual((series['type'], series['granularity']), ('xp', 'day'))
+
+    def test_quizzes_by_week_and_unknown_granularity(self):
+        admin = User.objects.create_user("admin@x.com", "pw", role="admin")
+        course = Course.objects.create(title="C1", description="d", created_by=admin)
+        for i, offset in enumerate((0, 0, 7, 20)):
+            quiz = Quiz.objects.create(course=course, title=f"Q{i}", xp_reward=0, passing_score=50)
+            attempt = QuizAttempt.objects.create(user=self.user, quiz=quiz)
+            QuizAttempt.objects.filter(pk=attempt.pk).update(
+                completed_at=local_datetime(self.today - timedelta(days=offset))
+            )
+
+        series = self.get(type='quizzes', timeframe='month', granularity='week')
+        monday = self.today - timedelta(days=self.today.weekday())
+        self.assertEqual(series['dates'][-1], monday.isoformat())
+        self.assertEqual(sum(series['values']), 4)
+        self.assertEqual(series['values'][-1], 2)
+        self.assertEqual(series['values'][-2], 1)
+        self.assertEqual(len(series['dates']), len(series['values']))
+
+        self.assertEqual(self.get(type='quizzes', granularity='hour')['granularity'], 'day')
+
+
+class ActivityDayTests(TestCase):
+    def setUp(self):
+        self.user = create_student("u@x.com")
+        self.start = date(2026, 3, 1)
+
+    def record(self, *offsets):
+        for offset in offsets:
+            ActivityDay.record(self.user.pk, local_datetime(self.start + timedelta(days=offset)))
+
+    def statistic(self):
+        stat = UserStatistic.objects.get(user=self.user)
+        return {
+            'current': stat.current_streak_days,
+            'longest': stat.longest_streak_days,
+            'days_active': stat.days_active,
+            'last': stat.last_active_date,
+        }
+
+    def test_summarize_islands(self):
+        days = [self.start + timedelta(days=offset) for offset in (9, 8, 7, 4, 3, 0)]
+        today = self.start + timedelta(days=9)
+
+        self.assertEqual(ActivityDay.summarize(days, today), {
+            'current_streak': 3, 'longest_streak': 3, 'days_active': 6, 'last_active_date': days[0],
+        })
+        # Ayer sigue contando; anteayer ya no
+        self.assertEqual(ActivityDay.summarize(days, today + timedelta(days=1))['current_streak'], 3)
+        self.assertEqual(ActivityDay.summarize(days, today + timedelta(days=2))['current_streak'], 0)
+        self.assertEqual(ActivityDay.summarize([], today)['days_active'], 0)
+
+    def test_summarize_edge_cases(self):
+        today = self.start + timedelta(days=20)
+
+        def days(*offsets):
+            return [today - timedelta(days=offset) for offset in offsets]
+
+        self.assertEqual(ActivityDay.summarize([], today), {
+            'current_streak': 0, 'longest_streak': 0, 'days_active': 0, 'last_active_date': None,
+        })
+        self.assertEqual(ActivityDay.summarize(days(0), today), {
+            'current_streak': 1, 'longest_streak': 1, 'days_active': 1, 'last_active_date': today,
+        })
+        # Un solo día ya fuera de la racha
+        self.assertEqual(ActivityDay.summarize(days(2), today)['current_streak'], 0)
+        self.assertEqual(ActivityDay.summarize(days(2), today)['longest_streak'], 1)
+        # La racha más larga es antigua y la actual es más corta
+        self.assertEqual(ActivityDay.summarize(days(0, 1, 5, 6, 7, 8), today), {
+            'current_streak': 2, 'longest_streak': 4, 'days_active': 6, 'last_active_date': today,
+        })
+        # Racha actual que empieza ayer y cruza un cambio de mes
+        month_end = date(2026, 3, 31)
+        self.assertEqual(
+            ActivityDay.summarize([month_end, month_end - timedelta(days=1), date(2026, 3, 29)], date(2026, 4, 1)),
+            {'current_streak': 3, 'longest_streak': 3, 'days_active': 3, 'last_active_date': month_end}
+        )
+
+    def test_course_streaks_are_kept_apart(self):
+        admin = User.objects.create_user("admin@x.com", "pw", role="admin")
+        course, other = [Course.objects.create(title=title, description="d", created_by=admin) for title in "AB"]
+        today = self.start + timedelta(days=3)
+        self.assertEqual(ActivityDay.current_streak(self.user, today=today), 0)
+
+        for offset, course_id in [(1, course.pk), (2, other.pk), (3, course.pk)]:
+            ActivityDay.record(self.user.pk, local_datetime(self.start + timedelta(days=offset)), course_id)
+
+        self.assertEqual(ActivityDay.current_streak(self.user, today=today), 3)
+        self.assertEqual(ActivityDay.current_streak(self.user, course=course, today=today), 1)
+        # El otro curso se estudió ayer: su racha sigue viva hoy, no mañana
+        self.assertEqual(ActivityDay.current_streak(self.user, course=other, today=today), 1)
+        self.assertEqual(ActivityDay.current_streak(self.user, course=other, today=today + timedelta(days=1)), 0)
+        self.assertEqual(ActivityDay.summary(self.user, course=course, today=today)['days_active'], 2)
+
+    def test_current_streak_reads_the_ledger(self):
+        self.record(0, 3, 4, 5)
+        today = self.start + timedelta(days=5)
+        self.assertEqual(ActivityDay.current_streak(self.user, today=today), 3)
+        self.assertEqual(ActivityDay.current_streak(self.user, today=today + timedelta(days=1)), 3)
+        self.assertEqual(ActivityDay.current_streak(self.user, today=today + timedelta(days=2)), 0)
+
+    def test_days_in_order_advance_the_streak(self):
+        self.record(0, 1, 1, 2, 5)
+        self.assertEqual(self.statistic(), {
+            'current': 1, 'longest': 3, 'days_active': 4, 'last': self.start + timedelta(days=5),
+        })
+
+    def test_out_of_order_day_counts_and_joins_streaks(self):
+        self.record(0, 1, 3, 4)
+        self.assertEqual(self.statistic()['days_active'], 4)
+
+        # Evento atrasado que rellena el hueco entre las dos rachas
+        self.record(2)
+        self.assertEqual(self.statistic(), {
+            'current': 5, 'longest': 5, 'days_active': 5, 'last': self.start + timedelta(days=4),
+        })
+
+        # Día antiguo aislado y repeticiones: solo suma una vez
+        self.record(-5, -5, 2)
+        self.assertEqual(self.statistic(), {
+            'current': 5, 'longest': 5, 'days_active': 6, 'last': self.start + timedelta(days=4),
+        })
+
+    def test_new_day_adds_one_update(self):
+        self.record(0)
+        # INSERT ... RETURNING y el UPDATE de las estadísticas
+        with self.assertNumQueries(2):
+            self.record(1)
+        # Día ya registrado: solo el INSERT
+        with self.assertNumQueries(1):
+            self.record(1)
+
+    @skipUnless(connection.vendor == 'postgresql', "ISLANDS_SQL usa aritmética de fechas de PostgreSQL")
+    def test_streaks_for_all_matches_summary(self):
+        self.record(0, 1, 2, 5, 6)
+        today = self.start + timedelta(days=6)
+        summary = ActivityDay.summary(self.user, today=today)
+        rows = [row for row in ActivityDay.streaks_for_all(today) if row[0] == self.user.pk and row[1] is None]
+        self.assertEqual(rows, [(
+            self.user.pk, None, summary['current_streak'], summary['longest_streak'],
+            summary['days_active'], summary['last_active_date'],
+        )])
+
+
+class PlatformStatisticTests(TestCase):
+    def setUp(self):
+        self.start = date(2026, 3, 1)
+        admin = User.objects.create_user("admin@x.com", "pw", role="admin")
+        course = Course.objects.create(title="C1", description="d", created_by=admin)
+        User.objects.filter(pk=admin.pk).update(date_joined=local_datetime(self.start))
+
+        for i, offset in enumerate([0, 0, 1, 3]):
+            joined = local_datetime(self.start + timedelta(days=offset))
+            student = create_student(f"u{i}@x.com")
+            User.objects.filter(pk=student.pk).update(date_joined=joined)
+            enrollment = Enrollment.objects.create(user=student, course=course)
+            Enrollment.objects.filter(pk=enrollment.pk).update(enrolled_at=joined)
+            quiz = Quiz.objects.create(course=course, title=f"Q{i}", xp_reward=0, passing_score=50)
+            attempt = QuizAttempt.objects.create(user=student, quiz=quiz)
+            QuizAttempt.objects.filter(pk=attempt.pk).update(completed_at=joined + timedelta(hours=2))
+            XpDailyRollup.objects.create(user=student, day=joined.date(), source='quiz', xp=10 * (i + 1))
+            ActivityDay.objects.create(user=student, day=joined.date())
+
+    def rows(self):
+        return list(PlatformStatistic.objects.order_by('date').values_list(
+            'pk', 'date', *PlatformStatistic.METRIC_FIELDS
+        ))
+
+    def test_build_range_is_idempotent(self):
+        self.assertEqual(PlatformStatistic.build_range(self.start, self.start + timedelta(days=3)), 4)
+        first = self.rows()
+        self.assertEqual(
+            [row[2:7] for row in first],
+            [(2, 2, 2, 2, 30), (3, 1, 1, 1, 30), (3, 0, 0, 0, 0), (4, 1, 1, 1, 40)]
+        )
+
+        self.assertEqual(PlatformStatistic.build_range(self.start, self.start + timedelta(days=3)), 4)
+        self.assertEqual(self.rows(), first)
+
+        # Un rango que se solapa reescribe sus días sin duplicar ni cambiar los valores
+        PlatformStatistic.build_range(self.start + timedelta(days=2), self.start + timedelta(days=4))
+        rows = self.rows()
+        self.assertEqual(rows[:4], first)
+        self.assertEqual(rows[4][1:4], (self.start + timedelta(days=4), 4, 0))
+
+    def test_command_resumes_from_the_last_stored_day(self):
+        end = self.start + timedelta(days=3)
+        call_command('build_platform_statistics', end=end.isoformat(), stdout=StringIO())
+        self.assertEqual(
+            list(PlatformStatistic.objects.order_by('date').values_list('date', flat=True)),
+            [self.start + timedelta(days=offset) for offset in range(4)]
+        )
+
+        updated = dict(PlatformStatistic.objects.values_list('date', 'updated_at'))
+        call_command('build_platform_statistics', end=(end + timedelta(days=1)).isoformat(), stdout=StringIO())
+        # Solo se recalculan el último día guardado y el nuevo
+        touched = [
+            day for day, updated_at in PlatformStatistic.objects.order_by('date').values_list('date', 'updated_at')
+            if updated.get(day) != updated_at
+        ]
+        self.assertEqual(touched, [end, end + timedelta(days=1)])
+
+
+class ActiveUserSketchTests(TestCase):
+    def chunks(self, user_ids):
+        chunks = {}
+        for user_id in user_ids:
+            ActiveUserSketch.add(chunks, user_id)
+        return chunks
+
+    def test_encoding_round_trip_and_size_bound(self):
+        sparse = [3, 70_000, 5_000_000_000, 5_000_000_001]
+        dense = range(2 ** 17, 2 ** 17 + 5000)
+        for user_ids in (sparse, dense, [*sparse, *dense], []):
+            chunks = self.chunks(user_ids)
+            data = ActiveUserSketch.encode(chunks)
+            self.assertEqual(ActiveUserSketch.decode(data), chunks)
+            self.assertEqual(ActiveUserSketch.cardinality(chunks), len(user_ids))
+
+        # Ids muy altos no agrandan el sketch: 6 bytes por bloque + 2 por usuario
+        self.assertEqual(len(ActiveUserSketch.encode(self.chunks(sparse))), 3 * 6 + 2 * len(sparse))
+        # Un bloque denso no pasa del bitmap de 8 KB
+        self.assertEqual(len(ActiveUserSketch.encode(self.chunks(dense))), 6 + 8192)
+
+    def test_rolling_counts_match_the_ledger(self):
+        today = timezone.localdate()
+        students = [create_student(f"u{i}@x.com") for i in range(12)]
+        students.append(create_student("far@x.com", id=3_000_000))
+        admin = User.objects.create_user("admin@x.com", "pw", role="admin")
+        for i, user in enumerate(students + [admin]):
+            for offset in {i % 3, (i * 7) % 40, 8}:
+                ActivityDay.record(user.pk, local_datetime(today - timedelta(days=offset)))
+
+        def exact(days):
+            return ActivityDay.objects.filter(
+                course__isnull=True, user__role='user', day__gt=today - timedelta(days=days)
+            ).values('user_id').distinct().count()
+
+        expected = {days: exact(days) for days in (1, 7, 30)}
+        self.assertEqual(ActiveUserSketch.rolling_counts(), expected)
+        # Segunda lectura desde los sketches guardados
+        self.assertEqual(ActiveUserSketch.rolling_counts(), expected)
+        self.assertEqual(ActiveUserSketch.active_users(today - timedelta(days=39), today), exact(40))
+        self.assertEqual(
+            ActiveUserSketch.objects.get(day=today - timedelta(days=8)).count,
+            len(students)
+        )
+
+    def test_late_activity_discards_the_stored_sketch(self):
+        today = timezone.localdate()
+        yesterday = today - timedelta(days=1)
+        early, late = create_student("early@x.com"), create_student("late@x.com")
+        ActivityDay.record(early.pk, local_datetime(yesterday))
+        self.assertEqual(ActiveUserSketch.rolling_counts(), {1: 0, 7: 1, 30: 1})
+        self.assertTrue(ActiveUserSketch.objects.filter(day=yesterday).exists())
+
+        # Registro de ayer que llega (o confirma) con el sketch ya guardado
+        with self.captureOnCommitCallbacks(execute=True):
+            ActivityDay.record(late.pk, local_datetime(yesterday))
+        self.assertFalse(ActiveUserSketch.objects.filter(day=yesterday).exists())
+        self.assertEqual(ActiveUserSketch.rolling_counts(), {1: 0, 7: 2, 30: 2})
+
+        # Un día que ya tenía registrado no toca el sketch
+        with self.captureOnCommitCallbacks(execute=True):
+            ActivityDay.record(late.pk, local_datetime(yesterday))
+        self.assertEqual(ActiveUserSketch.objects.get(day=yesterday).count, 2)
+
+
+class XpArchiveTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(XP_ARCHIVE_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = create_student("u@x.com")
+        self.this_month = partitions.month_start(timezone.localdate())
+
+    def months_ago(self, months, day=10):
+        month = partitions.add_months(self.this_month, -months)
+        return local_datetime(month.replace(day=day))
+
+    def grant(self, when, amount=10, user=None):
+        event = XpHistory.objects.create(user=user or self.user, xp_gained=amount, source='quiz')
+        XpHistory.objects.filter(pk=event.pk).update(created_at=when)
+        return event
+
+    def test_command_skips_months_without_rows(self):
+        self.grant(self.months_ago(16))
+        self.grant(self.months_ago(14))
+        self.grant(self.months_ago(1))
+
+        call_command('xp_partitions', archive_after=12, stdout=StringIO())
+
+        self.assertEqual(
+            list(XpArchive.objects.order_by('month').values_list('month', 'rows')),
+            [(partitions.add_months(self.this_month, -16), 1), (partitions.add_months(self.this_month, -14), 1)]
+        )
+        self.assertEqual(XpHistory.objects.count(), 1)
+
+    def test_archive_round_trip(self):
+        other = create_student("v@x.com")
+        month = partitions.add_months(self.this_month, -14)
+        events = [
+            self.grant(self.months_ago(14, day), amount, user)
+            for day, amount, user in [(3, 10, self.user), (20, 25, other), (12, 5, self.user), (28, 7, self.user)]
+        ]
+        self.grant(self.months_ago(13))
+        expected = list(
+            XpHistory.objects.filter(pk__in=[e.pk for e in events])
+            .order_by('user_id', '-created_at').values(*XpArchive.FIELDS)
+        )
+
+        archive = XpArchive.archive_month(month)
+        self.assertEqual((archive.month, archive.rows), (month, 4))
+        self.assertTrue(archive.file_path.exists())
+        self.assertFalse(XpHistory.objects.filter(pk__in=[e.pk for e in events]).exists())
+        self.assertEqual(XpHistory.objects.count(), 1)
+
+        self.assertEqual(list(archive.iter_rows()), expected)
+        self.assertEqual(
+            list(archive.iter_rows(user_id=self.user.pk)),
+            [row for row in expected if row['user_id'] == self.user.pk]
+        )
+        start, end = partitions.month_bounds(month)
+        self.assertEqual(
+            [row['id'] for row in XpArchive.rows_between(start + timedelta(days=10), end)],
+            [events[3].pk, events[2].pk, events[1].pk]
+        )
+
+    def test_late_rows_are_merged_into_the_archive(self):
+        month = partitions.add_months(self.this_month, -14)
+        first = self.grant(self.months_ago(14, 5))
+        XpArchive.archive_month(month)
+
+        late = self.grant(self.months_ago(14, 15), amount=40)
+        archive = XpArchive.archive_month(month)
+        self.assertEqual(archive.rows, 2)
+        self.assertEqual(XpArchive.objects.count(), 1)
+        self.assertEqual([row['id'] for row in archive.iter_rows()], [late.pk, first.pk])
+        self.assertFalse(XpHistory.objects.exists())
+
+        # Repetir sin filas nuevas no reescribe el fichero
+        modified = archive.file_path.stat().st_mtime_ns
+        self.assertEqual(XpArchive.archive_month(month).rows, 2)
+        self.assertEqual(archive.file_path.stat().st_mtime_ns, modified)
+
+    def test_history_view_reads_the_archive_for_all_time(self):
+        old = self.grant(self.months_ago(14), amount=30)
+        recent = XpHistory.objects.create(user=self.user, xp_gained=5, source='quiz')
+        XpArchive.archive_month(partitions.add_months(self.this_month, -14))
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get('/api/stats/xp-history/', {'timeframe': 'all'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(row['id'], row['xp_gained']) for row in response.json()],
+            [(recent.pk, 5), (old.pk, 30)]
+        )
+
+        response = client.get('/api/stats/xp-history/', {'timeframe': 'month'})
+        self.assertEqual([row['id'] for row in response.json()], [recent.pk])
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user("admin@x.com", "pw", role="admin")
+        self.user = create_student("u@x.com")
+        self.events = []
+        for day, amount in [(date(2026, 3, 1), 10), (date(2026, 3, 2), 20), (date(2026, 3, 5), 30)]:
+            event = XpHistory.objects.create(user=self.user, xp_gained=amount, source='quiz', description='Quiz "A", 1')
+            XpHistory.objects.filter(pk=event.pk).update(created_at=local_datetime(day))
+            self.events.append(event)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def export(self, dataset='xp-history', **params):
+        response = self.client.get(f'/api/stats/admin/export/{dataset}/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv_export_filters_by_local_day(self):
+        response, content = self.export(start='2026-03-01', end='2026-03-02')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.reader(content.decode('utf-8').splitlines()))
+        self.assertEqual(rows[0][:4], ['id', 'user_id', 'user_email', 'xp_gained'])
+        self.assertEqual(
+            [(int(row[0]), row[2], int(row[3]), row[5]) for row in rows[1:]],
+            [(event.pk, 'u@x.com', amount, 'Quiz "A", 1') for event, amount in zip(self.events, (10, 20))]
+        )
+
+    def test_gzip_ndjson_matches_plain_ndjson(self):
+        _, plain = self.export(output='ndjson')
+        response, compressed = self.export(output='ndjson', gzip='1')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertTrue(response['Content-Disposition'].endswith('.ndjson.gz"'))
+        self.assertEqual(gzip.decompress(compressed), plain)
+
+        records = [json.loads(line) for line in plain.decode('utf-8').splitlines()]
+        self.assertEqual([record['xp_gained'] for record in records], [10, 20, 30])
+        self.assertEqual(datetime.fromisoformat(records[0]['created_at']), local_datetime(date(2026, 3, 1)))
+
+    def test_gzip_stream_flushes_as_it_goes(self):
+        chunks = [f"{i:06d}\n".encode() * 50 for i in range(200)]
+        compressed = list(exports.gzip_stream(iter(chunks), flush_every=4096))
+        self.assertGreater(len(compressed), 2)
+        self.assertEqual(gzip.decompress(b''.join(compressed)), b''.join(chunks))
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.client.get('/api/stats/admin/export/users/').status_code, 404)
+        self.assertEqual(self.client.get('/api/stats/admin/export/xp-history/', {'output': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/stats/admin/export/xp-history/', {'start': '03/2026'}).status_code, 400)
+
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get('/api/stats/admin/export/xp-history/').status_code, 403)
+
+    def test_command_writes_the_same_stream(self):
+        _, content = self.export(output='ndjson', start='2026-03-02')
+        with tempfile.TemporaryDirectory() as directory:
+            path = f"{directory}/xp.ndjson.gz"
+            call_command('export_data', 'xp-history', output='ndjson', start='2026-03-02', gzip=True, file=path,
+                         stderr=StringIO())
+            with gzip.open(path, 'rb') as exported:
+                self.assertEqual(exported.read(), content)
+        self.assertEqual(len(content.splitlines()), 2)
+
+
+class RebuildUserDataTests(TestCase):
+    def setUp(self):
+        admin = User.objects.create_user("admin@x.com", "pw", role="admin")
+        course = Course.objects.create(title="C1", description="d", created_by=admin)
+        quiz = Quiz.objects.create(course=course, title="Q", xp_reward=20, passing_score=50)
+        question = Question.objects.create(
+            quiz=quiz, text="1 + 1", question_type="short_answer", correct_answer="2", order=1
+        )
+
+        self.students = [create_student(f"u{i}@x.com") for i in range(5)]
+        for student in self.students:
+            client = APIClient()
+            client.force_authenticate(student)
+            client.post('/api/courses/enroll/', {'course_id': course.pk}, format='json')
+            client.post(
+                '/api/quizzes/submit/',
+                {'quiz_id': quiz.pk, 'answers': {str(question.pk): "2"}, 'time_taken': 5},
+                format='json'
+            )
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.checkpoint = f"{directory.name}/checkpoint.json"
+
+    def rebuild(self, **options):
+        output = StringIO()
+        call_command(
+            'rebuild_user_data', workers=1, chunk_size=2, checkpoint=self.checkpoint, stdout=output, **options
+        )
+        return output.getvalue()
+
+    def drift(self):
+        UserStatistic.objects.update(total_quizzes_completed=0, total_xp_earned=0)
+        Progress.objects.update(completed_quizzes=0, percentage=0, course_completed=False)
+
+    def repaired(self):
+        return {
+            user_id
+            for user_id, quizzes, xp in UserStatistic.objects.values_list(
+                'user_id', 'total_quizzes_completed', 'total_xp_earned'
+            )
+            if (quizzes, xp) == (1, 20)
+            and Progress.objects.get(user_id=user_id).course_completed
+        }
+
+    def test_rebuild_repairs_every_student(self):
+        self.drift()
+        self.rebuild()
+        self.assertEqual(self.repaired(), {student.pk for student in self.students})
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_interrupted_rebuild_resumes_from_the_checkpoint(self):
+        from apps.stats.management.commands import rebuild_user_data
+
+        self.drift()
+        rebuild_chunk = rebuild_user_data.rebuild_chunk
+        calls = []
+
+        def fail_on_second_chunk(user_ids):
+            calls.append(user_ids)
+            if len(calls) == 2:
+                raise RuntimeError("interrumpido")
+            return rebuild_chunk(user_ids)
+
+        with mock.patch.object(rebuild_user_data, 'rebuild_chunk', side_effect=fail_on_second_chunk):
+            with self.assertRaises(RuntimeError):
+                self.rebuild()
+
+        first_chunk = {student.pk for student in self.students[:2]}
+        self.assertEqual(self.repaired(), first_chunk)
+        with open(self.checkpoint) as checkpoint:
+            self.assertEqual(json.load(checkpoint), {'done': [[self.students[0].pk, self.students[1].pk]]})
+
+        # Al reanudar no se vuelve a tocar el primer bloque
+        Progress.objects.filter(user_id__in=first_chunk).update(xp_earned=999)
+        output = self.rebuild()
+        self.assertIn("Reanudando: 1 bloques", output)
+        self.assertIn("3 usuarios en 2 bloques", output)
+        self.assertEqual(self.repaired(), {student.pk for student in self.students})
+        self.assertEqual(set(Progress.objects.filter(xp_earned=999).values_list('user_id', flat=True)), first_chunk)
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+        # --restart ignora un checkpoint que quedó de otra ejecución
+        with open(self.checkpoint, 'w') as checkpoint:
+            json.dump({'done': [[self.students[0].pk, self.students[-1].pk]]}, checkpoint)
+        self.assertIn("5 usuarios en 3 bloques", self.rebuild(restart=True))
+        self.assertFalse(Progress.objects.filter(xp_earned=999).exists())
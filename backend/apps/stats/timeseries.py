@@ -0,0 +1,64 @@
+"""
+Utilidades para series de tiempo en formato columnar (dates[], values[]).
+
+Las series se agrupan por día, semana (lunes) o mes y se rellenan en el
+servidor con ceros para los periodos sin actividad.
+"""
+from datetime import timedelta
+from itertools import accumulate
+
+GRANULARITIES = ('day', 'week', 'month')
+
+
+def bucket_start(day, granularity):
+    """Primer día del periodo al que pertenece `day`."""
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def bucket_index(start, day, granularity):
+    """Posición del periodo de `day` contando desde el periodo de `start`."""
+    if granularity == 'week':
+        return (day - start).days // 7
+    if granularity == 'month':
+        return (day.year - start.year) * 12 + day.month - start.month
+    return (day - start).days
+
+
+def bucket_dates(start, end, granularity):
+    """Inicio de cada periodo entre `start` y `end` (ambos incluidos)."""
+    start = bucket_start(start, granularity)
+    count = bucket_index(start, end, granularity) + 1
+    if granularity == 'month':
+        return [
+            start.replace(year=start.year + (start.month - 1 + i) // 12, month=(start.month - 1 + i) % 12 + 1)
+            for i in range(count)
+        ]
+    step = 7 if granularity == 'week' else 1
+    return [start + timedelta(days=i * step) for i in range(count)]
+
+
+def columnar_series(rows, start, end, granularity, cumulative=False):
+    """
+    Convierte filas (fecha, valor) en columnas rellenadas con ceros.
+    Cada fila se coloca por aritmética de fechas, sin buscar ni ordenar.
+    """
+    dates = bucket_dates(start, end, granularity)
+    first = dates[0]
+    values = [0] * len(dates)
+    for day, value in rows:
+        values[bucket_index(first, day, granularity)] += value or 0
+
+    series = {
+        'granularity': granularity,
+        'start': first.isoformat(),
+        'end': end.isoformat(),
+        'dates': [day.isoformat() for day in dates],
+        'values': values,
+    }
+    if cumulative:
+        series['cumulative'] = list(accumulate(values))
+    return series
@@ -6,6 +6,7 @@ from .views import (
     UserStatisticsView,
     TimeSeriesStatsView,
     AdminStatisticsView,
+    AdminExportView,
 )
 
 urlpatterns = [
@@ -20,4 +21,5 @@ urlpatterns = [
     
     # Estadísticas de administración
     path("admin/", AdminStatisticsView.as_view(), name="admin-statistics"),
+    path("admin/export/<str:dataset>/", AdminExportView.as_view(), name="admin-export"),
 ]
\ No newline at end of file
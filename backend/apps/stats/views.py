@@ -1,12 +1,23 @@
-from datetime import timedelta
+from datetime import date, datetime, time, timedelta
+from django.http import StreamingHttpResponse
 from django.utils import timezone
-from django.db.models import Sum, Count, Avg, Q, Max
+from django.db.models import Sum, Count, Avg, Q, Max, F, DateField
+from django.db.models.functions import TruncDate, Trunc
 from rest_framework import views, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.viewsets import ViewSet
 
-from .models import XpHistory, UserStatistic, PlatformStatistic
+from .models import (
+    XpHistory,
+    XpArchive,
+    XpDailyRollup,
+    ActiveUserSketch,
+    UserStatistic,
+    PlatformStatistic,
+    LeaderboardEntry,
+    XpRankNode,
+)
 from .serializers import (
     XpHistorySerializer,
     UserStatisticSerializer,
@@ -15,11 +26,13 @@ from .serializers import (
     LeaderboardEntrySerializer,
     TimeSeriesStatSerializer,
 )
+from .timeseries import GRANULARITIES, bucket_start, columnar_series
+from . import exports
 from apps.users.permissions import IsAdmin, IsModerator, IsAdminOrModerator
 from apps.users.models import User
 from apps.courses.models import Course
 from apps.quizzes.models import Quiz, QuizAttempt
-from apps.progress.models import Progress, GlobalProgress
+from apps.progress.models import Progress
 
 
 class StatsOverviewView(views.APIView):
@@ -31,31 +44,31 @@ class StatsOverviewView(views.APIView):
 
     def get(self, request):
         user = request.user
-        now = timezone.now()
-        week_ago = now - timedelta(days=7)
-        month_ago = now - timedelta(days=30)
-
-        # XP por periodos
-        weekly_xp = XpHistory.objects.filter(
-            user=user, 
-            created_at__gte=week_ago
-        ).aggregate(total=Sum("xp_gained"))["total"] or 0
-
-        monthly_xp = XpHistory.objects.filter(
-            user=user, 
-            created_at__gte=month_ago
-        ).aggregate(total=Sum("xp_gained"))["total"] or 0
+        today = timezone.localdate()
+        week_start = today - timedelta(days=6)
+        month_start = today - timedelta(days=29)
+
+        # XP por periodos (últimos 7 y 30 días locales, desde el acumulado diario)
+        xp_periods = XpDailyRollup.objects.filter(
+            user=user,
+            day__gte=month_start
+        ).aggregate(
+            weekly=Sum("xp", filter=Q(day__gte=week_start)),
+            monthly=Sum("xp")
+        )
+        weekly_xp = xp_periods["weekly"] or 0
+        monthly_xp = xp_periods["monthly"] or 0
+
+        # Estadísticas acumuladas (mantenidas por signals, una sola fila)
+        user_stats = UserStatistic.for_user(user)
 
         # Estadísticas de quizzes
-        total_quizzes = QuizAttempt.objects.filter(user=user).count()
-        passed_quizzes = QuizAttempt.objects.filter(user=user, passed=True).count()
-        success_rate = (passed_quizzes / total_quizzes * 100) if total_quizzes else 0
+        total_quizzes = user_stats.total_quizzes_attempted
+        passed_quizzes = user_stats.total_quizzes_passed
+        success_rate = user_stats.quiz_success_rate
 
         # Cursos completados
-        completed_courses = Progress.objects.filter(
-            user=user, 
-            course_completed=True
-        ).count()
+        completed_courses = user_stats.total_courses_completed
 
         # Calcular progreso al siguiente nivel
         xp_thresholds = [0, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000]
@@ -75,16 +88,9 @@ class StatsOverviewView(views.APIView):
         xp_needed_for_next_level = next_level_xp - current_level_min_xp
         progress_to_next_level = (xp_in_current_level / xp_needed_for_next_level * 100) if xp_needed_for_next_level > 0 else 100
 
-        # Obtener ranking del usuario
-        user_rank = User.objects.filter(
-            xp__gt=user.xp, 
-            is_active=True, 
-            role='user'
-        ).count() + 1
-
-        # Obtener racha actual
-        user_stats, _ = UserStatistic.objects.get_or_create(user=user)
-        user_stats.update_statistics()
+        # Obtener ranking del usuario (índice de Fenwick, O(log n))
+        user_rank = XpRankNode.rank_for(user.xp)
+        user_percentile = XpRankNode.percentile_for(user.xp)
 
         data = {
             "user_level": user.level,
@@ -97,8 +103,9 @@ class StatsOverviewView(views.APIView):
             "quizzes_attempted": total_quizzes,
             "quizzes_passed": passed_quizzes,
             "success_rate": round(success_rate, 1),
-            "current_streak": user_stats.current_streak_days,
+            "current_streak": user_stats.active_streak_days,
             "rank": user_rank,
+            "percentile": round(user_percentile, 1),
         }
 
         serializer = UserStatsOverviewSerializer(data)
@@ -130,86 +137,71 @@ class XpHistoryView(views.APIView):
             queryset = queryset.filter(created_at__gte=start_date)
         
         queryset = queryset.select_related('related_quiz', 'related_course')
-        queryset = queryset.order_by('-created_at')[:100]  # Limitar a 100 registros
+        history = list(queryset.order_by('-created_at')[:100])  # Limitar a 100 registros
+
+        # Completar con los meses archivados en disco si el rango llega hasta ellos
+        if len(history) < 100:
+            history += XpArchive.history(user, since=start_date, limit=100 - len(history))
 
-        serializer = XpHistorySerializer(queryset, many=True)
+        serializer = XpHistorySerializer(history, many=True)
         return Response(serializer.data)
 
 
 class LeaderboardView(views.APIView):
     """
     Tabla de clasificación de usuarios.
+    Lee las entradas de LeaderboardEntry en el orden de su índice.
     """
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        metric = request.GET.get('metric', 'xp')  # xp, courses, streak, level
+        metric = request.GET.get('metric', 'xp')  # xp, courses, streak, level, quizzes
         limit = int(request.GET.get('limit', 20))
-        
-        users = User.objects.filter(is_active=True, role='user')
-        
-        if metric == 'xp':
-            users = users.order_by('-xp', '-level')[:limit]
-        elif metric == 'courses':
-            users = users.annotate(
-                completed_courses=Count('progress_records', filter=Q(progress_records__course_completed=True))
-            ).order_by('-completed_courses', '-xp')[:limit]
-        elif metric == 'streak':
-            users = users.annotate(
-                max_streak=Count('statistics__current_streak_days')
-            ).order_by('-max_streak', '-xp')[:limit]
-        elif metric == 'level':
-            users = users.order_by('-level', '-xp')[:limit]
-
-        # Preparar datos para el leaderboard
-        leaderboard_data = []
-        current_user_rank = None
-        
-        for rank, user in enumerate(users, 1):
-            user_stats, _ = UserStatistic.objects.get_or_create(user=user)
-            completed_courses = Progress.objects.filter(user=user, course_completed=True).count()
-            
-            entry = {
-                'rank': rank,
-                'user_id': user.id,
-                'user_name': user.get_full_name() or user.email.split('@')[0],
-                'user_level': user.level,
-                'user_xp': user.xp,
-                'courses_completed': completed_courses,
-                'streak_days': user_stats.current_streak_days,
-                'is_current_user': user == request.user
-            }
-            
-            leaderboard_data.append(entry)
-            
-            if user == request.user:
-                current_user_rank = rank
+
+        entries = LeaderboardEntry.top(metric, limit)
+
+        leaderboard_data = [self._serialize_entry(entry, request.user) for entry in entries]
 
         # Si el usuario actual no está en el top, agregarlo
-        if request.user not in users and current_user_rank is None:
-            user_rank = User.objects.filter(
-                xp__gt=request.user.xp, 
-                is_active=True, 
-                role='user'
-            ).count() + 1
-            
-            user_stats, _ = UserStatistic.objects.get_or_create(user=request.user)
-            completed_courses = Progress.objects.filter(user=request.user, course_completed=True).count()
-            
-            leaderboard_data.append({
-                'rank': user_rank,
-                'user_id': request.user.id,
-                'user_name': request.user.get_full_name() or request.user.email.split('@')[0],
-                'user_level': request.user.level,
-                'user_xp': request.user.xp,
-                'courses_completed': completed_courses,
-                'streak_days': user_stats.current_streak_days,
-                'is_current_user': True
-            })
+        if not any(entry['is_current_user'] for entry in leaderboard_data):
+            current_entry = LeaderboardEntry.objects.filter(
+                metric=metric if metric in LeaderboardEntry.METRICS else 'xp',
+                user=request.user
+            ).select_related('user').first()
+
+            if current_entry:
+                current_entry.rank = LeaderboardEntry.rank_of(current_entry)
+                leaderboard_data.append(self._serialize_entry(current_entry, request.user))
+            else:
+                # Usuarios fuera del leaderboard (admin/moderador): posición según su XP
+                snapshot = LeaderboardEntry.snapshot_for(request.user)
+                leaderboard_data.append({
+                    'rank': XpRankNode.rank_for(request.user.xp),
+                    'user_id': request.user.id,
+                    'user_name': request.user.get_full_name() or request.user.email.split('@')[0],
+                    'user_level': request.user.level,
+                    'user_xp': request.user.xp,
+                    'courses_completed': snapshot['courses_completed'],
+                    'streak_days': snapshot['streak_days'],
+                    'is_current_user': True
+                })
 
         serializer = LeaderboardEntrySerializer(leaderboard_data, many=True)
         return Response(serializer.data)
 
+    def _serialize_entry(self, entry, current_user):
+        user = entry.user
+        return {
+            'rank': entry.rank,
+            'user_id': user.id,
+            'user_name': user.get_full_name() or user.email.split('@')[0],
+            'user_level': entry.level,
+            'user_xp': entry.xp,
+            'courses_completed': entry.courses_completed,
+            'streak_days': entry.streak_days,
+            'is_current_user': user.id == current_user.id
+        }
+
 
 class UserStatisticsView(views.APIView):
     """
@@ -218,9 +210,7 @@ class UserStatisticsView(views.APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        user = request.user
-        user_stats, _ = UserStatistic.objects.get_or_create(user=user)
-        user_stats.update_statistics()
+        user_stats = UserStatistic.for_user(request.user)
         
         serializer = UserStatisticSerializer(user_stats)
         return Response(serializer.data)
@@ -251,17 +241,19 @@ class TimeSeriesStatsView(views.APIView):
             days = 30
             start_date = now - timedelta(days=days)
 
+        if request.GET.get('layout') == 'columnar':
+            return Response(self._columnar(request, user, stat_type, days))
+
         data = []
+        local_tz = timezone.get_default_timezone()
         
         if stat_type == 'xp':
-            # XP ganada por día
-            xp_data = XpHistory.objects.filter(
+            # XP ganada por día (acumulado diario, días en TIME_ZONE)
+            xp_data = XpDailyRollup.objects.filter(
                 user=user,
-                created_at__gte=start_date
-            ).extra({
-                'date': "date(created_at)"
-            }).values('date').annotate(
-                value=Sum('xp_gained')
+                day__gte=timezone.localdate(start_date)
+            ).values(date=F('day')).annotate(
+                value=Sum('xp')
             ).order_by('date')
             
             for item in xp_data:
@@ -276,9 +268,9 @@ class TimeSeriesStatsView(views.APIView):
             quiz_data = QuizAttempt.objects.filter(
                 user=user,
                 completed_at__gte=start_date
-            ).extra({
-                'date': "date(completed_at)"
-            }).values('date').annotate(
+            ).annotate(
+                date=TruncDate('completed_at', tzinfo=local_tz)
+            ).values('date').annotate(
                 value=Count('id')
             ).order_by('date')
             
@@ -295,9 +287,9 @@ class TimeSeriesStatsView(views.APIView):
                 user=user,
                 course_completed=True,
                 completed_at__gte=start_date
-            ).extra({
-                'date': "date(completed_at)"
-            }).values('date').annotate(
+            ).annotate(
+                date=TruncDate('completed_at', tzinfo=local_tz)
+            ).values('date').annotate(
                 value=Count('id')
             ).order_by('date')
             
@@ -313,6 +305,54 @@ class TimeSeriesStatsView(views.APIView):
         serializer = TimeSeriesStatSerializer(data, many=True)
         return Response(serializer.data)
 
+    def _columnar(self, request, user, stat_type, days):
+        """
+        Serie rellenada con ceros en columnas: {dates: [...], values: [...]}.
+        Parámetros: granularity=day|week|month y cumulative=true para el acumulado.
+        """
+        granularity = request.GET.get('granularity', 'day')
+        if granularity not in GRANULARITIES:
+            granularity = 'day'
+        cumulative = request.GET.get('cumulative') in ('1', 'true')
+
+        end = timezone.localdate()
+        start = bucket_start(end - timedelta(days=days - 1), granularity)
+        rows = self._bucket_rows(user, stat_type, start, granularity)
+
+        series = columnar_series(rows, start, end, granularity, cumulative=cumulative)
+        series['type'] = stat_type
+        return series
+
+    def _bucket_rows(self, user, stat_type, start, granularity):
+        """Filas (inicio del periodo, valor) agregadas en la base de datos."""
+        local_tz = timezone.get_default_timezone()
+        start_at = timezone.make_aware(datetime.combine(start, time.min))
+
+        if stat_type == 'quizzes':
+            queryset = QuizAttempt.objects.filter(
+                user=user,
+                completed_at__gte=start_at
+            ).annotate(
+                bucket=Trunc('completed_at', granularity, output_field=DateField(), tzinfo=local_tz)
+            ).values('bucket').annotate(value=Count('id'))
+        elif stat_type == 'courses':
+            queryset = Progress.objects.filter(
+                user=user,
+                course_completed=True,
+                completed_at__gte=start_at
+            ).annotate(
+                bucket=Trunc('completed_at', granularity, output_field=DateField(), tzinfo=local_tz)
+            ).values('bucket').annotate(value=Count('id'))
+        else:
+            queryset = XpDailyRollup.objects.filter(
+                user=user,
+                day__gte=start
+            ).annotate(
+                bucket=Trunc('day', granularity, output_field=DateField())
+            ).values('bucket').annotate(value=Sum('xp'))
+
+        return queryset.order_by().values_list('bucket', 'value')
+
 class AdminStatisticsView(views.APIView):
     """
     Estadísticas de administración para la plataforma.
@@ -323,30 +363,23 @@ class AdminStatisticsView(views.APIView):
         try:
             timeframe = request.GET.get('timeframe', 'today')  # today, week, month
             
-            now = timezone.now()
-            if timeframe == 'week':
-                start_date = now - timedelta(days=7)
-            elif timeframe == 'month':
-                start_date = now - timedelta(days=30)
-            else:
-                start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
+            # Ventanas en días locales completos, alineadas con los sketches diarios
+            window_days = {'week': 7, 'month': 30}.get(timeframe, 1)
+            first_day = timezone.localdate() - timedelta(days=window_days - 1)
+            start_date = timezone.make_aware(datetime.combine(first_day, time.min))
 
             # Estadísticas básicas
             total_users = User.objects.filter(is_active=True, role='user').count()
             total_courses = Course.objects.filter(is_active=True).count()
             total_quizzes = Quiz.objects.filter(is_active=True).count()
             
-            # Actividad reciente
-            active_users = User.objects.filter(
-                Q(quiz_attempts__completed_at__gte=start_date) |
-                Q(xp_history__created_at__gte=start_date),
-                is_active=True,
-                role='user'
-            ).distinct().count()
+            # Actividad reciente (unión de los sketches diarios de usuarios activos)
+            active_counts = ActiveUserSketch.rolling_counts()
+            active_users = active_counts[window_days]
             
             # XP y completaciones
-            total_xp_platform = XpHistory.objects.aggregate(
-                total=Sum('xp_gained')
+            total_xp_platform = XpDailyRollup.objects.aggregate(
+                total=Sum('xp')
             )['total'] or 0
             
             total_courses_completed = Progress.objects.filter(
@@ -369,6 +402,9 @@ class AdminStatisticsView(views.APIView):
                 'period_start': start_date.isoformat(),
                 'total_users': total_users,
                 'active_users': active_users,
+                'daily_active_users': active_counts[1],
+                'weekly_active_users': active_counts[7],
+                'monthly_active_users': active_counts[30],
                 'total_courses': total_courses,
                 'total_quizzes': total_quizzes,
                 'total_courses_completed': total_courses_completed,
@@ -418,8 +454,6 @@ class AdminStatisticsView(views.APIView):
         """Obtiene los cursos más populares."""
         try:
             courses = Course.objects.filter(is_active=True).annotate(
-                enrollment_count=Count('enrollments'),
-                completion_count=Count('enrollments', filter=Q(enrollments__course_completed=True)),
                 avg_progress=Avg('progress_records__percentage')
             ).order_by('-enrollment_count')[:limit]
             
@@ -428,9 +462,9 @@ class AdminStatisticsView(views.APIView):
                     'id': course.id,
                     'title': course.title,
                     'enrollment_count': course.enrollment_count,
-                    'completion_count': course.completion_count,
+                    'completion_count': course.completed_count,
                     'completion_rate': round(
-                        (course.completion_count / course.enrollment_count * 100) 
+                        (course.completed_count / course.enrollment_count * 100) 
                         if course.enrollment_count > 0 else 0, 
                         2
                     ),
@@ -440,3 +474,50 @@ class AdminStatisticsView(views.APIView):
             ]
         except Exception:
             return []
+
+
+class AdminExportView(views.APIView):
+    """
+    Exporta en streaming un conjunto de datos completo para administración.
+    ?output=csv|ndjson&start=YYYY-MM-DD&end=YYYY-MM-DD&gzip=1
+    """
+    permission_classes = [IsAdminOrModerator]
+
+    def get(self, request, dataset):
+        if dataset not in exports.DATASETS:
+            return Response(
+                {"error": f"Conjunto no válido. Opciones: {', '.join(exports.DATASETS)}."},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        output = request.GET.get('output', 'csv')
+        if output not in exports.OUTPUTS:
+            return Response(
+                {"error": "Formato no válido. Use 'csv' o 'ndjson'."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            start = date.fromisoformat(request.GET['start']) if request.GET.get('start') else None
+            end = date.fromisoformat(request.GET['end']) if request.GET.get('end') else None
+        except ValueError:
+            return Response(
+                {"error": "Las fechas deben tener el formato YYYY-MM-DD."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        compressed = request.GET.get('gzip') in ('1', 'true')
+        header, rows = exports.export_rows(dataset, start, end)
+        content = exports.render(output, header, rows)
+        if compressed:
+            content = exports.gzip_stream(content)
+
+        content_type = 'text/csv' if output == 'csv' else 'application/x-ndjson'
+        response = StreamingHttpResponse(
+            content,
+            content_type='application/gzip' if compressed else f'{content_type}; charset=utf-8'
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="{exports.file_name(dataset, output, compressed)}"'
+        )
+        return response
@@ -1,6 +1,7 @@
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.db import models
 from django.utils.translation import gettext_lazy as _
+from apps.core.tracking import TrackedFieldsMixin
 
 
 class CustomUserManager(BaseUserManager):
@@ -30,7 +31,7 @@ class CustomUserManager(BaseUserManager):
         return self.create_user(email, password, **extra_fields)
 
 
-class User(AbstractUser):
+class User(TrackedFieldsMixin, AbstractUser):
     username = models.CharField(_("nombre de usuario"), max_length=150, unique=False, blank=True, null=True)
     email = models.EmailField(_("correo electrónico"), unique=True)
 
@@ -48,6 +49,13 @@ class User(AbstractUser):
     level = models.PositiveIntegerField(default=1)
     xp = models.PositiveIntegerField(default=0)
 
+    # Campos cuyo valor anterior consultan las signals (ver apps.core.tracking)
+    TRACKED_FIELDS = ("level", "xp", "role", "is_active")
+
+    # add_xp los cambia con UPDATE ... RETURNING (y mueve XpRankNode): un save()
+    # completo solo los escribe si la instancia los cambió (p. ej. en el admin)
+    ATOMIC_FIELDS = ("xp", "level")
+
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = []
 
@@ -57,29 +65,129 @@ class User(AbstractUser):
         return f"{self.email} ({self.role})"
 
     # --- Lógica de XP y Niveles ---
-    def add_xp(self, amount, source="quiz"):
-        """Añade XP al usuario y registra el evento automáticamente."""
+    LEVEL_THRESHOLDS = [0, 100, 250, 500, 1000, 2000, 4000, 8000]
+
+    @classmethod
+    def level_for_xp(cls, xp):
+        level = 1
+        for i, threshold in enumerate(cls.LEVEL_THRESHOLDS, start=1):
+            if xp >= threshold:
+                level = i
+        return level
+
+    def add_xp(self, amount, source="quiz", related_quiz=None, related_course=None):
+        """
+        Añade XP al usuario y registra el evento en XpHistory (con el quiz y
+        el curso que la originaron, si los hay).
+
+        Un solo UPDATE suma la XP y recalcula el nivel en la base de datos
+        (RETURNING devuelve los valores nuevos), así que dos ganancias
+        simultáneas no se pisan; la fila del historial se inserta en la misma
+        transacción. No pasa por save(): la subida de nivel se detecta con los
+        valores devueltos y se anuncia con level_changed_signal.
+
+        Escrituras de la ganancia: el UPDATE y el INSERT del historial. Lo
+        demás son proyecciones que se ajustan con los mismos valores, sin
+        SELECT: índice de ranking y leaderboard (aquí) y acumulado diario, día
+        activo y UserStatistic (receptores de XpHistory).
+        """
         if amount <= 0:
             return
 
-        old_xp = self.xp
-        self.xp += amount
-        self.save(update_fields=["xp"])
-        self._update_level()  # recalcula el nivel si es necesario
-
-        # Lanza una signal para registrar el evento en XpHistory
+        from django.db import transaction
+        from apps.stats.models import XpHistory
         from apps.users.signals import xp_gained_signal
+
+        with transaction.atomic():
+            old_level = self._increment_xp(amount)
+            XpHistory.objects.create(
+                user=self,
+                xp_gained=amount,
+                source=source,
+                related_quiz=related_quiz,
+                related_course=related_course,
+            )
+
         xp_gained_signal.send(sender=self.__class__, user=self, amount=amount, source=source)
+        self._announce_level_change(old_level)
+
+    def add_xp_bulk(self, events):
+        """
+        Registra varias ganancias de XP a la vez (XpHistory sin guardar de
+        este usuario): un UPDATE con la suma y un bulk_create del historial.
+        bulk_create no emite post_save, así que los acumulados que dependen
+        de XpHistory se actualizan una vez con xp_history_bulk_created.
+        """
+        events = [event for event in events if event.xp_gained > 0]
+        if not events:
+            return
+
+        from django.db import transaction
+        from apps.stats.models import XpHistory
+        from apps.stats.signals import xp_history_bulk_created
+        from apps.users.signals import xp_gained_signal
 
-    def _update_level(self):
-        thresholds = [0, 100, 250, 500, 1000, 2000, 4000, 8000]
-        new_level = 1
-        for i, threshold in enumerate(thresholds, start=1):
-            if self.xp >= threshold:
-                new_level = i
-        if self.level != new_level:
-            self.level = new_level
-            self.save(update_fields=["level"])
+        amount = sum(event.xp_gained for event in events)
+        with transaction.atomic():
+            self._increment_xp(amount)
+            XpHistory.objects.bulk_create(events)
+            xp_history_bulk_created.send(
+                sender=XpHistory, user=self, events=events, old_xp=self.xp - amount
+            )
+
+        # Señales evento a evento, con el nivel tras cada ganancia (como add_xp)
+        xp = self.xp - amount
+        for event in events:
+            old_level = self.level_for_xp(xp)
+            xp += event.xp_gained
+            xp_gained_signal.send(sender=self.__class__, user=self, amount=event.xp_gained, source=event.source)
+            self._announce_level_change(old_level, self.level_for_xp(xp))
+
+    def _increment_xp(self, amount):
+        """
+        Suma `amount` y recalcula el nivel en un UPDATE ... RETURNING (dentro de
+        una transacción). Devuelve el nivel anterior.
+        """
+        from django.db import connection
+
+        whens = " ".join(
+            "WHEN xp + %s >= %s THEN %s"
+            for _ in self.LEVEL_THRESHOLDS
+        )
+        params = [amount]
+        for level, threshold in reversed(list(enumerate(self.LEVEL_THRESHOLDS, start=1))):
+            params += [amount, threshold, level]
+        params.append(self.pk)
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {self._meta.db_table} SET xp = xp + %s, "
+                f"level = CASE {whens} ELSE 1 END "
+                f"WHERE {self._meta.pk.column} = %s RETURNING xp, level",
+                params,
+            )
+            self.xp, self.level = cursor.fetchone()
+        self._snapshot_fields(["xp", "level"])
+
+        # La XP anterior se deduce del incremento, no de la instancia en memoria
+        old_xp = self.xp - amount
+
+        # Índice de ranking y leaderboard con los valores devueltos, sin releer al usuario
+        if self.is_active and self.is_regular_user:
+            from apps.stats.models import LeaderboardEntry, XpRankNode
+            XpRankNode.move(old_xp, self.xp)
+            LeaderboardEntry.record_xp(self, self.xp, self.level)
+
+        return self.level_for_xp(old_xp)
+
+    def _announce_level_change(self, old_level, new_level=None):
+        from apps.users.signals import level_changed_signal
+
+        new_level = self.level if new_level is None else new_level
+        if new_level != old_level:
+            level_changed_signal.send(
+                sender=self.__class__, user=self, old_level=old_level, new_level=new_level
+            )
 
     # Propiedades de conveniencia para verificar roles
     @property
@@ -1,11 +1,14 @@
 from django.db.models.signals import post_save
 from django.dispatch import receiver, Signal
 from .models import User, Profile
-from apps.stats.models import XpHistory
 
-# Signal personalizada para cuando el usuario gana XP
+# Signal personalizada para cuando el usuario gana XP (User.add_xp ya registró
+# el evento en XpHistory)
 xp_gained_signal = Signal()
 
+# Cambio de nivel detectado por User.add_xp (kwargs: user, old_level, new_level)
+level_changed_signal = Signal()
+
 
 @receiver(post_save, sender=User)
 def crear_perfil_usuario(sender, instance, created, **kwargs):
@@ -13,13 +16,3 @@ def crear_perfil_usuario(sender, instance, created, **kwargs):
     if created:
         Profile.objects.create(usuario=instance)
 
-
-@receiver(xp_gained_signal)
-def registrar_ganancia_xp(sender, **kwargs):
-    """Registra automáticamente una entrada en XpHistory cuando el usuario gana XP."""
-    user = kwargs.get("user")
-    amount = kwargs.get("amount")
-    source = kwargs.get("source", "sistema")
-
-    if user and amount:
-        XpHistory.objects.create(user=user, xp_gained=amount, source=source)
\ No newline at end of file
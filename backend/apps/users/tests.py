@@ -1,3 +1,142 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from apps.stats.models import LeaderboardEntry, XpHistory, XpRankNode
+from .models import User
+
+
+class UserXpTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        XpRankNode.rebuild()
+
+    def setUp(self):
+        self.students = [User.objects.create_user(f"u{i}@x.com", "pw", role="user") for i in range(3)]
+
+    def assertRankIndexMatchesUsers(self):
+        for user in User.objects.filter(is_active=True, role="user"):
+            expected = User.objects.filter(is_active=True, role="user", xp__gt=user.xp).count() + 1
+            self.assertEqual(XpRankNode.rank_for(user.xp), expected)
+
+    def test_add_xp_updates_xp_level_and_history(self):
+        user = self.students[0]
+        user.add_xp(120)
+        user.add_xp(200)
+
+        fresh = User.objects.get(pk=user.pk)
+        self.assertEqual((fresh.xp, fresh.level), (320, User.level_for_xp(320)))
+        self.assertEqual(user.xp_history.count(), 2)
+        self.assertRankIndexMatchesUsers()
+
+    def test_stale_instance_save_keeps_xp(self):
+        stale = User.objects.get(pk=self.students[0].pk)
+        User.objects.get(pk=stale.pk).add_xp(300)
+
+        # Edición de perfil con la instancia cargada antes de la ganancia
+        stale.bio = "Hola"
+        stale.save()
+
+        fresh = User.objects.get(pk=stale.pk)
+        self.assertEqual((fresh.xp, fresh.level, fresh.bio), (300, User.level_for_xp(300), "Hola"))
+        self.assertRankIndexMatchesUsers()
+
+    def test_explicit_xp_edit_moves_rank_index(self):
+        self.students[1].add_xp(50)
+
+        # Como en el admin: XP corregida a mano sobre una instancia vieja
+        stale = User.objects.get(pk=self.students[0].pk)
+        User.objects.get(pk=stale.pk).add_xp(10)
+        stale.xp = 500
+        stale.save()
+
+        self.assertEqual(User.objects.get(pk=stale.pk).xp, 500)
+        self.assertEqual(LeaderboardEntry.objects.get(user=stale, metric='xp').xp, 500)
+        self.assertRankIndexMatchesUsers()
+
+    def test_xp_grant_is_two_writes_without_selects(self):
+        user = self.students[0]
+        user.add_xp(10)
+
+        with CaptureQueriesContext(connection) as queries:
+            user.add_xp(15)
+        statements = [
+            query['sql'] for query in queries
+            if not query['sql'].startswith(('SAVEPOINT', 'RELEASE', 'BEGIN', 'COMMIT'))
+        ]
+        # La ganancia: UPDATE ... RETURNING del usuario e INSERT del historial
+        grant = [sql for sql in statements if 'users_user' in sql or 'stats_xphistory' in sql]
+        self.assertEqual(len(grant), 2)
+        self.assertTrue(grant[0].startswith('UPDATE users_user') and 'RETURNING' in grant[0])
+        self.assertTrue(grant[1].startswith('INSERT INTO "stats_xphistory"'))
+        # Proyecciones sin SELECT: índice de ranking, leaderboard, acumulado
+        # diario, día activo y UserStatistic, una escritura cada una
+        self.assertFalse([sql for sql in statements if sql.startswith('SELECT')])
+        self.assertEqual(len(statements), 7)
+
+        self.assertEqual(
+            list(LeaderboardEntry.objects.filter(user=user, metric__in=['xp', 'level']).values_list('metric', 'value', 'xp')),
+            [('level', 1, 25), ('xp', 25, 25)]
+        )
+
+    def test_bulk_grant_reports_level_ups_from_returned_values(self):
+        from .signals import level_changed_signal
+
+        levels = []
+        def on_level(sender, user, old_level, new_level, **kwargs):
+            levels.append((old_level, new_level))
+
+        level_changed_signal.connect(on_level)
+        try:
+            user = self.students[0]
+            user.add_xp_bulk([XpHistory(user=user, xp_gained=amount, source='quiz') for amount in (60, 60, 200)])
+        finally:
+            level_changed_signal.disconnect(on_level)
+
+        self.assertEqual(levels, [(1, 2), (2, 3)])
+        self.assertEqual(LeaderboardEntry.objects.get(user=user, metric='level').value, User.level_for_xp(320))
+        self.assertRankIndexMatchesUsers()
+
+
+class UserTrackedFieldsTests(TestCase):
+    def setUp(self):
+        XpRankNode.rebuild()
+        self.user = User.objects.create_user("u@x.com", "pw", role="user")
+        self.client = APIClient()
+
+    def user_selects(self, queries):
+        return [
+            query['sql'] for query in queries
+            if query['sql'].startswith('SELECT') and 'FROM "users_user"' in query['sql']
+        ]
+
+    def test_login_reads_the_user_once(self):
+        for url in ('/api/auth/login/', '/api/token/'):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(url, {'email': "u@x.com", 'password': "pw"}, format='json')
+            self.assertEqual(response.status_code, 200, url)
+            # Solo la búsqueda por email de authenticate(); el save de last_login no relee la fila
+            self.assertEqual(len(self.user_selects(queries)), 1, url)
+
+        self.assertIsNotNone(User.objects.get(pk=self.user.pk).last_login)
+
+    def test_saves_compare_against_the_loaded_values(self):
+        self.user.add_xp(40)
+        user = User.objects.get(pk=self.user.pk)
+        user.role = 'moderator'
+        with CaptureQueriesContext(connection) as queries:
+            user.save()
+        self.assertEqual(self.user_selects(queries), [])
+        self.assertEqual(user.changed_fields(), {})
+        # Ya no figura en el índice de ranking
+        self.assertEqual(XpRankNode._read(XpRankNode.SIZE), [0])
+
+    def test_instance_built_by_hand_reads_the_saved_values_once(self):
+        self.user.add_xp(40)
+        user = User(pk=self.user.pk, email="u@x.com", password=self.user.password, role="user", is_active=False)
+        with CaptureQueriesContext(connection) as queries:
+            user.save(update_fields=['is_active'])
+        self.assertEqual(len(self.user_selects(queries)), 1)
+        self.assertEqual(user.previous_value('xp'), 40)
+        self.assertEqual(XpRankNode._read(XpRankNode.SIZE), [0])
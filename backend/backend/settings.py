@@ -86,6 +86,8 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "allauth.account.middleware.AccountMiddleware",
+    # Mapa de identidad por petición para los caminos que lo usan (apps.core.identity_map)
+    "apps.core.middleware.IdentityMapMiddleware",
 ]
 
 ROOT_URLCONF = "backend.urls"
@@ -151,6 +153,17 @@ DATABASES = {
     }
 }
 
+# =========================
+# Caché (catálogo de cursos)
+# =========================
+# LocMemCache es por proceso: con varios workers conviene un backend compartido
+CACHES = {
+    "default": {
+        "BACKEND": config("CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": config("CACHE_LOCATION", default="yonna-akademia"),
+    }
+}
+
 # =========================
 # Django Channels (sin Redis)
 # =========================
@@ -219,6 +232,9 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Meses antiguos de XpHistory archivados (JSON Lines + gzip)
+XP_ARCHIVE_DIR = Path(config("XP_ARCHIVE_DIR", default=str(BASE_DIR / "archive" / "xp_history")))
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 AUTH_USER_MODEL = "users.User"